@@ -0,0 +1,223 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+
+from app.embedding_backend import get_embedding_backend
+from app.query_book import RetrievalContext
+from app.prompt_builder import section_budget
+from app.query_classifier import classify_query
+from app.resilience import is_unavailable_error
+from app.semantic_cache import get_semantic_cache
+from app.telemetry import count, span
+from app.weather_query import get_weather_api, get_weather_by_city
+from app.workflow import (
+    BOOK_PASSAGES,
+    OUT_OF_SCOPE_ANSWER,
+    RETRIEVAL_RESULTS,
+    WEATHER_UNAVAILABLE,
+    PreparedQuery,
+    StreamTimings,
+    _remember_answer,
+    degraded_answer,
+    extract_cities_from_book,
+    extract_location,
+    format_city_weather,
+    generate_final_response,
+    prepare_cached_query,
+    process_query_stream
+)
+
+# boto3, chromadb and requests are blocking libraries, so the async adapters run
+# them on a dedicated, bounded thread pool instead of the loop's default executor.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ASYNC_WORKFLOW_THREADS", "64")),
+    thread_name_prefix="async-workflow"
+)
+
+
+async def _run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Run in a copy of the caller's context so telemetry spans keep their parent.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, lambda: context.run(fn, *args, **kwargs))
+
+
+async def classify_query_async(query: str) -> str:
+    return await _run_blocking(classify_query, query)
+
+
+async def get_embedding_async(text: str) -> list:
+    return await _run_blocking(get_embedding_backend().embed, text)
+
+
+async def retrieve_async(query: str, query_embedding: list = None, n_results: int = RETRIEVAL_RESULTS,
+                         book=None) -> RetrievalContext:
+    return await _run_blocking(RetrievalContext, query, n_results=n_results, query_embedding=query_embedding, book=book)
+
+
+async def get_weather_async(location: str) -> str:
+    return await _run_blocking(get_weather_by_city, location)
+
+
+async def generate_final_response_async(query: str, book_answer: str = "", weather_answer: str = "") -> str:
+    return await _run_blocking(generate_final_response, query, book_answer=book_answer, weather_answer=weather_answer)
+
+
+async def _generate_or_degrade(query: str, prepared: PreparedQuery) -> str:
+    """
+    generate_final_response_async for a prepared query, falling back to
+    workflow.degraded_answer while Bedrock is unavailable. Generated answers
+    (not degraded ones) are stored in the semantic cache.
+    """
+    try:
+        answer = await generate_final_response_async(query, book_answer=prepared.book_answer,
+                                                     weather_answer=prepared.weather_answer)
+    except Exception as e:
+        if not is_unavailable_error(e):
+            raise
+        answer = degraded_answer(prepared.book_answer, prepared.weather_answer)
+        if answer is None:
+            raise
+        return answer
+    _remember_answer(query, prepared, answer)
+    return answer
+
+
+async def process_query_async(query: str, speculative_embedding: bool = True, book=None,
+                              embed=None, retrieve=None) -> str:
+    """
+    Async counterpart of workflow.process_query.
+
+    Independent stages overlap: the query is embedded while it is being classified
+    (the embedding lands in the embedding cache even if the label turns out not to
+    need it), and in the "both" route every city's weather is fetched concurrently.
+    Many calls can be awaited at once from a single event loop.
+
+    With the semantic cache enabled (see workflow.prepare_query), unfiltered
+    queries are embedded first and looked up before classification; a hit skips
+    classification and retrieval, and answers are stored with that embedding.
+
+    `embed(query)` and `retrieve(query, query_embedding, book)` replace
+    get_embedding_async and retrieve_async; the query server passes versions
+    that batch concurrent queries together.
+    """
+    with span("process_query", mode="async") as query_span:
+        return await _process_query_async(query, query_span, speculative_embedding, book,
+                                          embed or get_embedding_async, retrieve or _retrieve)
+
+
+async def _retrieve(query: str, query_embedding: list, book) -> RetrievalContext:
+    return await retrieve_async(query, query_embedding=query_embedding, book=book)
+
+
+def _discard(task: asyncio.Task) -> None:
+    """
+    Cancel a speculative task whose result is no longer needed. If it fails
+    anyway (e.g. a batched embedding that raises while being cancelled), its
+    exception is retrieved so asyncio does not log "Task exception was never
+    retrieved".
+    """
+    task.cancel()
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+
+async def _process_query_async(query: str, query_span, speculative_embedding: bool, book, embed, retrieve) -> str:
+    cache = get_semantic_cache() if not book else None
+    query_embedding = None
+    if cache is not None:
+        try:
+            query_embedding = await embed(query)
+        except Exception as e:
+            if not is_unavailable_error(e):
+                raise
+            cache = None
+    if cache is not None:
+        entry = cache.lookup(query_embedding)
+        count("cache", cache="semantic", result="hit" if entry is not None else "miss")
+        if entry is not None:
+            query_span.set_label("label", entry.label).set(from_cache=True)
+            prepared = await _run_blocking(prepare_cached_query, query, entry)
+            if prepared.answer is not None:
+                return prepared.answer
+            return await _generate_or_degrade(query, prepared)
+
+    embedding_task = None
+    if speculative_embedding and query_embedding is None:
+        embedding_task = asyncio.create_task(embed(query))
+    try:
+        label = await classify_query_async(query)
+    except BaseException:
+        if embedding_task is not None:
+            _discard(embedding_task)
+        raise
+    query_span.set_label("label", label)
+    # Only the embedding looked up in the cache is stored with the answer (book-filtered
+    # queries are never cached, so their speculative embedding is not).
+    cached_embedding = query_embedding if cache is not None else None
+
+    if label in {"book", "both"}:
+        if embedding_task is not None:
+            try:
+                query_embedding = await embedding_task
+            except Exception as e:
+                # Retrieval falls back to the lexical index while Bedrock is unavailable.
+                if not is_unavailable_error(e):
+                    raise
+        context = await retrieve(query, query_embedding, book)
+        book_answer = context.format_passages(n_results=BOOK_PASSAGES, token_budget=section_budget("book"))
+        if label == "book":
+            return await _generate_or_degrade(query, PreparedQuery(label, book_answer=book_answer,
+                                                                   query_embedding=cached_embedding))
+
+        cities = extract_cities_from_book(query, context=context)
+        if cities and not get_weather_api().available:
+            weather_answer = WEATHER_UNAVAILABLE
+        else:
+            weathers = await asyncio.gather(*(get_weather_async(city) for city in cities))
+            weather_answer = format_city_weather(dict(zip(cities, weathers)))
+        return await _generate_or_degrade(query, PreparedQuery(label, book_answer=book_answer,
+                                                               weather_answer=weather_answer, cities=cities,
+                                                               query_embedding=cached_embedding))
+
+    if embedding_task is not None:
+        _discard(embedding_task)
+    if label == "weather":
+        weather_answer = await get_weather_async(extract_location(query))
+        return await _generate_or_degrade(query, PreparedQuery(label, weather_answer=weather_answer,
+                                                               query_embedding=cached_embedding))
+    _remember_answer(query, PreparedQuery(label, query_embedding=cached_embedding), OUT_OF_SCOPE_ANSWER)
+    return OUT_OF_SCOPE_ANSWER
+
+
+async def process_query_stream_async(query: str, timings: StreamTimings = None, book=None) -> AsyncIterator[str]:
+    """
+    Async iterator over the fragments of workflow.process_query_stream. The
+    blocking Bedrock stream is consumed on the worker pool and each fragment is
+    handed to the event loop as soon as it arrives.
+    """
+    loop = asyncio.get_running_loop()
+    fragments = asyncio.Queue()
+    done = object()
+
+    context = contextvars.copy_context()
+
+    def produce():
+        try:
+            for text in process_query_stream(query, timings=timings, book=book):
+                loop.call_soon_threadsafe(fragments.put_nowait, text)
+        except BaseException as e:
+            loop.call_soon_threadsafe(fragments.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(fragments.put_nowait, done)
+
+    producer = loop.run_in_executor(_executor, context.run, produce)
+    while True:
+        item = await fragments.get()
+        if item is done:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    await producer
@@ -1,22 +1,129 @@
-import boto3
 import os
-from dotenv import load_dotenv
+import threading
+import time
 
-load_dotenv()
+from app.env import load_env
+from app.resilience import ResilientBedrockClient, resilience_enabled
 
-def get_bedrock_client():
+_client_lock = threading.Lock()
+_client = None
+_client_key = None
+_client_created_at = 0.0
+_client_override = None
+_resilient_client = None
+
+
+def _client_settings() -> dict:
+    """
+    Read Bedrock connection settings from environment variables (and .env).
     """
-    Returns a boto3 Bedrock Runtime client using credentials from environment variables.
+    load_env()
+    return {
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID"),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY"),
+        "aws_session_token": os.getenv("AWS_SESSION_TOKEN"),
+        "region_name": os.getenv("AWS_REGION", "us-east-1"),
+        "endpoint_url": os.getenv("BEDROCK_ENDPOINT_URL") or None,
+        "max_pool_connections": int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "32")),
+        "tcp_keepalive": os.getenv("BEDROCK_TCP_KEEPALIVE", "1") not in {"0", "false", "False"},
+    }
+
+
+def new_bedrock_client(settings: dict = None):
     """
-    aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID")
-    aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-    aws_session_token = os.getenv("AWS_SESSION_TOKEN")
-    region_name = os.getenv("AWS_REGION", "us-east-1")
+    Build a brand-new boto3 Bedrock Runtime client from its own Session.
+    Most callers want get_bedrock_client(), which reuses one client per process.
+    """
+    # boto3 is imported on first use: it is the slowest import of the app after chromadb.
+    import boto3
+    from botocore.config import Config
 
+    settings = settings or _client_settings()
     session = boto3.Session(
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
-        aws_session_token=aws_session_token,
-        region_name=region_name
+        aws_access_key_id=settings["aws_access_key_id"],
+        aws_secret_access_key=settings["aws_secret_access_key"],
+        aws_session_token=settings["aws_session_token"],
+        region_name=settings["region_name"]
+    )
+    config = Config(
+        max_pool_connections=settings["max_pool_connections"],
+        tcp_keepalive=settings["tcp_keepalive"],
+        # With the resilience layer on, it does the retrying (with backoff and
+        # breaker accounting), so botocore makes a single attempt per call.
+        retries={"mode": "standard", "total_max_attempts": 1 if resilience_enabled() else 3}
     )
-    return session.client("bedrock-runtime", region_name=region_name)
\ No newline at end of file
+    return session.client(
+        "bedrock-runtime",
+        region_name=settings["region_name"],
+        endpoint_url=settings["endpoint_url"],
+        config=config
+    )
+
+
+def get_bedrock_client():
+    """
+    Returns the process-wide boto3 Bedrock Runtime client.
+
+    boto3 clients are thread-safe, so every caller shares one client and its
+    urllib3 connection pool (BEDROCK_MAX_POOL_CONNECTIONS, default 32) with
+    TCP keep-alive, instead of paying Session setup and a new TLS handshake per
+    call. The client is rebuilt when the credentials in the environment change
+    or when it is older than BEDROCK_CLIENT_MAX_AGE seconds (default 3000), so
+    rotated session tokens are picked up. Credentials resolved through the
+    default chain (profiles, SSO, instance roles) are refreshed by botocore itself.
+
+    Calls go through app.resilience.ResilientBedrockClient (per-model rate
+    limits, retries with backoff, circuit breaking) unless BEDROCK_RESILIENCE=0.
+    """
+    if _client_override is not None:
+        return _with_resilience(_client_override)
+    return _with_resilience(_shared_client())
+
+
+def _with_resilience(client):
+    global _resilient_client
+    if not resilience_enabled():
+        return client
+    wrapper = _resilient_client
+    if wrapper is None or wrapper.client is not client:
+        wrapper = _resilient_client = ResilientBedrockClient(client)
+    return wrapper
+
+
+def _shared_client():
+    global _client, _client_key, _client_created_at
+
+    settings = _client_settings()
+    key = tuple(sorted(settings.items()))
+    max_age = float(os.getenv("BEDROCK_CLIENT_MAX_AGE", "3000"))
+
+    client = _client
+    if client is not None and _client_key == key and time.monotonic() - _client_created_at < max_age:
+        return client
+
+    with _client_lock:
+        if _client is None or _client_key != key or time.monotonic() - _client_created_at >= max_age:
+            _client = new_bedrock_client(settings)
+            _client_key = key
+            _client_created_at = time.monotonic()
+        return _client
+
+
+def set_bedrock_client(client) -> None:
+    """
+    Force every get_bedrock_client() call to use `client` (e.g. a local stub),
+    still behind the resilience layer. Pass None to go back to the shared boto3 client.
+    """
+    global _client_override
+    _client_override = client
+
+
+def reset_bedrock_client() -> None:
+    """
+    Drop the shared client so the next get_bedrock_client() call builds a new one.
+    """
+    global _client, _client_key, _client_created_at
+    with _client_lock:
+        _client = None
+        _client_key = None
+        _client_created_at = 0.0
@@ -1,12 +1,101 @@
 import json
-from typing import Dict, Any
+import re
+import threading
+from typing import Dict, Any, List, Optional
 from app.bedrock_client import get_bedrock_client
+from app.telemetry import record_usage, span
 
-def get_nova_pro_metadata(chunk_text: str) -> Dict[str, Any]:
-    import re
-    import json
+MODEL_ID = "us.amazon.nova-pro-v1:0"
+
+_stats_lock = threading.Lock()
+_stats = {
+    "llm_calls": 0,
+    "batched_calls": 0,
+    "chunks": 0,
+    "empty": 0,
+    "malformed": 0,
+    "retried": 0
+}
+
+class MetadataError(ValueError):
+    """
+    The model's metadata for a chunk was empty, unparseable or missing keys.
+    """
+
+def _count(**increments) -> None:
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+def get_metadata_stats() -> Dict[str, int]:
+    """
+    Counters for metadata extraction: LLM calls made (and how many were batched),
+    chunks processed, empty and malformed outputs, and chunks whose batched result
+    was missing or invalid and were re-requested on their own.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+def reset_metadata_stats() -> None:
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+
+def _converse_text(prompt: str, max_tokens: int) -> str:
     client = get_bedrock_client()
+    with span("metadata_llm"):
+        response = client.converse(
+            modelId=MODEL_ID,
+            messages=[
+                {
+                    "role": "user",
+                    "content": [ {"text": prompt} ]
+                }
+            ],
+            inferenceConfig={
+                "maxTokens": max_tokens,
+                "temperature": 0.2
+            }
+        )
+    record_usage("metadata_llm", response.get("usage"))
+    return response["output"]["message"]["content"][0]["text"].strip()
+
+def _parse_json(output: str, pattern: str) -> Optional[Any]:
+    """
+    Parse `output` as JSON, falling back to the first span matching `pattern`
+    (models sometimes wrap the JSON in prose or code fences).
+    """
+    try:
+        return json.loads(output)
+    except Exception:
+        pass
+
+    match = re.search(pattern, output, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(0))
+        except Exception:
+            pass
+    return None
+
+def _is_valid_metadata(meta: Any) -> bool:
+    return (
+        isinstance(meta, dict)
+        and isinstance(meta.get("summary"), str)
+        and isinstance(meta.get("locations", []), list)
+        and isinstance(meta.get("people", []), list)
+    )
 
+def get_nova_pro_metadata(chunk_text: str) -> Dict[str, Any]:
+    """
+    Extract {summary, locations, people} for one chunk. Raises MetadataError if
+    the model's answer is empty or not valid metadata, so the chunk is not
+    stored and stays pending for the next ingestion run.
+    """
+    _count(chunks=1)
+    return _request_metadata(chunk_text)
+
+def _request_metadata(chunk_text: str) -> Dict[str, Any]:
     prompt = (
         "Given the following text, provide:\n"
         "1. A one-sentence summary.\n"
@@ -17,52 +106,80 @@ def get_nova_pro_metadata(chunk_text: str) -> Dict[str, Any]:
         "Respond in JSON with keys: summary, locations, people."
     )
 
-    response = client.converse(
-        modelId="us.amazon.nova-pro-v1:0",
-        messages=[
-            {
-                "role": "user",
-                "content": [ {"text": prompt} ]
-            }
-        ],
-        inferenceConfig={
-            "maxTokens": 256,
-            "temperature": 0.2
-        }
-    )
-
-    output = response["output"]["message"]["content"][0]["text"].strip()
+    output = _converse_text(prompt, 256)
+    _count(llm_calls=1)
 
     
     if not output:
+        _count(empty=1)
         print("Warning: LLM returned empty output for metadata.")
-        return {
-            "summary": "",
-            "locations": [],
-            "people": [],
-            "llm_error": "Empty output"
-        }
+        raise MetadataError("Empty output")
 
-    
-    try:
-        return json.loads(output)
-    except Exception:
-        pass
+    meta = _parse_json(output, r'\{.*\}')
+    if not _is_valid_metadata(meta):
+        _count(malformed=1)
+        print(f"Warning: Could not parse metadata for chunk. LLM output:\n{output[:300]}\n")
+        raise MetadataError(f"Malformed output: {output[:200]!r}")
 
-    
-    match = re.search(r'\{.*\}', output, re.DOTALL)
-    if match:
+    meta.setdefault("locations", [])
+    meta.setdefault("people", [])
+    return meta
+
+def get_nova_pro_metadata_batch(chunk_texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Extract metadata for several chunks with a single Nova Pro call.
+
+    The chunks are numbered in one prompt and the model answers with a JSON array
+    of {index, summary, locations, people} objects. Each result is validated on
+    its own; chunks with a missing or invalid result are re-requested
+    individually. Returns one result per chunk, in order: the metadata dict, or
+    the MetadataError raised if the individual request failed too (the same
+    per-item convention as MicroBatcher), so one bad chunk does not fail the rest.
+    """
+    if len(chunk_texts) == 1:
         try:
-            return json.loads(match.group(0))
-        except Exception:
-            pass
+            return [get_nova_pro_metadata(chunk_texts[0])]
+        except MetadataError as e:
+            return [e]
 
-    
-    print(f"Warning: Could not parse metadata for chunk. LLM output:\n{output[:300]}\n")
-    return {
-        "summary": "",
-        "locations": [],
-        "people": [],
-        "llm_error": "Malformed output",
-        "llm_raw": output[:500]
-    }
\ No newline at end of file
+    sections = "\n\n".join(f"Text [{i}]:\n{text}" for i, text in enumerate(chunk_texts))
+    prompt = (
+        "For each numbered text below, provide:\n"
+        "1. A one-sentence summary.\n"
+        "2. A list of locations mentioned (if any).\n"
+        "3. A list of people mentioned (if any).\n"
+        "\n"
+        f"{sections}\n"
+        "\n"
+        f"Respond with only a JSON array of {len(chunk_texts)} objects, one per text, "
+        "each with keys: index, summary, locations, people."
+    )
+
+    output = _converse_text(prompt, min(200 * len(chunk_texts), 5000))
+    _count(llm_calls=1, batched_calls=1, chunks=len(chunk_texts))
+
+    results = [None] * len(chunk_texts)
+    parsed = _parse_json(output, r'\[.*\]') if output else None
+    if isinstance(parsed, list):
+        for position, meta in enumerate(parsed):
+            if not _is_valid_metadata(meta):
+                _count(malformed=1)
+                continue
+            index = meta.pop("index", position)
+            if isinstance(index, int) and 0 <= index < len(results) and results[index] is None:
+                meta.setdefault("locations", [])
+                meta.setdefault("people", [])
+                results[index] = meta
+            else:
+                _count(malformed=1)
+    else:
+        _count(malformed=1)
+
+    for i, meta in enumerate(results):
+        if meta is None:
+            _count(retried=1)
+            try:
+                results[i] = _request_metadata(chunk_texts[i])
+            except MetadataError as e:
+                results[i] = e
+    return results
@@ -1,21 +1,109 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List
+
 from app.bedrock_client import get_bedrock_client
+from app.embedding_cache import get_embedding_cache
+from app.resilience import backoff_delay, is_throttling_error, resilience_enabled
+from app.telemetry import count, span
 
-def get_bedrock_embedding(text: str, model_id="amazon.titan-embed-text-v1") -> list:
-    """
-    Get embedding vector for a single text chunk from Bedrock.
-    Returns a list of floats (the embedding vector).
-    """
+if TYPE_CHECKING:
+    import numpy as np
+
+def _invoke_embedding(text: str, model_id: str) -> list:
     client = get_bedrock_client()
-    
+
     body = {
         "inputText": text
     }
-    response = client.invoke_model(
-        modelId=model_id,
-        body=json.dumps(body),
-        contentType="application/json"
-    )
-    result = json.loads(response["body"].read())
-    
-    return result["embedding"]
\ No newline at end of file
+    with span("embed", model=model_id):
+        response = client.invoke_model(
+            modelId=model_id,
+            body=json.dumps(body),
+            contentType="application/json"
+        )
+        result = json.loads(response["body"].read())
+    if result.get("inputTextTokenCount"):
+        count("tokens", result["inputTextTokenCount"], span="embed", kind="input")
+    return result["embedding"]
+
+def get_bedrock_embedding(text: str, model_id="amazon.titan-embed-text-v1", use_cache: bool = True) -> list:
+    """
+    Get embedding vector for a single text chunk from Bedrock.
+    Returns a list of floats (the embedding vector).
+    Results are served from / stored in the shared embedding cache unless use_cache is False.
+    """
+    cache = get_embedding_cache() if use_cache else None
+    if cache is not None:
+        cached = cache.get(model_id, text)
+        count("cache", cache="embedding", result="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+
+    embedding = _invoke_embedding(text, model_id)
+
+    if cache is not None:
+        cache.put(model_id, text, embedding)
+    return embedding
+
+def _embed_with_retry(text: str, model_id: str, max_retries: int, base_delay: float) -> list:
+    for attempt in range(max_retries + 1):
+        try:
+            return _invoke_embedding(text, model_id)
+        except Exception as e:
+            if attempt == max_retries or not is_throttling_error(e):
+                raise
+            time.sleep(backoff_delay(attempt, base_delay, float("inf")))
+
+def get_bedrock_embeddings(texts: List[str],
+                           model_id="amazon.titan-embed-text-v1",
+                           max_workers: int = 8,
+                           use_cache: bool = True,
+                           max_retries: int = 5,
+                           base_delay: float = 0.2) -> "np.ndarray":
+    """
+    Embed many texts at once. Returns a contiguous float32 matrix with one row
+    per input text, in input order.
+
+    Identical texts are embedded once, cached texts are not sent at all, and the
+    rest run over a pool of `max_workers` concurrent invoke_model calls. Each
+    call is retried by the shared Bedrock client (see resilience); only with
+    BEDROCK_RESILIENCE=0 is a throttled text retried here, on its own with
+    jittered exponential backoff (up to `max_retries` times), without holding
+    back the rest of the batch.
+    """
+    import numpy as np
+
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    if resilience_enabled():
+        # Retrying around the resilient client would multiply its attempts and
+        # count every exhausted retry loop as another circuit breaker failure.
+        max_retries = 0
+
+    unique = list(dict.fromkeys(texts))
+    vectors = {}
+    cache = get_embedding_cache() if use_cache else None
+    if cache is not None:
+        for text in unique:
+            cached = cache.get(model_id, text)
+            if cached is not None:
+                vectors[text] = cached
+        count("cache", len(vectors), cache="embedding", result="hit")
+        count("cache", len(unique) - len(vectors), cache="embedding", result="miss")
+
+    missing = [text for text in unique if text not in vectors]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            embedded = executor.map(lambda t: _embed_with_retry(t, model_id, max_retries, base_delay), missing)
+            for text, embedding in zip(missing, embedded):
+                vectors[text] = embedding
+                if cache is not None:
+                    cache.put(model_id, text, embedding)
+
+    first = vectors[unique[0]]
+    matrix = np.empty((len(texts), len(first)), dtype=np.float32)
+    for row, text in enumerate(texts):
+        matrix[row] = vectors[text]
+    return matrix
@@ -1,4 +1,9 @@
+import hashlib
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable, Iterator
 
 def clean_gutenberg_text(raw_text: str) -> str:
     """
@@ -22,53 +27,278 @@ def clean_gutenberg_text(raw_text: str) -> str:
 
     return content
 
-def chunk_text_by_paragraph(text: str, min_words: int = 30, max_words: int = 200, overlap: int = 50) -> list:
+_START_MARKER = re.compile(r"\*\*\* START OF (THE|THIS) PROJECT GUTENBERG EBOOK.*\*\*\*", re.IGNORECASE)
+_END_MARKER = re.compile(r"\*\*\* END OF (THE|THIS) PROJECT GUTENBERG EBOOK.*\*\*\*", re.IGNORECASE)
+_CHAPTER_LINE = re.compile(r"\s*CHAPTER", re.IGNORECASE)
+_CHAPTER_NAME = re.compile(r"\s*(?:CHAPTER|Chapter)\s+([IVXLCDM]+|\d+)\b")
+_CHAPTER_TAIL = re.compile(r"[\s\w-]*")
+_ILLUSTRATION = re.compile(r'\[Illustration:.*?\]', re.IGNORECASE)
+_FOOTNOTE = re.compile(r'\[\d+\]')
+_SPACES = re.compile(r'[ \t]+')
+
+def _is_chapter_tail(text: str) -> bool:
+    """True if `text` consists only of whitespace, word characters and hyphens."""
+    return _CHAPTER_TAIL.fullmatch(text) is not None
+
+def _iter_numbered_lines(lines: Iterable[str]) -> Iterator[tuple]:
+    """Yield (line without its newline, character offset of the line)."""
+    offset = 0
+    for line in lines:
+        yield (line[:-1] if line.endswith("\n") else line), offset
+        offset += len(line)
+
+def _iter_content_lines(lines: Iterable[str]) -> Iterator[tuple]:
     """
-    Split text into chunks by paragraph, merging small paragraphs to reach min_words,
-    and splitting large ones to not exceed max_words.
-    Adds overlap between chunks for better context.
+    Yield (line, offset, chapter) for the lines between the Gutenberg START and END
+    markers, with CHAPTER headings removed exactly as clean_gutenberg_text removes
+    them: a heading line whose text after "CHAPTER" has no punctuation is dropped
+    together with the blank lines before it and every following line made only of
+    word characters, whitespace and hyphens. `chapter` is the number of the last
+    CHAPTER heading seen, removed or not ("" before the first one).
+    """
+    lines = _iter_numbered_lines(lines)
+    for line, offset in lines:
+        start = _START_MARKER.search(line)
+        end = _END_MARKER.search(line)
+        if end and (not start or end.start() < start.start()):
+            # clean_gutenberg_text slices from START to the first END, which is empty here.
+            if not start and not any(_START_MARKER.search(rest) for rest, _ in lines):
+                raise ValueError("Could not find Project Gutenberg book boundaries.")
+            return
+        if start:
+            break
+    else:
+        raise ValueError("Could not find Project Gutenberg book boundaries.")
+
+    def raw_content():
+        rest = line[start.end():]
+        end = _END_MARKER.search(rest)
+        if end:
+            yield rest[:end.start()], offset + start.end()
+            return
+        yield rest, offset + start.end()
+        for line_, offset_ in lines:
+            end = _END_MARKER.search(line_)
+            if end:
+                yield line_[:end.start()], offset_
+                return
+            yield line_, offset_
+        raise ValueError("Could not find Project Gutenberg book boundaries.")
+
+    source = raw_content()
+    # A line is only followed by "\n" if another line comes after it, so keep one line of lookahead.
+    current = next(source)
+    chapter = ""
+    pending_blank = []
+    removing = False
+    for following in source:
+        (line, offset), current = current, following
+        if removing:
+            if _is_chapter_tail(line):
+                continue
+            removing = False
+        if not line.strip():
+            pending_blank.append((line, offset, chapter))
+            continue
+        heading = _CHAPTER_LINE.match(line)
+        if heading:
+            name = _CHAPTER_NAME.match(line)
+            if name:
+                chapter = name.group(1)
+            if _is_chapter_tail(line[heading.end():]):
+                pending_blank = []
+                removing = True
+                continue
+        yield from pending_blank
+        pending_blank = []
+        yield line, offset, chapter
+    yield from pending_blank
+    yield current[0], current[1], chapter
+
+def iter_book_paragraphs(lines: Iterable[str]) -> Iterator[tuple]:
+    """
+    Like iter_gutenberg_paragraphs, but yields (paragraph, offset, chapter): the
+    character offset of the paragraph's first line in the input and the chapter
+    it belongs to.
+    """
+    paragraph = []
+    first = None
+    for line, offset, chapter in _iter_content_lines(lines):
+        if "[" in line:
+            line = _FOOTNOTE.sub('', _ILLUSTRATION.sub('', line))
+        if line:
+            if not paragraph:
+                first = (offset, chapter)
+            paragraph.append(line)
+        elif paragraph:
+            text = _SPACES.sub(' ', "\n".join(paragraph)).strip()
+            if text:
+                yield text, first[0], first[1]
+            paragraph = []
+    if paragraph:
+        text = _SPACES.sub(' ', "\n".join(paragraph)).strip()
+        if text:
+            yield text, first[0], first[1]
+
+def iter_gutenberg_paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Streaming counterpart of clean_gutenberg_text followed by the paragraph split
+    in chunk_text_by_paragraph: consumes a Gutenberg text line by line (e.g. an
+    open file) and yields the same cleaned, stripped paragraphs, without ever
+    holding the whole book in memory.
+
+    Raises ValueError if the START or END marker is missing (possibly after some
+    paragraphs have already been yielded).
+    """
+    for text, _, _ in iter_book_paragraphs(lines):
+        yield text
+
+def _iter_chunk_records(paragraphs: Iterable[tuple], min_words: int, max_words: int, overlap: int) -> Iterator[tuple]:
+    """
+    Chunk (paragraph, info) pairs into (chunk, info) pairs, where info is that of
+    the first paragraph contributing to the chunk.
     """
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    chunks = []
     current_chunk = []
-    current_word_count = 0
+    current_words = []
+    current_info = None
+    step = max_words - overlap
 
-    for para in paragraphs:
+    for para, info in paragraphs:
         words = para.split()
-        if len(words) >= min_words and len(words) <= max_words:
-            
+        n_words = len(words)
+        if min_words <= n_words <= max_words:
             if current_chunk:
-                
-                prev_words = ' '.join(current_chunk).split()
-                if len(prev_words) > overlap:
-                    overlap_text = ' '.join(prev_words[-overlap:])
-                    chunks.append(overlap_text + ' ' + ' '.join(words))
+                if len(current_words) > overlap:
+                    yield ' '.join(current_words[-overlap:]) + ' ' + ' '.join(words), current_info
                 else:
-                    chunks.append(' '.join(current_chunk) + ' ' + ' '.join(words))
+                    yield ' '.join(current_chunk) + ' ' + ' '.join(words), current_info
                 current_chunk = []
-                current_word_count = 0
+                current_words = []
             else:
-                chunks.append(para)
-        elif len(words) < min_words:
-            
+                yield para, info
+        elif n_words < min_words:
+            if not current_chunk:
+                current_info = info
             current_chunk.append(para)
-            current_word_count += len(words)
-            if current_word_count >= min_words:
-                chunks.append(' '.join(current_chunk))
+            current_words.extend(words)
+            if len(current_words) >= min_words:
+                yield ' '.join(current_chunk), current_info
                 current_chunk = []
-                current_word_count = 0
+                current_words = []
         else:
-            
-            for i in range(0, len(words), max_words - overlap):
-                chunk = words[i:i+max_words]
-                if i != 0:
-                    
-                    chunk = words[max(i-overlap, 0):i] + chunk
-                if len(chunk) >= min_words:
-                    chunks.append(' '.join(chunk))
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
+            for i in range(0, n_words, step):
+                start = max(i - overlap, 0) if i != 0 else 0
+                end = i + max_words
+                if min(end, n_words) - start >= min_words:
+                    yield ' '.join(words[start:end]), info
 
-    
-    return [c for c in chunks if len(c.split()) >= min_words]
\ No newline at end of file
+    if current_chunk and len(current_words) >= min_words:
+        yield ' '.join(current_chunk), current_info
+
+def iter_chunks(paragraphs: Iterable[str], min_words: int = 30, max_words: int = 200, overlap: int = 50) -> Iterator[str]:
+    """
+    Chunk a stream of paragraphs, merging small paragraphs to reach min_words and
+    splitting large ones to not exceed max_words, with overlap between chunks.
+
+    Yields exactly the chunks chunk_text_by_paragraph returns, in one pass: the
+    pending small paragraphs are tracked as a flat word list instead of being
+    re-joined and re-split, and every chunk is built once.
+    """
+    records = _iter_chunk_records(((para, None) for para in paragraphs), min_words, max_words, overlap)
+    for chunk, _ in records:
+        yield chunk
+
+def iter_book_chunks(path: str, min_words: int = 30, max_words: int = 200, overlap: int = 50) -> Iterator[str]:
+    """
+    Stream the chunks of a Project Gutenberg text file, reading it line by line.
+    Produces the same chunks as chunk_text_by_paragraph(clean_gutenberg_text(text)).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_chunks(iter_gutenberg_paragraphs(f), min_words, max_words, overlap)
+
+def chunk_text_by_paragraph(text: str, min_words: int = 30, max_words: int = 200, overlap: int = 50) -> list:
+    """
+    Split text into chunks by paragraph, merging small paragraphs to reach min_words,
+    and splitting large ones to not exceed max_words.
+    Adds overlap between chunks for better context.
+    """
+    paragraphs = (p.strip() for p in text.split('\n\n') if p.strip())
+    return list(iter_chunks(paragraphs, min_words, max_words, overlap))
+
+def chunk_content_id(text: str, book_id: str = None) -> str:
+    """
+    Content-addressed id for a chunk: the same text in the same book always gets
+    the same id, regardless of where it falls in the book or how the book was
+    chunked. A passage shared by two books gets one id per book. Without
+    `book_id` the id depends on the text alone (the ids of collections
+    ingested before books were part of the key).
+    """
+    key = text if book_id is None else f"{book_id}\x00{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+def book_id_for_path(path: str) -> str:
+    """
+    Stable book id derived from the file name, e.g. "data/books/Roughing It.txt" -> "roughing_it".
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"[^a-z0-9]+", "_", stem.lower()).strip("_") or "book"
+
+def read_gutenberg_title(path: str) -> str:
+    """
+    Title from the Gutenberg header ("Title: ..." or the START marker), falling
+    back to the file name.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("Title:"):
+                return line[len("Title:"):].strip()
+            start = _START_MARKER.search(line)
+            if start:
+                marker_title = re.search(r"EBOOK\s+(.*?)\s*\*\*\*", start.group(0), re.IGNORECASE)
+                if marker_title and marker_title.group(1):
+                    return marker_title.group(1).title()
+                break
+    return os.path.splitext(os.path.basename(path))[0]
+
+def chunk_book(path: str, min_words: int = 30, max_words: int = 200, overlap: int = 50) -> list:
+    """
+    Clean and chunk one Gutenberg text file. Returns one dict per chunk with
+    "text", "index" (position in the book), "book_id", "book_title", "chapter"
+    and "offset" (character offset in the file of the chunk's first paragraph).
+    """
+    book_id = book_id_for_path(path)
+    title = read_gutenberg_title(path)
+    with open(path, "r", encoding="utf-8") as f:
+        paragraphs = ((text, (offset, chapter)) for text, offset, chapter in iter_book_paragraphs(f))
+        return [
+            {"text": text, "index": index, "book_id": book_id, "book_title": title,
+             "chapter": info[1], "offset": info[0]}
+            for index, (text, info) in enumerate(_iter_chunk_records(paragraphs, min_words, max_words, overlap))
+        ]
+
+def find_books(directory: str) -> list:
+    """
+    Sorted paths of the .txt files in `directory`.
+    """
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(".txt") and os.path.isfile(os.path.join(directory, name))
+    )
+
+def chunk_books(paths: list, workers: int = None, min_words: int = 30, max_words: int = 200,
+                overlap: int = 50) -> Iterator[tuple]:
+    """
+    Chunk several books in parallel across a process pool (cleaning and chunking
+    are CPU-bound, so threads would serialize on the GIL). Yields (path, chunks)
+    in the order of `paths` as soon as each book is done; chunks are as returned
+    by chunk_book. `workers` defaults to the CPU count; with one worker or one
+    book everything runs in this process.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        for path in paths:
+            yield path, chunk_book(path, min_words, max_words, overlap)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(chunk_book, paths, repeat(min_words), repeat(max_words), repeat(overlap))
+        yield from zip(paths, results)
@@ -1,8 +1,13 @@
-import chromadb
-from chromadb.config import Settings
 import os
+import threading
+import time
+
+from app.telemetry import span
+
+def connect_to_chromadb(chroma_dir: str = None):
+    # chromadb takes most of a second to import, so it is loaded on first connect.
+    import chromadb
 
-def connect_to_chromadb(chroma_dir: str = None) -> chromadb.PersistentClient:
     if chroma_dir is None:
         PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         chroma_dir = os.path.join(PROJECT_ROOT, "chroma_data")
@@ -18,4 +23,144 @@ def get_collection_stats(collection):
         'count': count,
         'sample_metadata_keys': list(sample_data['metadatas'][0].keys()) if sample_data and sample_data['metadatas'] else [],
         'sample_doc_length': len(sample_data['documents'][0]) if sample_data and sample_data['documents'] else 0
-    }
\ No newline at end of file
+    }
+
+def read_collection(collection, include=("documents", "metadatas"), page_size: int = 5000) -> dict:
+    """
+    Read every row of a collection in pages. Returns {"ids": [...], <field>: [...]} for each included field.
+    """
+    rows = {"ids": [], **{field: [] for field in include}}
+    offset = 0
+    while True:
+        page = collection.get(include=list(include), limit=page_size, offset=offset)
+        for key in rows:
+            rows[key].extend(page[key])
+        if len(page["ids"]) < page_size:
+            return rows
+        offset += page_size
+
+
+class _Latency:
+    """Running count / total / max of a latency in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000
+        }
+
+
+class ChromaStore:
+    """
+    Long-lived handle on one ChromaDB directory.
+
+    The PersistentClient is opened once and collection objects are cached, so
+    request-time queries do not re-open the client or re-read the on-disk index.
+    Safe to share between threads. Tracks open and query latencies.
+    """
+
+    def __init__(self, chroma_dir: str):
+        self.chroma_dir = chroma_dir
+        self._client = None
+        self._collections = {}
+        self._lock = threading.Lock()
+        self.open_latency = _Latency()
+        self.collection_open_latency = _Latency()
+        self.query_latency = _Latency()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    start = time.perf_counter()
+                    self._client = connect_to_chromadb(self.chroma_dir)
+                    self.open_latency.record(time.perf_counter() - start)
+        return self._client
+
+    def get_collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        client = self.client
+        with self._lock:
+            if name not in self._collections:
+                start = time.perf_counter()
+                self._collections[name] = client.get_collection(name)
+                self.collection_open_latency.record(time.perf_counter() - start)
+            return self._collections[name]
+
+    def query(self, collection_name: str, **kwargs) -> dict:
+        """
+        Run collection.query(**kwargs) on a cached collection, recording its latency.
+        """
+        collection = self.get_collection(collection_name)
+        with span("chroma_query", collection=collection_name):
+            start = time.perf_counter()
+            results = collection.query(**kwargs)
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self.query_latency.record(elapsed)
+        return results
+
+    def get(self, collection_name: str, **kwargs) -> dict:
+        """
+        Run collection.get(**kwargs) on a cached collection (e.g. to fetch chunks by id).
+        """
+        return self.get_collection(collection_name).get(**kwargs)
+
+    def warm_up(self, collection_names) -> None:
+        """
+        Open the client and the given collections, and run one query against each
+        so the vector index is loaded before the first real request.
+        """
+        for name in collection_names:
+            collection = self.get_collection(name)
+            sample = collection.get(limit=1, include=['embeddings'])
+            if sample["ids"]:
+                collection.query(query_embeddings=[list(sample["embeddings"][0])], n_results=1, include=[])
+
+    def invalidate(self) -> None:
+        """
+        Forget cached collections (e.g. after a collection was deleted and recreated).
+        """
+        with self._lock:
+            self._collections.clear()
+
+    def stats(self) -> dict:
+        return {
+            "chroma_dir": self.chroma_dir,
+            "collections": sorted(self._collections),
+            "client_open": self.open_latency.as_dict(),
+            "collection_open": self.collection_open_latency.as_dict(),
+            "query": self.query_latency.as_dict()
+        }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_chroma_store(chroma_dir: str = None) -> ChromaStore:
+    """
+    Returns the process-wide ChromaStore for a directory (default: chroma_data/).
+    """
+    if chroma_dir is None:
+        PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        chroma_dir = os.path.join(PROJECT_ROOT, "chroma_data")
+    key = os.path.abspath(chroma_dir)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ChromaStore(key)
+        return _stores[key]
@@ -0,0 +1,229 @@
+"""
+Embedding backends. Every query and chunk embedding goes through the backend
+named by EMBEDDING_BACKEND:
+
+- "bedrock" (default): amazon.titan-embed-text-v1 through get_bedrock_embedding(s).
+- "local": all-MiniLM-L6-v2 run in-process on the CPU with onnxruntime, with
+  no network hop. The model is the one chromadb ships for its default
+  embedding function (downloaded once to ~/.cache/chroma/onnx_models), or the
+  model.onnx and tokenizer.json in LOCAL_EMBEDDING_MODEL_DIR.
+
+Vectors from different backends cannot be compared, so each backend has its
+own collection, and so does each local model (see collection_for_backend), along with its own BM25/location
+indexes and vector snapshot.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List
+
+from app.bedrock_embed import get_bedrock_embedding, get_bedrock_embeddings
+from app.telemetry import count, span
+
+if TYPE_CHECKING:
+    import numpy as np
+
+EMBEDDING_BACKENDS = ("bedrock", "local")
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def embedding_backend_name(name: str = None) -> str:
+    name = name or os.getenv("EMBEDDING_BACKEND", "bedrock")
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}; expected one of {EMBEDDING_BACKENDS}")
+    return name
+
+
+def collection_for_backend(collection_name: str, backend=None) -> str:
+    """
+    Name of the collection holding `collection_name`'s chunks embedded by
+    `backend` (a backend or its name): the name itself for Bedrock (so existing
+    collections keep working), "<name>_<backend>_<model>" for the others, e.g.
+    "innocents_abroad_local_all_minilm_l6_v2", so pointing
+    LOCAL_EMBEDDING_MODEL_DIR at another model never mixes its vectors with
+    the previous model's.
+    """
+    if backend is None or isinstance(backend, str):
+        backend = get_embedding_backend(backend)
+    if backend.name == "bedrock":
+        return collection_name
+    model = re.sub(r"[^a-z0-9]+", "_", backend.model_id.lower()).strip("_")
+    return f"{collection_name}_{backend.name}_{model}"
+
+
+class BedrockEmbeddingBackend:
+    """
+    Titan embeddings over Bedrock, cached by the shared embedding cache.
+    """
+
+    name = "bedrock"
+
+    def __init__(self, model_id: str = "amazon.titan-embed-text-v1"):
+        self.model_id = model_id
+
+    def embed(self, text: str, use_cache: bool = True) -> list:
+        return get_bedrock_embedding(text, model_id=self.model_id, use_cache=use_cache)
+
+    def embed_many(self, texts: List[str], max_workers: int = 8, use_cache: bool = True) -> "np.ndarray":
+        return get_bedrock_embeddings(texts, model_id=self.model_id, max_workers=max_workers, use_cache=use_cache)
+
+    def warm_up(self) -> None:
+        from app.bedrock_client import get_bedrock_client
+
+        get_bedrock_client()
+
+
+class LocalEmbeddingBackend:
+    """
+    Sentence embeddings computed in-process with onnxruntime: mean pooling of
+    the model's last hidden state over the attention mask, L2-normalized.
+
+    The tokenizer and the inference session are loaded once, on first use.
+    Texts are sorted by length and split into batches of `batch_size`, each
+    padded only to its longest text, and the batches run on `workers` threads
+    (onnxruntime releases the GIL), each session call using
+    `intra_op_threads` cores. Results are not put in the embedding cache:
+    computing a query embedding takes about as long as looking one up.
+    """
+
+    name = "local"
+
+    def __init__(self, model_dir: str = None, batch_size: int = None, workers: int = None,
+                 intra_op_threads: int = None, max_length: int = 256):
+        self.model_dir = model_dir or os.getenv("LOCAL_EMBEDDING_MODEL_DIR") or None
+        self.model_id = os.path.basename(os.path.normpath(self.model_dir)) if self.model_dir else "all-MiniLM-L6-v2"
+        cpus = os.cpu_count() or 1
+        self.batch_size = batch_size or int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+        self.workers = workers or int(os.getenv("LOCAL_EMBEDDING_WORKERS", str(min(4, cpus))))
+        self.intra_op_threads = intra_op_threads or max(1, cpus // self.workers)
+        self.max_length = max_length
+        self._tokenizer = None
+        self._session = None
+        self._input_names = ()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _model_files(self) -> str:
+        """
+        Directory holding model.onnx and tokenizer.json, downloading chromadb's
+        default model on first use when no model directory is configured.
+        """
+        model_dir = self.model_dir
+        if model_dir is None:
+            from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+
+            model_dir = os.path.join(ONNXMiniLM_L6_V2.DOWNLOAD_PATH, ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME)
+            if not os.path.exists(os.path.join(model_dir, "model.onnx")):
+                print(f"Downloading {ONNXMiniLM_L6_V2.MODEL_NAME} to {ONNXMiniLM_L6_V2.DOWNLOAD_PATH}...")
+                try:
+                    ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])(["warm up"])
+                except Exception as e:
+                    raise RuntimeError(f"Could not download {ONNXMiniLM_L6_V2.MODEL_NAME} ({e}); "
+                                       f"set LOCAL_EMBEDDING_MODEL_DIR to a local copy") from e
+        for name in ("model.onnx", "tokenizer.json"):
+            if not os.path.exists(os.path.join(model_dir, name)):
+                raise FileNotFoundError(f"No {name} in {model_dir}")
+        return model_dir
+
+    def _load(self) -> None:
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            with span("embed_model_load", model=self.model_id):
+                model_dir = self._model_files()
+                tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+                tokenizer.enable_truncation(max_length=self.max_length)
+                tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+                options = onnxruntime.SessionOptions()
+                options.log_severity_level = 3
+                options.intra_op_num_threads = self.intra_op_threads
+                options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+                session = onnxruntime.InferenceSession(os.path.join(model_dir, "model.onnx"), options,
+                                                       providers=["CPUExecutionProvider"])
+            self._tokenizer = tokenizer
+            self._input_names = {model_input.name for model_input in session.get_inputs()}
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local-embed")
+            self._session = session
+
+    def _encode(self, texts: List[str]) -> "np.ndarray":
+        import numpy as np
+
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask,
+                  "token_type_ids": np.zeros_like(input_ids)}
+        hidden = self._session.run(None, {name: inputs[name] for name in self._input_names})[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (pooled / norms).astype(np.float32)
+
+    def embed(self, text: str, use_cache: bool = True) -> list:
+        return self.embed_many([text])[0].tolist()
+
+    def embed_many(self, texts: List[str], max_workers: int = None, use_cache: bool = True) -> "np.ndarray":
+        """
+        Embed `texts` (in input order) as a contiguous float32 matrix.
+        `max_workers` and `use_cache` are accepted for signature compatibility
+        with the Bedrock backend; the thread count is fixed at load time.
+        """
+        import numpy as np
+
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        self._load()
+        unique = list(dict.fromkeys(texts))
+        order = sorted(range(len(unique)), key=lambda i: len(unique[i]))
+        batches = [[unique[i] for i in order[start:start + self.batch_size]]
+                   for start in range(0, len(order), self.batch_size)]
+        with span("embed", model=self.model_id) as embed_span:
+            embed_span.set(texts=len(unique), batches=len(batches))
+            if len(batches) == 1:
+                results = [self._encode(batches[0])]
+            else:
+                results = list(self._executor.map(self._encode, batches))
+        count("local_embeddings", len(unique), model=self.model_id)
+        vectors = dict(zip((unique[i] for i in order), np.concatenate(results)))
+        return np.stack([vectors[text] for text in texts])
+
+    def warm_up(self) -> None:
+        self.embed("warm up")
+
+
+def get_embedding_backend(name: str = None):
+    """
+    Process-wide embedding backend: `name`, or EMBEDDING_BACKEND (default
+    "bedrock"). The local model is loaded on the first embedding, or by
+    warm_up().
+    """
+    name = embedding_backend_name(name)
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = BedrockEmbeddingBackend() if name == "bedrock" else LocalEmbeddingBackend()
+                _backends[name] = backend
+    return backend
+
+
+def set_embedding_backend(name: str, backend) -> None:
+    """
+    Use `backend` for `name` (e.g. a LocalEmbeddingBackend on another model
+    directory), or the default one again if `backend` is None.
+    """
+    with _backends_lock:
+        if backend is None:
+            _backends.pop(name, None)
+        else:
+            _backends[name] = backend
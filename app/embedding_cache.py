@@ -0,0 +1,189 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(PROJECT_ROOT, "cache", "embeddings.sqlite3")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for cache lookups: Unicode NFC and collapsed whitespace.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model id, normalized text).
+
+    Tier 1 is an in-memory LRU of up to `max_memory_items` vectors, held as
+    float32 arrays; every get returns a new list, so callers cannot change a
+    cached vector. Tier 2 is a SQLite file storing vectors as packed float32
+    blobs, capped at `max_disk_items` rows with least-recently-used rows evicted
+    first. The row count is read once when the file is opened and kept up to
+    date by this instance. Entries older than `ttl` seconds (if set) count as
+    misses. Pass path=None for a memory-only cache.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        max_memory_items: int = 4096,
+        max_disk_items: int = 50000,
+        ttl: Optional[float] = None
+    ):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_items = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model_id TEXT, vector BLOB, created_at REAL, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            self._db.commit()
+            self._disk_items = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model_id: str, text: str) -> str:
+        return hashlib.sha256(f"{model_id}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _remember(self, key: str, vector: array, created_at: float) -> None:
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, model_id: str, text: str) -> Optional[list]:
+        """
+        Return the cached embedding, or None on a miss.
+        """
+        key = self.make_key(model_id, text)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0].tolist()
+            if entry is not None:
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    vector = array("f", row[0])
+                    self._db.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, vector, row[1])
+                    self.disk_hits += 1
+                    return vector.tolist()
+                if row is not None:
+                    self._disk_items -= self._db.execute("DELETE FROM embeddings WHERE key = ?", (key,)).rowcount
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def put(self, model_id: str, text: str, vector: list) -> None:
+        key = self.make_key(model_id, text)
+        now = time.time()
+        packed = array("f", vector)
+        with self._lock:
+            self._remember(key, packed, now)
+            if self._db is None:
+                return
+            blob = packed.tobytes()
+            inserted = self._db.execute(
+                "INSERT OR IGNORE INTO embeddings (key, model_id, vector, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)", (key, model_id, blob, now, now)
+            ).rowcount
+            if inserted:
+                self._disk_items += 1
+            else:
+                self._db.execute(
+                    "UPDATE embeddings SET model_id = ?, vector = ?, created_at = ?, last_used = ? WHERE key = ?",
+                    (model_id, blob, now, now, key)
+                )
+            excess = self._disk_items - self.max_disk_items
+            if excess > 0:
+                evicted = self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,)
+                ).rowcount
+                self._disk_items -= evicted
+                self.evictions += evicted
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_items": self._disk_items
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+                self._disk_items = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Returns the process-wide embedding cache, configured from environment variables:
+    EMBEDDING_CACHE_PATH (empty for memory only), EMBEDDING_CACHE_MEMORY_ITEMS,
+    EMBEDDING_CACHE_DISK_ITEMS and EMBEDDING_CACHE_TTL (seconds).
+    Returns None if EMBEDDING_CACHE_DISABLED is set.
+    """
+    global _cache
+    if os.getenv("EMBEDDING_CACHE_DISABLED", "") not in {"", "0", "false", "False"}:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                ttl = os.getenv("EMBEDDING_CACHE_TTL")
+                _cache = EmbeddingCache(
+                    path=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH) or None,
+                    max_memory_items=int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "4096")),
+                    max_disk_items=int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "50000")),
+                    ttl=float(ttl) if ttl else None
+                )
+    return _cache
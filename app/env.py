@@ -0,0 +1,22 @@
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env() -> None:
+    """
+    Load the project's .env file into os.environ, once per process. Variables
+    already set in the environment win. Called by the factories that first
+    need credentials (the Bedrock client, the weather client) rather than at
+    import, so importing the app does not pay for python-dotenv.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _loaded = True
@@ -0,0 +1,184 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from app.rate_limit import TokenBucket
+from app.telemetry import count
+
+_DONE = object()
+
+
+class IngestPipeline:
+    """
+    Staged ingestion pipeline: chunks -> metadata extraction -> embedding -> writer.
+
+    Each remote stage runs on its own bounded pool of worker threads, stages are
+    connected by bounded queues (a slow stage blocks the ones before it instead of
+    buffering the whole book in memory), and an optional token bucket per stage
+    caps the rate of stage calls: one token per item, or per batch when the
+    stage is batched (a batch is one downstream request). A single writer thread collects finished items and
+    hands them to `write` in large batches.
+
+    Stage functions take and return an item dict; an exception drops that item
+    and is recorded in `errors`. With `metadata_batch_size` / `embed_batch_size`
+    > 1 that stage instead receives a list of up to that many items and returns
+    one result per item, in order; a result that is an Exception is recorded as
+    that item's error, and an exception raised by the call fails the whole batch.
+    """
+
+    def __init__(
+        self,
+        extract_metadata: Callable[[dict], dict],
+        embed: Callable[[dict], dict],
+        write: Callable[[list], None],
+        metadata_workers: int = 4,
+        embedding_workers: int = 8,
+        queue_size: int = 64,
+        write_batch_size: int = 256,
+        metadata_rps: Optional[float] = None,
+        embedding_rps: Optional[float] = None,
+        on_item_done: Optional[Callable[[], None]] = None,
+        embed_batch_size: int = 1,
+        metadata_batch_size: int = 1
+    ):
+        self.extract_metadata = extract_metadata
+        self.embed = embed
+        self.write = write
+        self.metadata_workers = max(1, metadata_workers)
+        self.embedding_workers = max(1, embedding_workers)
+        self.queue_size = queue_size
+        self.write_batch_size = max(1, write_batch_size)
+        self.metadata_limiter = TokenBucket(metadata_rps)
+        self.embedding_limiter = TokenBucket(embedding_rps)
+        self.on_item_done = on_item_done
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.metadata_batch_size = max(1, metadata_batch_size)
+        self.errors = []
+        self.written = 0
+        self._errors_lock = threading.Lock()
+
+    def _record_error(self, item: dict, stage: str, exc: Exception) -> None:
+        with self._errors_lock:
+            self.errors.append({"index": item.get("index"), "stage": stage, "error": str(exc)})
+        count("ingest_errors", stage=stage, error=type(exc).__name__)
+        print(f"Error processing chunk {item.get('index')} ({stage}): {exc}")
+        if self.on_item_done:
+            self.on_item_done()
+
+    def _stage_worker(self, name, fn, limiter, inbox, outbox, remaining, next_workers, batch_size=1):
+        finished = False
+        while not finished:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if batch_size == 1:
+                try:
+                    limiter.acquire()
+                    outbox.put(fn(item))
+                except Exception as e:
+                    self._record_error(item, name, e)
+                continue
+
+            batch = [item]
+            while len(batch) < batch_size:
+                try:
+                    following = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if following is _DONE:
+                    finished = True
+                    break
+                batch.append(following)
+            try:
+                limiter.acquire()
+                results = fn(batch)
+            except Exception as e:
+                for failed in batch:
+                    self._record_error(failed, name, e)
+                continue
+            for failed, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self._record_error(failed, name, result)
+                else:
+                    outbox.put(result)
+        with remaining["lock"]:
+            remaining["count"] -= 1
+            last = remaining["count"] == 0
+        if last:
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    def _writer(self, inbox):
+        batch = []
+        while True:
+            item = inbox.get()
+            if item is not _DONE:
+                batch.append(item)
+            if batch and (item is _DONE or len(batch) >= self.write_batch_size):
+                try:
+                    self.write(batch)
+                    self.written += len(batch)
+                except Exception as e:
+                    for failed in batch:
+                        self._record_error(failed, "write", e)
+                    batch = []
+                    continue
+                if self.on_item_done:
+                    for _ in batch:
+                        self.on_item_done()
+                batch = []
+            if item is _DONE:
+                break
+
+    def run(self, items: Iterable[dict]) -> dict:
+        """
+        Push every item through the pipeline and block until all are written.
+        Returns a summary with counts, errors and elapsed seconds.
+        """
+        start = time.perf_counter()
+        to_metadata = queue.Queue(maxsize=self.queue_size)
+        to_embedding = queue.Queue(maxsize=self.queue_size)
+        to_writer = queue.Queue(maxsize=max(self.queue_size, self.write_batch_size))
+
+        metadata_left = {"count": self.metadata_workers, "lock": threading.Lock()}
+        embedding_left = {"count": self.embedding_workers, "lock": threading.Lock()}
+        threads = [
+            threading.Thread(
+                target=self._stage_worker,
+                args=("metadata", self.extract_metadata, self.metadata_limiter,
+                      to_metadata, to_embedding, metadata_left, self.embedding_workers,
+                      self.metadata_batch_size),
+                daemon=True
+            )
+            for _ in range(self.metadata_workers)
+        ]
+        threads += [
+            threading.Thread(
+                target=self._stage_worker,
+                args=("embedding", self.embed, self.embedding_limiter,
+                      to_embedding, to_writer, embedding_left, 1, self.embed_batch_size),
+                daemon=True
+            )
+            for _ in range(self.embedding_workers)
+        ]
+        threads.append(threading.Thread(target=self._writer, args=(to_writer,), daemon=True))
+        for t in threads:
+            t.start()
+
+        submitted = 0
+        for item in items:
+            to_metadata.put(item)
+            submitted += 1
+        for _ in range(self.metadata_workers):
+            to_metadata.put(_DONE)
+
+        for t in threads:
+            t.join()
+
+        return {
+            "submitted": submitted,
+            "written": self.written,
+            "errors": list(self.errors),
+            "elapsed": time.perf_counter() - start
+        }
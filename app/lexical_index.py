@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+from collections import Counter
+from typing import List, Optional, Tuple
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he her him his how i if in into is it its "
+    "me my no not of on or our she so that the their them then there these they this to was we were what when "
+    "where which who why will with would you your".split()
+)
+# Question framing that says nothing about which passage is wanted; dropped from
+# queries only (the chunks themselves keep these words).
+QUERY_STOPWORDS = frozenset(
+    "about describe described think thought say said says tell told write wrote written twain".split()
+)
+_TOKEN = re.compile(r"\w+")
+
+# Metadata fields indexed next to the chunk text, and how many times each of
+# their tokens counts (a place named in the Nova Pro metadata is a strong signal).
+METADATA_FIELDS = {"locations": 2, "people": 2}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens without stopwords.
+    """
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def index_path(chroma_dir: str, collection_name: str) -> str:
+    return os.path.join(chroma_dir, f"lexical_index_{collection_name}.npz")
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the chunks of one collection.
+
+    Postings are stored in CSR form: for term t, doc_ids[indptr[t]:indptr[t+1]]
+    are the chunks containing it and weights[...] their precomputed BM25 term
+    weights (idf times the saturated term frequency), so a query is a handful of
+    NumPy slices and one scatter-add. The whole index is a few flat arrays and is
+    saved as one compressed .npz file.
+    """
+
+    def __init__(self, ids: List[str], terms: List[str], indptr, doc_ids, weights,
+                 book_ids: Optional[List[str]] = None, doc_books=None):
+        import numpy as np
+
+        self.ids = ids
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.book_ids = book_ids or []
+        self.doc_books = doc_books if doc_books is not None else np.full(len(ids), -1, dtype=np.int32)
+
+    @classmethod
+    def build(cls, ids: List[str], documents: List[str], metadatas: List[dict] = None,
+              k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        Index chunk texts plus their `locations`/`people` metadata.
+        """
+        import numpy as np
+
+        metadatas = metadatas or [{}] * len(ids)
+        postings = {}
+        doc_lengths = np.zeros(len(ids), dtype=np.float32)
+        book_index = {}
+        doc_books = np.full(len(ids), -1, dtype=np.int32)
+        for doc, (text, meta) in enumerate(zip(documents, metadatas)):
+            meta = meta or {}
+            counts = Counter(tokenize(text or ""))
+            for field, boost in METADATA_FIELDS.items():
+                for token in tokenize(str(meta.get(field) or "")):
+                    counts[token] += boost
+            doc_lengths[doc] = sum(counts.values())
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc, count))
+            book = meta.get("book_id")
+            if book:
+                doc_books[doc] = book_index.setdefault(book, len(book_index))
+
+        n_docs = max(len(ids), 1)
+        avg_length = float(doc_lengths.mean()) if len(ids) else 1.0
+        length_norm = k1 * (1 - b + b * doc_lengths / max(avg_length, 1e-9))
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids = np.empty(sum(len(postings[t]) for t in terms), dtype=np.int32)
+        weights = np.empty(len(doc_ids), dtype=np.float32)
+        pos = 0
+        for i, term in enumerate(terms):
+            entries = postings[term]
+            docs = np.fromiter((doc for doc, _ in entries), dtype=np.int32, count=len(entries))
+            tf = np.fromiter((count for _, count in entries), dtype=np.float32, count=len(entries))
+            idf = np.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            doc_ids[pos:pos + len(entries)] = docs
+            weights[pos:pos + len(entries)] = idf * tf * (k1 + 1) / (tf + length_norm[docs])
+            pos += len(entries)
+            indptr[i + 1] = pos
+        book_ids = sorted(book_index, key=book_index.get)
+        return cls(list(ids), terms, indptr, doc_ids, weights, book_ids, doc_books)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, n_results: int = 5, book=None) -> List[Tuple[str, float]]:
+        """
+        Top `n_results` (chunk id, BM25 score) pairs for the query, best first.
+        `book` restricts results to one book id or a list of them.
+        """
+        import numpy as np
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)) - QUERY_STOPWORDS:
+            t = self.terms.get(term)
+            if t is not None:
+                start, end = self.indptr[t], self.indptr[t + 1]
+                scores[self.doc_ids[start:end]] += self.weights[start:end]
+        if book:
+            wanted = [self.book_ids.index(b) for b in ([book] if isinstance(book, str) else book)
+                      if b in self.book_ids]
+            scores[~np.isin(self.doc_books, wanted)] = 0.0
+        matches = np.flatnonzero(scores)
+        if not len(matches):
+            return []
+        if len(matches) > n_results:
+            matches = matches[np.argpartition(-scores[matches], n_results - 1)[:n_results]]
+        matches = matches[np.argsort(-scores[matches], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in matches]
+
+    def save(self, path: str) -> None:
+        """
+        Write the index atomically as a compressed .npz file.
+        """
+        import numpy as np
+
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            ids=np.frombuffer("\n".join(self.ids).encode("utf-8"), dtype=np.uint8),
+            terms=np.frombuffer("\n".join(sorted(self.terms, key=self.terms.get)).encode("utf-8"), dtype=np.uint8),
+            book_ids=np.frombuffer("\n".join(self.book_ids).encode("utf-8"), dtype=np.uint8),
+            indptr=self.indptr,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            doc_books=self.doc_books
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        import numpy as np
+
+        def strings(array) -> List[str]:
+            text = array.tobytes().decode("utf-8")
+            return text.split("\n") if text else []
+
+        with np.load(path) as data:
+            return cls(
+                strings(data["ids"]), strings(data["terms"]), data["indptr"], data["doc_ids"], data["weights"],
+                strings(data["book_ids"]), data["doc_books"]
+            )
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], weights: List[float] = None, k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked id lists: each id scores sum(weight / (k + rank)) over
+    the lists it appears in. Returns (id, score) pairs, best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(chroma_dir: str, collection_name: str) -> Optional[BM25Index]:
+    """
+    Returns the saved BM25 index of a collection, or None if it has not been
+    built. Loaded once per process and reloaded when the file changes.
+    """
+    path = index_path(chroma_dir, collection_name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, BM25Index.load(path))
+            _indexes[path] = cached
+        return cached[1]
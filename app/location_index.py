@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+# Countries, continents and regions that show up in the travel books. A weather
+# lookup for these either fails or returns some arbitrary town, so they are
+# kept out of the city list.
+REGION_NAMES = frozenset(name.lower() for name in (
+    "Africa", "America", "Asia", "Asia Minor", "Europe", "Orient", "the East", "Holy Land", "Levant",
+    "Algeria", "Austria", "Bavaria", "Belgium", "Crimea", "Cyprus", "Egypt", "England", "France",
+    "Germany", "Great Britain", "Greece", "Holland", "Ireland", "Italy", "Lebanon", "Morocco",
+    "Ottoman Empire", "Palestine", "Persia", "Portugal", "Russia", "Sardinia", "Scotland", "Sicily",
+    "Spain", "Switzerland", "Syria", "Turkey", "United States", "USA", "Corsica", "Malta", "Madeira",
+    "Galilee", "Judea", "Samaria", "Lombardy", "Tuscany", "Piedmont", "Savoy", "Andalusia", "Arabia",
+    "Mesopotamia", "Nubia", "Ethiopia", "Canaan", "Bashan", "Gilead", "Moab", "Phoenicia", "Azores",
+    "Gibraltar", "Mediterranean", "Atlantic", "Bosporus", "Dardanelles", "Jordan", "Nile", "Alps",
+    "Apennines", "Pyrenees", "Sahara",
+))
+
+# Words that mark a geographic feature or area rather than a town.
+REGION_WORDS = frozenset((
+    "bay", "coast", "county", "desert", "empire", "gulf", "island", "islands", "isles", "kingdom", "lake",
+    "land", "mount", "mountain", "mountains", "ocean", "plain", "plains", "province", "region", "republic",
+    "river", "sea", "state", "states", "strait", "straits", "valley",
+))
+
+_PLACEHOLDERS = frozenset(("", "none", "unknown", "n/a", "na", "not mentioned", "various", "null"))
+_LOWERCASE_WORDS = frozenset(("of", "on", "and", "de", "del", "della", "di", "la", "le", "du"))
+
+
+def canonical_place(name: str) -> str:
+    """
+    Normalize a place name from the metadata: Unicode NFC, surrounding quotes
+    and punctuation removed, a leading "the" dropped, whitespace collapsed and
+    words capitalized (except connectors such as "of"). Returns "" for
+    placeholders such as "Unknown".
+    """
+    name = unicodedata.normalize("NFC", name)
+    name = " ".join(name.strip(" \t\r\n\"'“”‘’.,;:()[]").split())
+    if name.lower() in _PLACEHOLDERS:
+        return ""
+    name = re.sub(r"^the\s+", "", name, flags=re.IGNORECASE)
+    if name.isupper():
+        name = name.lower()
+    words = name.split(" ")
+    return " ".join(
+        word.lower() if i and word.lower() in _LOWERCASE_WORDS else word[:1].upper() + word[1:]
+        for i, word in enumerate(words)
+    )
+
+
+def place_kind(name: str) -> str:
+    """
+    "region" for countries, regions and geographic features, otherwise "city".
+    """
+    lowered = name.lower()
+    if lowered in REGION_NAMES or f"the {lowered}" in REGION_NAMES:
+        return "region"
+    if any(word in REGION_WORDS for word in lowered.split()):
+        return "region"
+    return "city"
+
+
+def parse_locations(value) -> List[str]:
+    """
+    Canonical place names from a metadata `locations` value (a comma-joined
+    string, as written by flatten_metadata, or a list), in order, without duplicates.
+    """
+    parts = value if isinstance(value, list) else str(value or "").split(",")
+    return list(dict.fromkeys(place for place in (canonical_place(str(part)) for part in parts) if place))
+
+
+def index_path(chroma_dir: str, collection_name: str) -> str:
+    return os.path.join(chroma_dir, f"location_index_{collection_name}.json")
+
+
+class LocationIndex:
+    """
+    Canonical place name -> chunk ids, with each place classified as "city" or
+    "region", plus the reverse chunk id -> places map used at query time.
+
+    Stored as JSON next to the ChromaDB files; chunk ids are written once and
+    places refer to them by position.
+    """
+
+    def __init__(self, places: Dict[str, dict]):
+        self.places = places
+        self.chunk_places = {}
+        for name, entry in places.items():
+            for chunk_id in entry["chunks"]:
+                self.chunk_places.setdefault(chunk_id, []).append(name)
+
+    @classmethod
+    def build(cls, ids: List[str], metadatas: List[dict]) -> "LocationIndex":
+        places = {}
+        for chunk_id, meta in zip(ids, metadatas):
+            for name in parse_locations((meta or {}).get("locations")):
+                entry = places.setdefault(name, {"kind": place_kind(name), "chunks": []})
+                entry["chunks"].append(chunk_id)
+        return cls(places)
+
+    def kind(self, name: str) -> Optional[str]:
+        entry = self.places.get(canonical_place(name))
+        return entry["kind"] if entry else None
+
+    def chunks_for(self, name: str) -> List[str]:
+        entry = self.places.get(canonical_place(name))
+        return list(entry["chunks"]) if entry else []
+
+    def cities_for_chunks(self, chunk_ids: Iterable[str]) -> List[str]:
+        """
+        Cities mentioned in the given chunks, in chunk order, without duplicates.
+        Regions are left out.
+        """
+        cities = {}
+        for chunk_id in chunk_ids:
+            for name in self.chunk_places.get(chunk_id, ()):
+                if self.places[name]["kind"] == "city":
+                    cities[name] = None
+        return list(cities)
+
+    def save(self, path: str, collection_name: str) -> None:
+        chunk_ids = sorted(self.chunk_places)
+        position = {chunk_id: i for i, chunk_id in enumerate(chunk_ids)}
+        data = {
+            "collection": collection_name,
+            "updated_at": time.time(),
+            "chunk_ids": chunk_ids,
+            "places": {
+                name: {"kind": entry["kind"], "chunks": [position[chunk_id] for chunk_id in entry["chunks"]]}
+                for name, entry in sorted(self.places.items())
+            }
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LocationIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        chunk_ids = data["chunk_ids"]
+        return cls({
+            name: {"kind": entry["kind"], "chunks": [chunk_ids[i] for i in entry["chunks"]]}
+            for name, entry in data["places"].items()
+        })
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_location_index(chroma_dir: str, collection_name: str) -> Optional[LocationIndex]:
+    """
+    Returns the saved location index of a collection, or None if it has not been
+    built. Loaded once per process and reloaded when the file changes.
+    """
+    path = index_path(chroma_dir, collection_name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                cached = (mtime, LocationIndex.load(path))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: ignoring unreadable location index {path}: {e}")
+                return None
+            _indexes[path] = cached
+        return cached[1]
@@ -0,0 +1,118 @@
+import asyncio
+import time
+from typing import Callable, List
+
+from app.telemetry import count, observe
+
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently from one event loop and processes
+    them together. A batch is sent when `max_batch_size` items are waiting or
+    `max_wait` seconds after its first item arrived, whichever comes first.
+
+    `process(items)` is a blocking function run on a worker thread by `run`
+    (e.g. async_workflow._run_blocking) that returns one result per item, in
+    order. A result that is an Exception is raised to that item's caller only.
+    If `process` itself raises, every caller in the batch gets the error.
+
+    Records queue depth and batch sizes in `stats()`. With telemetry on it also
+    counts batches and items and observes the time items wait to be sent.
+    """
+
+    def __init__(self, name: str, process: Callable[[list], list], run: Callable,
+                 max_batch_size: int = 16, max_wait: float = 0.005):
+        self.name = name
+        self.process = process
+        self.run = run
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._pending = []
+        self._timer = None
+        self._running = set()
+        self.submitted = 0
+        self.batched = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._batch_sizes = {}
+
+    @property
+    def queue_depth(self) -> int:
+        """Items waiting to be sent in a batch."""
+        return len(self._pending)
+
+    @property
+    def in_flight(self) -> int:
+        """Batches being processed."""
+        return len(self._running)
+
+    async def submit(self, item):
+        """
+        Queue `item` for the next batch and wait for its result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        depth = len(self._pending)
+        self.submitted += 1
+        self._depth_total += depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        if depth >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        # Callers that gave up while waiting (e.g. a cancelled speculative embedding) are dropped.
+        batch = [entry for entry in batch if not entry[1].done()]
+        if not batch:
+            return
+        self.batches += 1
+        self.batched += len(batch)
+        self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+        task = asyncio.ensure_future(self._process(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _process(self, batch: List[tuple]) -> None:
+        sent = time.perf_counter()
+        count("batches", batcher=self.name)
+        count("batched_items", len(batch), batcher=self.name)
+        for _, _, queued in batch:
+            observe("batch_wait_seconds", sent - queued, batcher=self.name)
+        try:
+            results = await self.run(self.process, [item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self.queue_depth,
+            "in_flight_batches": self.in_flight,
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "mean_batch_size": self.batched / self.batches if self.batches else 0.0,
+            "mean_queue_depth": self._depth_total / self.submitted if self.submitted else 0.0,
+            "max_queue_depth": self.max_queue_depth,
+            "batch_sizes": dict(sorted(self._batch_sizes.items()))
+        }
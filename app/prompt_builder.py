@@ -0,0 +1,136 @@
+import math
+import os
+import re
+from typing import List
+
+from app.lexical_index import QUERY_STOPWORDS, tokenize
+
+_SENTENCE = re.compile(r"[^.!?]+(?:[.!?]+[\"')\]]*|$)")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count of English text for budgeting (about 4 characters per
+    token). Bedrock reports the exact count in each response's usage.
+    """
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def section_budget(section: str) -> int:
+    """
+    Token budget of a prompt section from PROMPT_<SECTION>_TOKENS: "book"
+    (default 300), "weather" (default 100) or "query" (default 200). 0 means
+    no budget and the old fixed-size formatting.
+    """
+    defaults = {"book": "300", "weather": "100", "query": "200"}
+    return int(os.getenv(f"PROMPT_{section.upper()}_TOKENS", defaults[section]))
+
+
+def prompt_caching_enabled() -> bool:
+    return os.getenv("PROMPT_CACHING", "1") not in {"0", "false", "False"}
+
+
+def compact_weather_enabled() -> bool:
+    return os.getenv("PROMPT_COMPACT_WEATHER", "1") not in {"0", "false", "False"}
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """
+    `text` cut at a word boundary to about `budget` tokens (unchanged if it fits or budget is 0).
+    """
+    if not budget or estimate_tokens(text) <= budget:
+        return text
+    return text[:budget * 4].rsplit(" ", 1)[0] + "..."
+
+
+def fit_lines(lines: List[str], budget: int) -> List[str]:
+    """
+    The leading `lines` that fit in `budget` tokens together (at least the
+    first one, cut to the budget). Order the lines most important first.
+    """
+    if not budget:
+        return list(lines)
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            if not kept:
+                kept.append(truncate_to_budget(line, budget))
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def _source(meta: dict) -> str:
+    if not meta.get("book_title"):
+        return ""
+    chapter = meta.get("chapter")
+    return f" ({meta['book_title']}" + (f", ch. {chapter}" if chapter else "") + ")"
+
+
+def pack_passages(query: str, documents: List[str], metadatas: List[dict], budget: int) -> str:
+    """
+    Book passages for a prompt in at most about `budget` tokens.
+
+    Every passage is split into sentences, and sentences are taken in order of
+    relevance until the budget is spent: first by how many of the query's terms
+    they contain, then by the passage's retrieval rank, then by position. So
+    the sentences that match the query come first, and with no matches the
+    text of the best-ranked passages is used from the top. Each passage that
+    gets any sentences is shown once, in rank order, with its summary and its
+    chosen sentences in their original order (gaps marked with "...").
+    """
+    terms = set(tokenize(query)) - QUERY_STOPWORDS
+    candidates = []
+    for rank, doc in enumerate(documents):
+        for position, sentence in enumerate(match.group().strip() for match in _SENTENCE.finditer(doc)):
+            if sentence:
+                overlap = len(terms.intersection(tokenize(sentence)))
+                candidates.append((-overlap, rank, position, sentence))
+    candidates.sort(key=lambda candidate: candidate[:3])
+
+    chosen, used = {}, 0
+    for _, rank, position, sentence in candidates:
+        header = 0
+        if rank not in chosen:
+            meta = metadatas[rank] or {}
+            header = estimate_tokens(f"[{rank + 1}]{_source(meta)}\nSummary: {meta.get('summary', '')}\n") + 2
+        cost = estimate_tokens(sentence) + 1 + header
+        if used + cost > budget:
+            continue
+        chosen.setdefault(rank, []).append((position, sentence))
+        used += cost
+    if not chosen and documents:
+        return truncate_to_budget(documents[0], budget)
+
+    sections = []
+    for number, rank in enumerate(sorted(chosen), 1):
+        meta = metadatas[rank] or {}
+        text, previous = [], -1
+        for position, sentence in sorted(chosen[rank]):
+            if position != previous + 1:
+                text.append("...")
+            text.append(sentence)
+            previous = position
+        summary = f"Summary: {meta['summary']}\n" if meta.get("summary") else ""
+        sections.append(f"[{number}]{_source(meta)}\n{summary}{' '.join(text)}")
+    return "\n\n".join(sections)
+
+
+def converse_request(model_id: str, system: str, user_text: str, max_tokens: int, temperature: float) -> dict:
+    """
+    Bedrock converse arguments with the static instructions in `system` and the
+    per-call text as the user message. With PROMPT_CACHING on (the default), a
+    cache point follows the system prompt so Bedrock can reuse it across calls
+    instead of processing it again.
+    """
+    system_blocks = [{"text": system}]
+    if prompt_caching_enabled():
+        system_blocks.append({"cachePoint": {"type": "default"}})
+    return {
+        "modelId": model_id,
+        "system": system_blocks,
+        "messages": [{"role": "user", "content": [{"text": user_text}]}],
+        "inferenceConfig": {"maxTokens": max_tokens, "temperature": temperature}
+    }
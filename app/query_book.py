@@ -1,48 +1,277 @@
 import os
-from app.chroma_utils import connect_to_chromadb
-from app.bedrock_embed import get_bedrock_embedding
+from app.chroma_utils import get_chroma_store
+from app.embedding_backend import collection_for_backend, get_embedding_backend
+from app.lexical_index import get_lexical_index, reciprocal_rank_fusion
+from app.prompt_builder import pack_passages, section_budget
+from app.resilience import is_unavailable_error
+from app.vector_snapshot import get_vector_snapshot
 
-COLLECTION_NAME = "innocents_abroad"
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "innocents_abroad")
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-CHROMA_DIR = os.path.join(PROJECT_ROOT, "chroma_data")
-client = connect_to_chromadb(CHROMA_DIR)
+CHROMA_DIR = os.getenv("CHROMA_DIR", os.path.join(PROJECT_ROOT, "chroma_data"))
+
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+VECTOR_BACKENDS = ("chroma", "snapshot")
+_missing_index_warned = set()
+_missing_snapshot_warned = set()
+
+def _retrieval_mode() -> str:
+    mode = os.getenv("RETRIEVAL_MODE", "vector").lower()
+    return mode if mode in RETRIEVAL_MODES else "vector"
+
+def _vector_backend() -> str:
+    backend = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    return backend if backend in VECTOR_BACKENDS else "chroma"
+
+def _resolve_backend(backend: str, chroma_dir: str, collection_name: str) -> tuple:
+    """
+    (backend, snapshot): the vector snapshot to search if `backend` is "snapshot"
+    and one exists, else ("chroma", None).
+    """
+    backend = backend or _vector_backend()
+    if backend != "snapshot":
+        return backend, None
+    snapshot = get_vector_snapshot(chroma_dir, collection_name)
+    if snapshot is None:
+        if collection_name not in _missing_snapshot_warned:
+            _missing_snapshot_warned.add(collection_name)
+            print(f"Warning: no vector snapshot for '{collection_name}', using ChromaDB")
+        return "chroma", None
+    return backend, snapshot
+
+def _vector_query(store, snapshot, collection_name: str, query_embeddings: list, n_results: int, book=None) -> list:
+    """
+    Top `n_results` chunks for each query embedding, searched together, as one
+    {"ids", "documents", "metadatas"} dict per query.
+    """
+    if snapshot is not None:
+        return [snapshot.rows([row for row, _ in hits])
+                for hits in snapshot.search(query_embeddings, n_results, book=book)]
+    query_args = {}
+    if book:
+        query_args["where"] = {"book_id": book} if isinstance(book, str) else {"book_id": {"$in": list(book)}}
+    results = store.query(
+        collection_name,
+        query_embeddings=list(query_embeddings),
+        n_results=n_results,
+        include=['documents', 'metadatas'],
+        **query_args
+    )
+    return [{key: results[key][i] for key in ("ids", "documents", "metadatas")} for i in range(len(results["ids"]))]
+
+class RetrievalContext:
+    """
+    One retrieval pass for a query: embeds the query once and runs a single
+    collection query returning documents and metadatas for the top `n_results`
+    chunks. Book passage formatting and city extraction both read from it, so a
+    "both" query pays for one embedding and one vector search instead of two.
+    Pass `query_embedding` if the query has already been embedded, and `book`
+    (a book id or a list of them) to search only those books of the collection.
+
+    `mode` (default: RETRIEVAL_MODE, else "vector") selects the ranker:
+    "vector" is dense search only; "lexical" uses the local BM25 index only and
+    makes no Bedrock call; "hybrid" fuses the BM25 and vector rankings with
+    reciprocal rank fusion, and falls back to lexical results if the query
+    cannot be embedded. Without a BM25 index on disk every mode is "vector".
+    Vector mode also answers from the BM25 index, when there is one, while
+    Bedrock is unavailable.
+
+    `backend` (default: VECTOR_BACKEND, else "chroma") selects where dense
+    search runs: "chroma" queries the ChromaDB collection; "snapshot" does an
+    exact search of the memory-mapped vector snapshot exported by
+    store_to_chroma, and also reads documents from it. Without a snapshot on
+    disk the backend is "chroma".
+
+    `embedding_backend` (default: EMBEDDING_BACKEND, else "bedrock") embeds the
+    query, and the search runs on that backend's copy of `collection_name`
+    (see embedding_backend.collection_for_backend), indexes included.
+
+    `vector_rows` are the results of a vector search already run for this query
+    (see retrieve_batch); vector mode uses them instead of searching again.
+    """
+
+    def __init__(self,
+                 query: str,
+                 chroma_dir: str = CHROMA_DIR,
+                 collection_name: str = COLLECTION_NAME,
+                 n_results: int = 5,
+                 query_embedding: list = None,
+                 book=None,
+                 mode: str = None,
+                 backend: str = None,
+                 vector_rows: dict = None,
+                 embedding_backend: str = None):
+        self.query = query
+        self.n_results = n_results
+        self.query_embedding = query_embedding
+        self.mode = mode or _retrieval_mode()
+        self.chroma_dir = chroma_dir
+        self._store = get_chroma_store(chroma_dir)
+        self._embedder = get_embedding_backend(embedding_backend)
+        collection_name = collection_for_backend(collection_name, self._embedder)
+        self.collection_name = collection_name
+        self._book = book
+        self.backend, self._snapshot = _resolve_backend(backend, chroma_dir, collection_name)
+
+        if self.mode == "vector":
+            if vector_rows is not None:
+                self._set_rows(vector_rows)
+                return
+            try:
+                self._vector_search(n_results)
+                return
+            except Exception as e:
+                index = get_lexical_index(chroma_dir, collection_name) if is_unavailable_error(e) else None
+                if index is None:
+                    raise
+                print(f"Warning: vector search unavailable ({e}), using lexical results only")
+                self.mode = "lexical"
+                self._load([chunk_id for chunk_id, _ in index.search(query, n_results, book=book)])
+                return
+
+        index = get_lexical_index(chroma_dir, collection_name)
+        if index is None:
+            if collection_name not in _missing_index_warned:
+                _missing_index_warned.add(collection_name)
+                print(f"Warning: no lexical index for '{collection_name}', using vector search")
+            self.mode = "vector"
+            self._vector_search(n_results)
+            return
+
+        candidates = max(n_results * 4, 20) if self.mode == "hybrid" else n_results
+        lexical_ids = [chunk_id for chunk_id, _ in index.search(query, candidates, book=book)]
+        if self.mode == "lexical":
+            self._load(lexical_ids)
+            return
+        try:
+            self._vector_search(candidates)
+        except Exception as e:
+            if not is_unavailable_error(e):
+                raise
+            print(f"Warning: vector search unavailable ({e}), using lexical results only")
+            self.mode = "lexical"
+            self._load(lexical_ids[:n_results])
+            return
+
+        vector_ids = self.ids
+        rows = {chunk_id: (doc, meta) for chunk_id, doc, meta in zip(vector_ids, self.documents, self.metadatas)}
+        weight = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+        fused = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([vector_ids, lexical_ids], [1.0, weight])]
+        self._load(fused[:n_results], rows)
+
+    def _vector_search(self, n_results: int) -> None:
+        if self.query_embedding is None:
+            self.query_embedding = self._embedder.embed(self.query)
+        self._set_rows(_vector_query(self._store, self._snapshot, self.collection_name, [self.query_embedding],
+                                     n_results, self._book)[0])
+
+    def _set_rows(self, rows: dict) -> None:
+        self.ids = rows["ids"]
+        self.documents = rows["documents"]
+        self.metadatas = rows["metadatas"]
+
+    def _load(self, chunk_ids: list, rows: dict = None) -> None:
+        """
+        Set the results to `chunk_ids` in order, reading any rows not already in
+        `rows` from the vector snapshot or ChromaDB.
+        """
+        rows = dict(rows or {})
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in rows]
+        if missing:
+            if self._snapshot is not None:
+                fetched = self._snapshot.get(missing)
+            else:
+                fetched = self._store.get(self.collection_name, ids=missing, include=['documents', 'metadatas'])
+            rows.update(zip(fetched["ids"], zip(fetched["documents"], fetched["metadatas"])))
+        self.ids = [chunk_id for chunk_id in chunk_ids if chunk_id in rows]
+        self.documents = [rows[chunk_id][0] for chunk_id in self.ids]
+        self.metadatas = [rows[chunk_id][1] for chunk_id in self.ids]
+
+    def format_passages(self, n_results: int = 3, preview_length: int = 300, token_budget: int = None) -> str:
+        """
+        Format the top `n_results` chunks as the book answer used in prompts.
+        With a `token_budget`, the sentences of those chunks that best match
+        the query are packed into about that many tokens instead of
+        fixed-length previews (see prompt_builder.pack_passages).
+        """
+        if not self.documents:
+            return "No relevant passages found in 'The Innocents Abroad.'"
+        if token_budget:
+            return pack_passages(self.query, self.documents[:n_results], self.metadatas[:n_results], token_budget)
+
+        output = []
+        for idx, doc in enumerate(self.documents[:n_results]):
+            meta = self.metadatas[idx]
+            summary = meta.get("summary", "")
+            preview = doc[:preview_length] + ("..." if len(doc) > preview_length else "")
+            source = ""
+            if meta.get("book_title"):
+                chapter = meta.get("chapter")
+                source = f"Source: {meta['book_title']}" + (f", chapter {chapter}" if chapter else "") + "\n"
+            output.append(
+                f"Result {idx+1}:\n"
+                f"{source}"
+                f"Summary: {summary}\n"
+                f"Passage: {preview}\n"
+            )
+        return "\n".join(output)
+
+def retrieve_batch(queries: list,
+                   query_embeddings: list,
+                   chroma_dir: str = CHROMA_DIR,
+                   collection_name: str = COLLECTION_NAME,
+                   n_results: int = 5,
+                   book=None,
+                   mode: str = None,
+                   backend: str = None,
+                   embedding_backend: str = None) -> list:
+    """
+    One RetrievalContext per query, for many queries at once. In vector mode the
+    queries with an embedding (None where there is none) are searched together,
+    in one multi-query collection.query or one snapshot matrix product. Queries
+    without an embedding, and all queries in other modes, are retrieved one by one.
+    """
+    mode = mode or _retrieval_mode()
+    batched = [i for i, embedding in enumerate(query_embeddings) if embedding is not None] if mode == "vector" else []
+    vector_rows = {}
+    if len(batched) > 1:
+        physical_name = collection_for_backend(collection_name, embedding_backend)
+        _, snapshot = _resolve_backend(backend, chroma_dir, physical_name)
+        results = _vector_query(get_chroma_store(chroma_dir), snapshot, physical_name,
+                                [query_embeddings[i] for i in batched], n_results, book)
+        vector_rows = dict(zip(batched, results))
+    return [
+        RetrievalContext(query, chroma_dir, collection_name, n_results=n_results, query_embedding=embedding,
+                         book=book, mode=mode, backend=backend, vector_rows=vector_rows.get(i),
+                         embedding_backend=embedding_backend)
+        for i, (query, embedding) in enumerate(zip(queries, query_embeddings))
+    ]
 
 def search_book(query: str,
                 chroma_dir: str = CHROMA_DIR,
                 collection_name: str = COLLECTION_NAME,
                 n_results: int = 3,
-                preview_length: int = 300) -> str:
+                preview_length: int = 300,
+                context: RetrievalContext = None,
+                book=None,
+                mode: str = None,
+                backend: str = None,
+                token_budget: int = None,
+                embedding_backend: str = None) -> str:
     """
     Search the book collection in ChromaDB for the most relevant chunks to the query.
     Returns a formatted string with the top results.
+    Pass a RetrievalContext to reuse an existing retrieval pass for the same query,
+    and `book` (a book id or a list of them) to restrict the search to those books.
+    `mode` picks vector, hybrid or lexical ranking and `backend` the ChromaDB
+    collection or the vector snapshot for dense search, and `embedding_backend`
+    the embedding model and its collection (see RetrievalContext).
+    `token_budget` (default: PROMPT_BOOK_TOKENS, 300) bounds the passages in
+    tokens; 0 gives `preview_length`-character previews of each chunk instead.
     """
-    
-    client = connect_to_chromadb(chroma_dir)
-    collection = client.get_collection(collection_name)
-
-    
-    query_embedding = get_bedrock_embedding(query)
-
-    
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results,
-        include=['documents', 'metadatas']
-    )
-
-    
-    if not results["documents"][0]:
-        return "No relevant passages found in 'The Innocents Abroad.'"
-
-    output = []
-    for idx, doc in enumerate(results["documents"][0]):
-        meta = results["metadatas"][0][idx]
-        summary = meta.get("summary", "")
-        preview = doc[:preview_length] + ("..." if len(doc) > preview_length else "")
-        output.append(
-            f"Result {idx+1}:\n"
-            f"Summary: {summary}\n"
-            f"Passage: {preview}\n"
-        )
-    return "\n".join(output)
-
+    if context is None:
+        context = RetrievalContext(query, chroma_dir, collection_name, n_results=n_results, book=book, mode=mode,
+                                   backend=backend, embedding_backend=embedding_backend)
+    if token_budget is None:
+        token_budget = section_budget("book")
+    return context.format_passages(n_results=n_results, preview_length=preview_length, token_budget=token_budget)
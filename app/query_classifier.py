@@ -1,12 +1,22 @@
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple
+
 from app.bedrock_client import get_bedrock_client
+from app.embedding_backend import get_embedding_backend
+from app.prompt_builder import converse_request, section_budget, truncate_to_budget
+from app.resilience import is_unavailable_error
+from app.telemetry import count, record_usage, span
 
-def classify_query_llm(query: str) -> str:
-    """
-    Classify a user query as 'book', 'weather', 'both', or 'out-of-scope' using a Bedrock LLM.
-    Returns the label as a string.
-    """
-    client = get_bedrock_client()
-    prompt = (
+if TYPE_CHECKING:
+    import numpy as np
+
+LABELS = ("book", "weather", "both", "out-of-scope")
+
+# Static classification instructions, sent as the (cacheable) system prompt;
+# only the query itself changes from call to call.
+CLASSIFY_SYSTEM_PROMPT = (
     "You are an intelligent travel assistant for a community inspired by Mark Twain's 'The Innocents Abroad.'\n"
     "Your job is to classify user queries so the system can decide which data sources to use for generating a response.\n"
     "The system has access to:\n"
@@ -19,18 +29,227 @@ def classify_query_llm(query: str) -> str:
     "3. both — if the query requires information from both the book and the weather API (for example, asking about places Twain visited and the current weather there).\n"
     "4. out-of-scope — if the query is unrelated to Mark Twain, his travels, or the weather (for example, questions about quantum physics or unrelated topics).\n"
     "\n"
-    "Return only the label: book, weather, both, or out-of-scope.\n"
-    "\n"
-    "Here is the user query:\n"
-    f'"{query}"'
+    "Return only the label: book, weather, both, or out-of-scope."
 )
-    response = client.converse(
-        modelId="us.amazon.nova-pro-v1:0",  # Replace with your Bedrock LLM model ID if different
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        inferenceConfig={"maxTokens": 10, "temperature": 0}
-    )
+
+def classify_query_llm(query: str) -> str:
+    """
+    Classify a user query as 'book', 'weather', 'both', or 'out-of-scope' using a Bedrock LLM.
+    Returns the label as a string.
+    """
+    client = get_bedrock_client()
+    user_text = f'Here is the user query:\n"{truncate_to_budget(query, section_budget("query"))}"'
+    with span("classify_llm"):
+        # Replace the model ID with your Bedrock LLM if different.
+        response = client.converse(**converse_request("us.amazon.nova-pro-v1:0", CLASSIFY_SYSTEM_PROMPT, user_text,
+                                                      max_tokens=10, temperature=0))
+    record_usage("classify_llm", response.get("usage"))
     label = response["output"]["message"]["content"][0]["text"].strip().lower()
     
     if label not in {"book", "weather", "both", "out-of-scope"}:
         label = "out-of-scope"
-    return label
\ No newline at end of file
+    return label
+
+
+_WEATHER_TERMS = re.compile(
+    r"\b(weather|forecast|temperatures?|rain(ing|y)?|snow(ing|y)?|sunny|cloudy|humid(ity)?|windy?|"
+    r"storms?|degrees|celsius|fahrenheit|umbrella|hot|cold|warm|chilly)\b", re.IGNORECASE)
+_STRONG_WEATHER_TERMS = re.compile(r"\b(weather|forecast|temperatures?)\b", re.IGNORECASE)
+_CURRENT_TERMS = re.compile(
+    r"\b(current(ly)?|now|today|tonight|tomorrow|this (morning|afternoon|evening|week|weekend)|"
+    r"right now|at the moment|these days|forecast)\b", re.IGNORECASE)
+_BOOK_TERMS = re.compile(
+    r"\b(twain|mark twain|innocents abroad|quaker city|the book|pilgrims?|excursion|excursionists|"
+    r"clemens|the author|the narrator)\b", re.IGNORECASE)
+
+
+def classify_query_rules(query: str) -> Tuple[Optional[str], float]:
+    """
+    Keyword rules for obvious queries. Returns (label, confidence), or
+    (None, 0.0) when the rules have nothing to say about the query.
+    """
+    book = bool(_BOOK_TERMS.search(query))
+    weather_word = _WEATHER_TERMS.search(query)
+    strong_weather = bool(_STRONG_WEATHER_TERMS.search(query))
+    current = bool(_CURRENT_TERMS.search(query))
+
+    if book and weather_word:
+        # "What did Twain say about the heat in Syria?" is a book question;
+        # only live-weather phrasing makes it a combined one.
+        if current:
+            return "both", 0.95
+        return "book", 0.6
+    if book:
+        return "book", 0.9
+    if strong_weather:
+        return "weather", 0.95 if current else 0.85
+    if weather_word and current:
+        return "weather", 0.8
+    return None, 0.0
+
+
+# Labeled examples the embedding tier compares queries against. Kept separate
+# from data/classifier_eval.jsonl so the evaluation stays honest.
+SEED_EXAMPLES = {
+    "book": [
+        "What did Twain make of the Great Pyramid?",
+        "How does Twain describe Venice in The Innocents Abroad?",
+        "What happened to the pilgrims in the Holy Land?",
+        "Tell me about the voyage of the Quaker City.",
+        "What was the author's opinion of the Old Masters?",
+        "Which places in Italy did Twain visit?",
+        "How did the travelers get along with their guides?",
+        "What did Twain write about the Sea of Galilee?",
+    ],
+    "weather": [
+        "What's the current weather in Berlin?",
+        "Is it raining in London right now?",
+        "What's the temperature in Rome today?",
+        "Will I need an umbrella in Venice tomorrow?",
+        "How hot is it in Cairo at the moment?",
+        "Give me the forecast for Athens.",
+        "Is it windy in Marseille?",
+        "What's the humidity in Naples now?",
+    ],
+    "both": [
+        "I'd like to follow Twain's route through Switzerland; how's the weather there now?",
+        "What's the weather today in the cities Twain visited?",
+        "Twain loved Lake Como; is it sunny there right now?",
+        "Which places from The Innocents Abroad have good weather this week?",
+        "What is the current temperature in the towns the pilgrims toured?",
+        "Is it warm today in the places Twain described in Greece?",
+        "Where did Twain stop in France, and what's the forecast there?",
+        "Tell me about Twain's visit to Constantinople and today's weather there.",
+    ],
+    "out-of-scope": [
+        "Explain how black holes form.",
+        "What is the capital of Australia?",
+        "How do I bake sourdough bread?",
+        "Write me a Python function to sort a list.",
+        "Who won the World Cup in 2018?",
+        "What's the best smartphone to buy?",
+        "How do vaccines work?",
+        "Recommend a good science fiction movie.",
+    ],
+}
+
+
+def _normalize(vectors) -> "np.ndarray":
+    """
+    Unit-length copy of a vector, or of each row of a matrix.
+    """
+    import numpy as np
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class EmbeddingClassifier:
+    """
+    Nearest-centroid classifier over query embeddings. Seed examples are embedded
+    once per embedding backend (through the embedding cache for Bedrock, so only
+    on the first run) and averaged per label. Confidence is the softmax
+    probability of the best label over cosine similarities scaled by
+    `temperature`.
+    """
+
+    def __init__(self, examples: dict = None, temperature: float = 0.05):
+        self.examples = examples or SEED_EXAMPLES
+        self.temperature = temperature
+        self._centroids = {}
+        self._lock = threading.Lock()
+
+    def _load_centroids(self, backend=None) -> Tuple[list, "np.ndarray"]:
+        """
+        (labels, matrix with one unit centroid row per label) for `backend`.
+        """
+        import numpy as np
+
+        backend = backend or get_embedding_backend()
+        if backend.name not in self._centroids:
+            with self._lock:
+                if backend.name not in self._centroids:
+                    labels = list(self.examples)
+                    centroids = np.stack([_normalize(backend.embed_many(self.examples[label])).mean(axis=0)
+                                          for label in labels])
+                    self._centroids[backend.name] = (labels, _normalize(centroids))
+        return self._centroids[backend.name]
+
+    def predict(self, query_embedding: list, backend=None) -> Tuple[str, float]:
+        import numpy as np
+
+        labels, centroids = self._load_centroids(backend)
+        scores = centroids @ _normalize(query_embedding)
+        best = int(np.argmax(scores))
+        weights = np.exp((scores - scores[best]) / self.temperature)
+        return labels[best], float(weights[best] / weights.sum())
+
+
+_embedding_classifier = EmbeddingClassifier()
+
+
+def warm_up_classifier() -> None:
+    """
+    Embed the seed examples now (if the embedding tier is on) instead of on the
+    first query that needs them.
+    """
+    if os.getenv("QUERY_CLASSIFIER_EMBEDDINGS", "1") not in {"0", "false", "False"}:
+        _embedding_classifier._load_centroids()
+
+
+def classify_query_tiered(query: str, threshold: float = None, use_embeddings: bool = None) -> Tuple[str, str, float]:
+    """
+    Classify a query with the cheapest tier that is confident enough.
+
+    1. keyword rules (microseconds, no remote calls),
+    2. nearest-centroid over the query embedding (one embedding call, cached and
+       reused by retrieval for book/both queries),
+    3. the Bedrock LLM (classify_query_llm) when neither reaches `threshold`.
+
+    If Bedrock is unavailable (throttled past its retries, or its circuit is
+    open) the most confident local guess is used, "book" if there is none.
+
+    Returns (label, tier, confidence) with tier in {"rules", "embedding", "llm", "fallback"}.
+    Defaults come from QUERY_CLASSIFIER_THRESHOLD (0.8) and
+    QUERY_CLASSIFIER_EMBEDDINGS (on).
+    """
+    if threshold is None:
+        threshold = float(os.getenv("QUERY_CLASSIFIER_THRESHOLD", "0.8"))
+    if use_embeddings is None:
+        use_embeddings = os.getenv("QUERY_CLASSIFIER_EMBEDDINGS", "1") not in {"0", "false", "False"}
+
+    label, confidence = classify_query_rules(query)
+    if label is not None and confidence >= threshold:
+        return label, "rules", confidence
+    guess = (label or "book", confidence)
+
+    try:
+        if use_embeddings:
+            backend = get_embedding_backend()
+            label, confidence = _embedding_classifier.predict(backend.embed(query), backend)
+            if confidence >= threshold:
+                return label, "embedding", confidence
+            guess = max(guess, (label, confidence), key=lambda item: item[1])
+        return classify_query_llm(query), "llm", 1.0
+    except Exception as e:
+        if not is_unavailable_error(e):
+            raise
+        print(f"Warning: classifying locally, Bedrock unavailable ({e})")
+        count("degraded", stage="classify")
+        return guess[0], "fallback", guess[1]
+
+
+def classify_query(query: str) -> str:
+    """
+    Classify a user query as 'book', 'weather', 'both', or 'out-of-scope',
+    only calling the LLM when the local tiers are not confident.
+    Set QUERY_CLASSIFIER_LOCAL=0 to always use the LLM.
+    """
+    with span("classify") as classify_span:
+        if os.getenv("QUERY_CLASSIFIER_LOCAL", "1") in {"0", "false", "False"}:
+            label, tier = classify_query_llm(query), "llm"
+        else:
+            label, tier, _ = classify_query_tiered(query)
+        classify_span.set_label("tier", tier).set(label=label)
+    return label
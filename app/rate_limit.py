@@ -0,0 +1,58 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting calls to `rate` per second, with bursts
+    of up to `burst` calls. A rate of None or 0 disables limiting.
+    """
+
+    def __init__(self, rate: Optional[float], burst: Optional[int] = None):
+        self.rate = rate or 0.0
+        self.capacity = float(burst or max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """
+        Change the refill rate; tokens already in the bucket are kept.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        Take `tokens` without blocking. Returns False if not enough are available.
+        """
+        if not self.rate:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """
+        Block until `tokens` are available, then take them.
+        """
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,358 @@
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from app.rate_limit import TokenBucket
+from app.telemetry import count
+
+# Bedrock error codes that mean "slow down and retry".
+THROTTLING_ERROR_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException"}
+# Server-side errors that are worth retrying but are not throttling.
+TRANSIENT_ERROR_CODES = {"InternalServerException", "ModelNotReadyException", "ModelTimeoutException",
+                         "ServiceUnavailable", "InternalFailure"}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose circuit breaker is open.
+    """
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def _error_code(exc: Exception) -> Optional[str]:
+    return (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+
+
+def is_throttling_error(exc: Exception) -> bool:
+    """
+    True for Bedrock errors that mean "slow down and retry".
+    """
+    return _error_code(exc) in THROTTLING_ERROR_CODES
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """
+    True for failures a retry may fix: throttling, 5xx-style service errors,
+    dropped connections and timeouts.
+    """
+    if _error_code(exc) in THROTTLING_ERROR_CODES | TRANSIENT_ERROR_CODES:
+        return True
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # botocore is not imported until the first Bedrock client is built; if it
+    # has not been, the exception cannot be one of its connection errors.
+    botocore_exceptions = sys.modules.get("botocore.exceptions")
+    return botocore_exceptions is not None and isinstance(
+        exc, (botocore_exceptions.ConnectionError, botocore_exceptions.HTTPClientError)
+    )
+
+
+def is_unavailable_error(exc: Exception) -> bool:
+    """
+    True when a dependency is down or overloaded (open circuit, or a transient
+    error that outlasted its retries), as opposed to a bad request. Callers use
+    it to decide whether to degrade instead of failing the whole query.
+    """
+    return isinstance(exc, CircuitOpenError) or is_transient_error(exc)
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    "Full jitter" exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)].
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def call_with_retry(fn: Callable, max_retries: int = 4, base_delay: float = 0.25, max_delay: float = 8.0,
+                    retry_on: Callable[[Exception], bool] = is_transient_error, on_retry: Callable = None):
+    """
+    Call fn(), retrying up to `max_retries` times with jittered exponential
+    backoff while `retry_on(exception)` is true. `on_retry(exception)` runs
+    before each retry.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_retries or not retry_on(e):
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency. After `failure_threshold` consecutive
+    failures the circuit opens and calls fail fast with CircuitOpenError for
+    `reset_timeout` seconds; then one trial call is let through (half-open),
+    and its outcome closes or reopens the circuit. Thread-safe.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go ahead now. In the half-open state only one caller gets True.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def check(self) -> None:
+        """
+        Raise CircuitOpenError unless a call may go ahead.
+        """
+        if not self.allow():
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - (self.opened_at or 0.0)))
+            count("circuit_rejections", breaker=self.name)
+            raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            opened = self._trial_running or (self.opened_at is None and self.failures >= self.failure_threshold)
+            if opened:
+                self._trial_running = False
+                self.opened_at = time.monotonic()
+        if opened:
+            count("circuit_opened", breaker=self.name)
+            print(f"Warning: {self.name} is failing, pausing calls for {self.reset_timeout:.0f}s")
+
+    def call(self, fn: Callable, is_failure: Callable[[Exception], bool] = is_transient_error):
+        """
+        Run fn() through the breaker. Exceptions for which `is_failure` is false
+        (bad requests, say) count as the dependency working.
+        """
+        self.check()
+        try:
+            result = fn()
+        except Exception as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+
+# Hedged requests run on their own pool so a stuck primary never blocks the backup.
+_hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_THREADS", "32")),
+                                     thread_name_prefix="hedge")
+
+
+def hedged_call(fn: Callable, hedge_after: float, name: str = "call", may_hedge: Callable[[], bool] = None):
+    """
+    Call fn(); if it has not finished after `hedge_after` seconds, start a
+    second identical call and return whichever succeeds first. Only for
+    idempotent calls. A failure is only raised once both attempts have failed.
+
+    `may_hedge()` is asked right before the second call is started (e.g. to
+    take a rate-limit token for it); when it returns False there is no second
+    call and the first one is awaited.
+    """
+    if not hedge_after or hedge_after <= 0:
+        return fn()
+    primary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+    if may_hedge is not None and not may_hedge():
+        count("hedges_skipped", call=name)
+        return primary.result()
+    count("hedged_requests", call=name)
+    backup = _hedge_executor.submit(contextvars.copy_context().run, fn)
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is backup:
+                    count("hedge_wins", call=name)
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+class AdaptiveRateLimit:
+    """
+    Token bucket whose rate backs off when the service throttles us: each
+    throttling error halves the rate (down to `min_rate`), and each success
+    wins back 5% of the configured rate (additive increase, multiplicative
+    decrease).
+    """
+
+    def __init__(self, rate: float, min_rate: float = None):
+        self.max_rate = rate
+        self.min_rate = min_rate or max(rate / 16, 0.1)
+        self.bucket = TokenBucket(rate, burst=max(1, int(rate)))
+
+    def acquire(self) -> None:
+        self.bucket.acquire()
+
+    def try_acquire(self) -> bool:
+        return self.bucket.try_acquire()
+
+    def on_throttled(self) -> None:
+        self.bucket.set_rate(max(self.min_rate, self.bucket.rate / 2))
+
+    def on_success(self) -> None:
+        if self.bucket.rate < self.max_rate:
+            self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.max_rate * 0.05))
+
+
+def parse_rate_limits(value: str) -> dict:
+    """
+    "model-a=5,model-b=20" -> {"model-a": 5.0, "model-b": 20.0}; "*" sets the default.
+    """
+    limits = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            model, rate = part.rsplit("=", 1)
+            limits[model.strip()] = float(rate)
+    return limits
+
+
+def resilience_enabled() -> bool:
+    return os.getenv("BEDROCK_RESILIENCE", "1") not in {"0", "false", "False"}
+
+
+class _ModelGuard:
+    """
+    Rate limit and circuit breaker shared by every call to one Bedrock model.
+    """
+
+    def __init__(self, model_id: str, rate: Optional[float]):
+        self.limit = AdaptiveRateLimit(rate) if rate else None
+        self.breaker = CircuitBreaker(
+            f"Bedrock model {model_id}",
+            failure_threshold=int(os.getenv("BEDROCK_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("BEDROCK_BREAKER_RESET", "30"))
+        )
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def _guard(model_id: str) -> _ModelGuard:
+    guard = _guards.get(model_id)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.get(model_id)
+            if guard is None:
+                limits = parse_rate_limits(os.getenv("BEDROCK_RATE_LIMITS", ""))
+                guard = _guards[model_id] = _ModelGuard(model_id, limits.get(model_id, limits.get("*")))
+    return guard
+
+
+def reset_resilience_state() -> None:
+    """
+    Forget every model's rate limit and circuit breaker (they are rebuilt from
+    the environment on next use).
+    """
+    with _guards_lock:
+        _guards.clear()
+
+
+class ResilientBedrockClient:
+    """
+    Wraps a Bedrock Runtime client so every converse, converse_stream and
+    invoke_model call goes through the model's shared guard:
+
+    - a token bucket per model (BEDROCK_RATE_LIMITS, e.g.
+      "us.amazon.nova-pro-v1:0=5,amazon.titan-embed-text-v1=20"; "*" for any
+      other model), which halves its rate on throttling and recovers gradually;
+    - up to BEDROCK_MAX_RETRIES (4) retries of throttling and transient errors
+      with full-jitter exponential backoff (BEDROCK_RETRY_BASE_DELAY 0.25s,
+      capped at BEDROCK_RETRY_MAX_DELAY 8s);
+    - a circuit breaker per model that fails fast with CircuitOpenError after
+      BEDROCK_BREAKER_THRESHOLD (5) calls in a row failed, for
+      BEDROCK_BREAKER_RESET (30) seconds;
+    - optionally, a hedged second request for converse / invoke_model calls
+      still running after BEDROCK_HEDGE_AFTER seconds (off by default; each
+      hedge is a billed request).
+
+    A streaming call is retried only until the stream has been opened.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.max_retries = int(os.getenv("BEDROCK_MAX_RETRIES", "4"))
+        self.base_delay = float(os.getenv("BEDROCK_RETRY_BASE_DELAY", "0.25"))
+        self.max_delay = float(os.getenv("BEDROCK_RETRY_MAX_DELAY", "8"))
+        self.hedge_after = float(os.getenv("BEDROCK_HEDGE_AFTER", "0"))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _call(self, operation: str, model_id: str, fn: Callable, hedge: bool):
+        guard = _guard(model_id)
+
+        def attempt():
+            if guard.limit is not None:
+                guard.limit.acquire()
+            try:
+                # The backup request is billed and counts against the rate
+                # limit too, so it is only sent if a token is free right away.
+                may_hedge = guard.limit.try_acquire if guard.limit is not None else None
+                result = hedged_call(fn, self.hedge_after, operation, may_hedge) if hedge else fn()
+            except Exception as e:
+                if guard.limit is not None and is_throttling_error(e):
+                    guard.limit.on_throttled()
+                raise
+            if guard.limit is not None:
+                guard.limit.on_success()
+            return result
+
+        def on_retry(exc):
+            count("retries", operation=operation, error=_error_code(exc) or type(exc).__name__)
+
+        return guard.breaker.call(lambda: call_with_retry(
+            attempt, self.max_retries, self.base_delay, self.max_delay, on_retry=on_retry
+        ))
+
+    def converse(self, **kwargs):
+        return self._call("converse", kwargs.get("modelId"), lambda: self.client.converse(**kwargs), hedge=True)
+
+    def converse_stream(self, **kwargs):
+        return self._call("converse_stream", kwargs.get("modelId"),
+                          lambda: self.client.converse_stream(**kwargs), hedge=False)
+
+    def invoke_model(self, **kwargs):
+        return self._call("invoke_model", kwargs.get("modelId"), lambda: self.client.invoke_model(**kwargs), hedge=True)
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    """
+    One answered query. `book_answer` and `cities` are kept so weather-dependent
+    answers can be regenerated with fresh weather without repeating retrieval.
+    """
+    query: str
+    label: str
+    answer: str
+    book_answer: str = ""
+    cities: List[str] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class SemanticCache:
+    """
+    Capacity-bounded cache of answered queries, looked up by cosine similarity of
+    query embeddings. A lookup hits when the most similar cached query reaches
+    `threshold`; the least recently used entry is evicted when full.
+
+    Unit query vectors live in a (capacity, dim) matrix allocated on the first
+    store. Each entry owns one row (slot): a store writes a single row, into a
+    free slot or the evicted entry's, and a lookup is one matrix-vector product
+    over the slots used so far.
+    """
+
+    def __init__(self, threshold: float = 0.95, capacity: int = 1000, ttl: Optional[float] = None):
+        import numpy as np
+
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # slot -> CachedAnswer, least recently used first
+        self._matrix = None
+        self._used = np.zeros(capacity, dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(embedding) -> "np.ndarray":
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query_embedding) -> Optional[CachedAnswer]:
+        """
+        Return the cached answer for the most similar earlier query, or None.
+        """
+        import numpy as np
+
+        vector = self._unit(query_embedding)
+        with self._lock:
+            self.lookups += 1
+            if not self._entries or len(vector) != self._matrix.shape[1]:
+                return None
+            similarities = self._matrix[:self._rows] @ vector
+            similarities[~self._used[:self._rows]] = -np.inf
+            slot = int(np.argmax(similarities))
+            if similarities[slot] < self.threshold:
+                return None
+            entry = self._entries[slot]
+            if self.ttl is not None and time.time() - entry.created_at > self.ttl:
+                self._remove(slot)
+                return None
+            self._entries.move_to_end(slot)
+            entry.hits += 1
+            self.hits += 1
+            return entry
+
+    def _remove(self, slot: int) -> None:
+        del self._entries[slot]
+        self._used[slot] = False
+        self._free.append(slot)
+
+    def _reset(self, dim: int = None) -> None:
+        import numpy as np
+
+        self._entries.clear()
+        self._matrix = np.zeros((self.capacity, dim), dtype=np.float32) if dim else None
+        self._used[:] = False
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._rows = 0
+
+    def store(self, query_embedding, entry: CachedAnswer) -> None:
+        vector = self._unit(query_embedding)
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != len(vector):
+                # First store, or the embedding model changed: old vectors are not comparable.
+                self._reset(len(vector))
+            if not self._free:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._used[slot] = True
+            self._rows = max(self._rows, slot + 1)
+            self._entries[slot] = entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "threshold": self.threshold
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Returns the process-wide semantic answer cache, or None unless
+    SEMANTIC_CACHE_ENABLED is set. Tuned with SEMANTIC_CACHE_THRESHOLD (0.95),
+    SEMANTIC_CACHE_CAPACITY (1000) and SEMANTIC_CACHE_TTL (seconds, unset = no expiry).
+    """
+    global _cache
+    if os.getenv("SEMANTIC_CACHE_ENABLED", "") in {"", "0", "false", "False"}:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                ttl = os.getenv("SEMANTIC_CACHE_TTL")
+                _cache = SemanticCache(
+                    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+                    capacity=int(os.getenv("SEMANTIC_CACHE_CAPACITY", "1000")),
+                    ttl=float(ttl) if ttl else None
+                )
+    return _cache
@@ -0,0 +1,224 @@
+"""
+HTTP entry point for the workflow, with micro-batching of concurrent queries.
+
+    python -m app.server --port 8080
+
+Endpoints:
+  POST /query    {"query": "...", "book": optional book id or list} -> {"answer": "...", "seconds": ...}
+  GET  /stats    request counts and the queue depth / batch sizes of each batcher
+  GET  /metrics  Prometheus metrics, when telemetry is on
+  GET  /health   {"status": "ok"}
+
+Each query runs through async_workflow.process_query_async. Queries arriving
+within QUERY_SERVER_MAX_WAIT_MS (default 5) of each other are batched, up to
+QUERY_SERVER_MAX_BATCH (default 16) per batch: their embeddings are requested
+in one embed_many call of the embedding backend, and their vector searches run
+as one multi-query collection.query (or one vector snapshot search).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.async_workflow import _run_blocking, process_query_async
+from app.embedding_backend import get_embedding_backend
+from app.env import load_env
+from app.micro_batch import MicroBatcher
+from app.query_book import retrieve_batch
+from app.telemetry import count, get_telemetry
+from app.workflow import RETRIEVAL_RESULTS
+
+MAX_BODY_BYTES = 1 << 20
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _embed_batch(texts: list) -> list:
+    return list(get_embedding_backend().embed_many(texts))
+
+
+def _search_batch(items: list) -> list:
+    """
+    items: (query, query_embedding, book) tuples. Queries for the same book
+    filter are retrieved together; a failed group fails only its own queries.
+    """
+    groups = {}
+    for position, (_, _, book) in enumerate(items):
+        key = book if book is None or isinstance(book, str) else tuple(book)
+        groups.setdefault(key, []).append(position)
+    results = [None] * len(items)
+    for book, positions in groups.items():
+        try:
+            contexts = retrieve_batch([items[i][0] for i in positions], [items[i][1] for i in positions],
+                                      n_results=RETRIEVAL_RESULTS,
+                                      book=list(book) if isinstance(book, tuple) else book)
+        except Exception as e:
+            contexts = [e] * len(positions)
+        for position, context in zip(positions, contexts):
+            results[position] = context
+    return results
+
+
+class QueryServer:
+    """
+    asyncio HTTP/1.1 server (with keep-alive) answering queries through
+    process_query_async, with embeddings and vector searches micro-batched
+    across concurrent requests. Set `max_batch_size` to 1 to turn batching off.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, max_batch_size: int = None,
+                 max_wait: float = None):
+        self.host = host
+        self.port = port
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("QUERY_SERVER_MAX_BATCH", "16"))
+        if max_wait is None:
+            max_wait = float(os.getenv("QUERY_SERVER_MAX_WAIT_MS", "5")) / 1000
+        self.embeddings = MicroBatcher("embed", _embed_batch, _run_blocking, max_batch_size, max_wait)
+        self.searches = MicroBatcher("search", _search_batch, _run_blocking, max_batch_size, max_wait)
+        self.requests = 0
+        self.active_requests = 0
+        self.errors = 0
+        self._server = None
+
+    async def _embed(self, query: str):
+        return await self.embeddings.submit(query)
+
+    async def _retrieve(self, query: str, query_embedding, book):
+        return await self.searches.submit((query, query_embedding, book))
+
+    async def answer(self, query: str, book=None) -> str:
+        return await process_query_async(query, book=book, embed=self._embed, retrieve=self._retrieve)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "active_requests": self.active_requests,
+            "errors": self.errors,
+            "batchers": {"embed": self.embeddings.stats(), "search": self.searches.stats()}
+        }
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = (request_line.decode("latin-1").split() + ["", "", ""])[:3]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                status, payload = await self._route(method, path.split("?")[0], body)
+                await self._respond(writer, status, payload, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple:
+        if path == "/query":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            try:
+                request = json.loads(body or b"{}")
+                query = request["query"]
+            except (ValueError, KeyError, TypeError):
+                return 400, {"error": 'expected a JSON body like {"query": "..."}'}
+            return await self._query(query, request.get("book"))
+        if path == "/stats":
+            return 200, self.stats()
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics" and get_telemetry() is not None:
+            return 200, get_telemetry().render_prometheus()
+        return 404, {"error": f"no such endpoint: {path}"}
+
+    async def _query(self, query: str, book) -> tuple:
+        self.requests += 1
+        self.active_requests += 1
+        start = time.perf_counter()
+        try:
+            answer = await self.answer(query, book=book)
+            return 200, {"answer": answer, "seconds": time.perf_counter() - start}
+        except Exception as e:
+            self.errors += 1
+            count("server_errors")
+            print(f"Error answering query: {e}")
+            return 500, {"error": str(e)}
+        finally:
+            self.active_requests -= 1
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload, close: bool) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def main():
+    load_env()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("QUERY_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("QUERY_SERVER_PORT", "8080")))
+    parser.add_argument("--max-batch-size", type=int, default=None)
+    parser.add_argument("--max-wait-ms", type=float, default=None)
+    parser.add_argument("--no-warm-up", action="store_true", help="skip workflow.warm_up() at startup")
+    args = parser.parse_args()
+
+    if not args.no_warm_up:
+        from app.workflow import warm_up
+
+        timings = warm_up()
+        print(f"Warmed up in {sum(timings.values()):.2f}s")
+    max_wait = args.max_wait_ms / 1000 if args.max_wait_ms is not None else None
+    server = QueryServer(args.host, args.port, args.max_batch_size, max_wait)
+
+    async def serve():
+        await server.start()
+        print(f"Serving on http://{server.host}:{server.port} "
+              f"(batches of up to {server.embeddings.max_batch_size}, {server.embeddings.max_wait * 1000:g} ms window)")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
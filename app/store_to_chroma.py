@@ -1,12 +1,21 @@
 import os
 import json
+import time
 from tqdm import tqdm
 import chromadb
 from chromadb.config import Settings
 
-from app.book_preprocess import clean_gutenberg_text, chunk_text_by_paragraph
-from app.bedrock_converse import get_nova_pro_metadata
-from app.bedrock_embed import get_bedrock_embedding
+from app.book_preprocess import chunk_books, chunk_content_id, find_books
+from app.bedrock_converse import get_metadata_stats, get_nova_pro_metadata, get_nova_pro_metadata_batch
+from app.embedding_backend import EMBEDDING_BACKENDS, collection_for_backend, get_embedding_backend
+from app.env import load_env
+from app.ingest_pipeline import IngestPipeline
+from app.chroma_utils import read_collection
+from app.lexical_index import BM25Index, index_path as lexical_index_path
+from app.location_index import LocationIndex, index_path as location_index_path
+from app.resilience import CircuitOpenError
+from app.vector_snapshot import export_collection_snapshot, snapshot_paths
+from app.telemetry import count, span
 
 def flatten_metadata(meta: dict) -> dict:
     """
@@ -20,27 +29,168 @@ def flatten_metadata(meta: dict) -> dict:
             flat[k] = str(v)
     return flat
 
+BOOK_METADATA_KEYS = ("book_id", "book_title", "chapter", "offset")
+
+def _book_metadata(item: dict) -> dict:
+    return {key: str(item[key]) for key in BOOK_METADATA_KEYS if key in item}
+
+def _position_metadata(item: dict) -> dict:
+    """
+    The fields of a chunk's metadata that depend on where it sits rather than
+    on its text: the book fields and its index in the book.
+    """
+    return {**_book_metadata(item), "chunk_index": str(item["index"])}
+
+def _attach_metadata(item: dict, meta: dict) -> dict:
+    meta.update(_book_metadata(item))
+    meta["chunk_id"] = item["id"]
+    meta["chunk_index"] = item["index"]
+    meta["text_preview"] = item["text"][:60]
+    item["metadata"] = flatten_metadata(meta)
+    return item
+
+def _extract_metadata(item: dict) -> dict:
+    return _attach_metadata(item, get_nova_pro_metadata(item["text"]))
+
+def _extract_metadata_batch(items: list) -> list:
+    metas = get_nova_pro_metadata_batch([item["text"] for item in items])
+    return [meta if isinstance(meta, Exception) else _attach_metadata(item, meta)
+            for item, meta in zip(items, metas)]
+
+def _embed(item: dict, backend=None) -> dict:
+    item["embedding"] = (backend or get_embedding_backend()).embed(item["text"])
+    return item
+
+def _embed_batch(items: list, max_workers: int = 4, backend=None) -> list:
+    matrix = (backend or get_embedding_backend()).embed_many([item["text"] for item in items], max_workers=max_workers)
+    for item, embedding in zip(items, matrix):
+        item["embedding"] = embedding
+    return items
+
+def _wait_for_circuit(fn, max_waits: int = 10):
+    """
+    Ingestion is a batch job, so when a model's circuit breaker is open a stage
+    waits for it to close (up to `max_waits` times) rather than failing every
+    remaining chunk at once.
+    """
+    def run(arg):
+        for attempt in range(max_waits + 1):
+            try:
+                return fn(arg)
+            except CircuitOpenError as e:
+                if attempt == max_waits:
+                    raise
+                time.sleep(max(e.retry_in, 1.0))
+    return run
+
+def build_indexes(collection, chroma_dir: str, collection_name: str) -> None:
+    """
+    Rebuild the BM25 and location indexes and the vector snapshot of a
+    collection from its stored chunks, and print their sizes.
+    """
+    # They cover every stored chunk, so they are rebuilt from the collection
+    # (one local read) after each run rather than patched.
+    with span("ingest_indexes"):
+        rows = read_collection(collection, include=("embeddings", "documents", "metadatas"))
+        lexical_path = lexical_index_path(chroma_dir, collection_name)
+        lexical_index = BM25Index.build(rows["ids"], rows["documents"], rows["metadatas"])
+        lexical_index.save(lexical_path)
+        location_path = location_index_path(chroma_dir, collection_name)
+        location_index = LocationIndex.build(rows["ids"], rows["metadatas"])
+        location_index.save(location_path, collection_name)
+        snapshot = export_collection_snapshot(collection, chroma_dir, collection_name, rows)
+    print(f"Lexical index: {len(lexical_index)} chunks, {len(lexical_index.terms)} terms, "
+          f"{os.path.getsize(lexical_path) / 1e6:.1f} MB at {lexical_path}")
+    cities = sum(entry["kind"] == "city" for entry in location_index.places.values())
+    print(f"Location index: {cities} cities, {len(location_index.places) - cities} regions at {location_path}")
+    sidecar_path = snapshot_paths(chroma_dir, collection_name)["sidecar"]
+    print(f"Vector snapshot: {len(snapshot)} x {snapshot.vectors.shape[1] if len(snapshot) else 0} float32, "
+          f"{snapshot.vectors.nbytes / 1e6:.1f} MB at {sidecar_path}")
+
+def reembed_collection(chroma_dir: str, collection_name: str, embedding_backend: str, batch_size: int = 256):
+    """
+    Copy the chunks and metadata of the Bedrock collection `collection_name`
+    into `embedding_backend`'s collection with that backend's embeddings, then
+    build its indexes. No metadata is extracted again, so switching backends
+    costs only the embeddings. Chunks already in the target are re-embedded too.
+    Returns the target collection.
+    """
+    backend = get_embedding_backend(embedding_backend)
+    target_name = collection_for_backend(collection_name, backend)
+    if target_name == collection_name:
+        raise ValueError(f"'{collection_name}' already holds {backend.name} embeddings")
+    client = chromadb.PersistentClient(path=chroma_dir)
+    source = client.get_collection(collection_name)
+    target = client.get_or_create_collection(target_name)
+    rows = read_collection(source)
+    print(f"Embedding {len(rows['ids'])} chunks of '{collection_name}' with {backend.name} "
+          f"({backend.model_id}) into '{target_name}'...")
+    start = time.perf_counter()
+    with span("ingest_reembed", backend=backend.name):
+        for offset in tqdm(range(0, len(rows["ids"]), batch_size), desc="Embedding"):
+            documents = rows["documents"][offset:offset + batch_size]
+            target.upsert(
+                ids=rows["ids"][offset:offset + batch_size],
+                documents=documents,
+                embeddings=backend.embed_many(documents),
+                metadatas=rows["metadatas"][offset:offset + batch_size]
+            )
+    stale = sorted(set(read_collection(target, include=())["ids"]) - set(rows["ids"]))
+    for offset in range(0, len(stale), batch_size):
+        target.delete(ids=stale[offset:offset + batch_size])
+    elapsed = time.perf_counter() - start
+    print(f"Embedded {len(rows['ids'])} chunks in {elapsed:.1f}s ({len(rows['ids']) / max(elapsed, 1e-9):.0f}/s)"
+          + (f", deleted {len(stale)} stale chunks" if stale else ""))
+    build_indexes(target, chroma_dir, target_name)
+    return target
+
 def main(
     ebook_path=None,
     chroma_dir=None,
-    collection_name="innocents_abroad",
-    batch_size=10
+    collection_name=None,
+    batch_size=256,
+    metadata_workers=4,
+    embedding_workers=8,
+    queue_size=64,
+    metadata_rps=None,
+    embedding_rps=None,
+    rebuild=False,
+    embed_batch_size=32,
+    metadata_batch_size=4,
+    ebook_dir=None,
+    preprocess_workers=None,
+    embedding_backend=None,
+    reembed=False
 ):
     
     PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    if ebook_path is None:
+    if ebook_path is None and ebook_dir is None:
         ebook_path = os.path.join(PROJECT_ROOT, "data", "ebook.txt")
     if chroma_dir is None:
         chroma_dir = os.path.join(PROJECT_ROOT, "chroma_data")
+    if collection_name is None:
+        collection_name = os.getenv("CHROMA_COLLECTION", "innocents_abroad")
+    if reembed:
+        reembed_collection(chroma_dir, collection_name, embedding_backend, batch_size)
+        return
+    backend = get_embedding_backend(embedding_backend)
+    collection_name = collection_for_backend(collection_name, backend)
     
     print(f"Current working directory: {os.getcwd()}")
     print(f"ChromaDB directory will be: {os.path.abspath(chroma_dir)}")
-    print(f"Ebook path: {os.path.abspath(ebook_path)}")
-    
     
-    if not os.path.exists(ebook_path):
-        print(f"ERROR: Ebook file not found at {ebook_path}")
-        return
+    if ebook_dir is not None:
+        if not os.path.isdir(ebook_dir):
+            print(f"ERROR: Ebook directory not found at {ebook_dir}")
+            return
+        book_paths = find_books(ebook_dir)
+        print(f"Ebook directory: {os.path.abspath(ebook_dir)} ({len(book_paths)} books)")
+    else:
+        print(f"Ebook path: {os.path.abspath(ebook_path)}")
+        if not os.path.exists(ebook_path):
+            print(f"ERROR: Ebook file not found at {ebook_path}")
+            return
+        book_paths = [ebook_path]
     
     
     os.makedirs(chroma_dir, exist_ok=True)
@@ -58,54 +208,121 @@ def main(
         print(f"Collection created/retrieved: {collection.name}")
         
         
-        print("Loading and preprocessing book...")
-        with open(ebook_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
+        # The collection is the record of finished work: every batch is upserted
+        # as soon as its chunks have metadata and embeddings, so after a crash the
+        # next run skips exactly the chunks that were written.
+        stored = collection.get(include=["metadatas"])
+        stored_metadata = dict(zip(stored["ids"], stored["metadatas"]))
+        stored_ids = set(stored_metadata)
         
-        clean_text = clean_gutenberg_text(raw_text)
-        chunks = chunk_text_by_paragraph(clean_text)
         
-        print(f"Processing {len(chunks)} chunks...")
+        print(f"Loading and preprocessing {len(book_paths)} book(s)...")
+        # Books are cleaned and chunked in parallel worker processes; only the
+        # chunks that still need processing are kept.
+        pending, seen, relabel, rekey, claimed = [], set(), [], [], set()
+        for path, book_chunks in chunk_books(book_paths, workers=preprocess_workers):
+            for item in book_chunks:
+                chunk_id = chunk_content_id(item["text"], item.get("book_id"))
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                item["id"] = chunk_id
+                if not rebuild and chunk_id not in stored_ids:
+                    # Stored under its older text-only id: move it to the new id
+                    # (once, for the first book that has the text) instead of
+                    # calling Bedrock again.
+                    legacy_id = chunk_content_id(item["text"])
+                    if legacy_id in stored_ids and legacy_id not in claimed:
+                        claimed.add(legacy_id)
+                        rekey.append((legacy_id, item))
+                        continue
+                if rebuild or chunk_id not in stored_ids:
+                    pending.append(item)
+                    continue
+                # Unchanged chunk: only refresh the per-book fields and its index
+                # if they moved (an edit earlier in the book shifts every later
+                # chunk_index), without new Bedrock calls.
+                meta = stored_metadata[chunk_id] or {}
+                refreshed = _position_metadata(item)
+                if any(meta.get(key) != value for key, value in refreshed.items()):
+                    relabel.append((chunk_id, {**meta, **refreshed}))
+            print(f"  {os.path.basename(path)}: {len(book_chunks)} chunks")
+        orphan_ids = sorted(stored_ids - seen)
         
+        print(f"{len(seen)} chunks: {len(seen) - len(pending)} unchanged, {len(pending)} to process, "
+              f"{len(orphan_ids)} orphaned")
         
-        batch_ids, batch_docs, batch_embs, batch_metas = [], [], [], []
+        for start in range(0, len(relabel), batch_size):
+            batch = relabel[start:start + batch_size]
+            collection.update(ids=[chunk_id for chunk_id, _ in batch], metadatas=[meta for _, meta in batch])
+        if relabel:
+            print(f"Updated book metadata and positions of {len(relabel)} unchanged chunks")
+        for start in range(0, len(rekey), batch_size):
+            batch = rekey[start:start + batch_size]
+            rows = collection.get(ids=[legacy_id for legacy_id, _ in batch],
+                                  include=["embeddings", "documents", "metadatas"])
+            stored_rows = {chunk_id: (doc, embedding, meta) for chunk_id, doc, embedding, meta
+                           in zip(rows["ids"], rows["documents"], rows["embeddings"], rows["metadatas"])}
+            collection.upsert(
+                ids=[item["id"] for _, item in batch],
+                documents=[stored_rows[legacy_id][0] for legacy_id, _ in batch],
+                embeddings=[stored_rows[legacy_id][1] for legacy_id, _ in batch],
+                metadatas=[{**(stored_rows[legacy_id][2] or {}), **_position_metadata(item), "chunk_id": item["id"]}
+                           for legacy_id, item in batch]
+            )
+        if rekey:
+            # The text-only ids are no longer produced, so they are deleted as orphans below.
+            print(f"Moved {len(rekey)} unchanged chunks to per-book ids")
+        print(f"Processing {len(pending)} chunks "
+              f"({metadata_workers} metadata workers, {embedding_workers} embedding workers)...")
         
-        for i, chunk in enumerate(tqdm(chunks, desc="Embedding and metadata")):
-            try:
-                
-                meta = get_nova_pro_metadata(chunk)
-                meta["chunk_id"] = i
-                meta["text_preview"] = chunk[:60]
-                embedding = get_bedrock_embedding(chunk)
-                
-                batch_ids.append(str(i))
-                batch_docs.append(chunk)
-                batch_embs.append(embedding)
-                batch_metas.append(flatten_metadata(meta))
-                
-                
-                if len(batch_ids) == batch_size or i == len(chunks) - 1:
-                    print(f"Inserting batch of {len(batch_ids)} items...")
-                    collection.add(
-                        ids=batch_ids,
-                        documents=batch_docs,
-                        embeddings=batch_embs,
-                        metadatas=batch_metas
-                    )
-                    print(f"Stored batch up to chunk {i+1}/{len(chunks)}")
-                    
-                    
-                    batch_ids, batch_docs, batch_embs, batch_metas = [], [], [], []
-                    
-                    
-                    count = collection.count()
-                    print(f"Total documents in collection: {count}")
-                    
-            except Exception as e:
-                print(f"Error processing chunk {i}: {str(e)}")
-                continue
+        
+        def write(batch):
+            with span("ingest_write"):
+                collection.upsert(
+                    ids=[item["id"] for item in batch],
+                    documents=[item["text"] for item in batch],
+                    embeddings=[item["embedding"] for item in batch],
+                    metadatas=[item["metadata"] for item in batch]
+                )
+        
+        progress = tqdm(total=len(pending), desc="Embedding and metadata")
+        pipeline = IngestPipeline(
+            _wait_for_circuit(_extract_metadata_batch if metadata_batch_size > 1 else _extract_metadata),
+            _wait_for_circuit((lambda items: _embed_batch(items, max_workers=max(1, embedding_workers // 2),
+                                                          backend=backend))
+                              if embed_batch_size > 1 else (lambda item: _embed(item, backend))),
+            write,
+            metadata_workers=metadata_workers,
+            embedding_workers=2 if embed_batch_size > 1 else embedding_workers,
+            embed_batch_size=embed_batch_size,
+            metadata_batch_size=metadata_batch_size,
+            queue_size=queue_size,
+            write_batch_size=batch_size,
+            metadata_rps=metadata_rps,
+            embedding_rps=embedding_rps,
+            on_item_done=progress.update
+        )
+        with span("ingest_pipeline") as pipeline_span:
+            summary = pipeline.run(pending)
+            pipeline_span.set(submitted=summary["submitted"], written=summary["written"],
+                              errors=len(summary["errors"]))
+        progress.close()
+        print(f"Stored {summary['written']}/{summary['submitted']} chunks in {summary['elapsed']:.1f}s "
+              f"({len(summary['errors'])} errors)")
+        if summary["errors"]:
+            print(f"{len(summary['errors'])} chunks were not stored; run the ingestion again to retry just those.")
+        print(f"Metadata extraction: {get_metadata_stats()}")
         
         
+        if orphan_ids:
+            for start in range(0, len(orphan_ids), batch_size):
+                collection.delete(ids=orphan_ids[start:start + batch_size])
+            print(f"Deleted {len(orphan_ids)} orphaned chunks")
+        
+        
+        build_indexes(collection, chroma_dir, collection_name)
+        
         final_count = collection.count()
         print(f"Final count: {final_count} chunks stored in ChromaDB")
         
@@ -123,7 +340,7 @@ def main(
             print(f"\nTesting retrieval for: '{test_query}'")
             try:
                 results = collection.query(
-                    query_texts=[test_query],
+                    query_embeddings=[backend.embed(test_query)],
                     n_results=min(3, final_count)
                 )
                 for idx, doc in enumerate(results["documents"][0]):
@@ -133,9 +350,39 @@ def main(
                 print(f"Error during query: {str(e)}")
         
     except Exception as e:
+        count("ingest_failures", error=type(e).__name__)
         print(f"ERROR: {str(e)}")
         import traceback
         traceback.print_exc()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    load_env()
+    parser = argparse.ArgumentParser(description="Ingest the ebook into ChromaDB.")
+    parser.add_argument("--ebook-path")
+    parser.add_argument("--ebook-dir", help="ingest every .txt Gutenberg book in this directory")
+    parser.add_argument("--preprocess-workers", type=int,
+                        help="processes used to clean and chunk books (default: CPU count)")
+    parser.add_argument("--chroma-dir")
+    parser.add_argument("--collection-name", help="default: $CHROMA_COLLECTION or innocents_abroad")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per collection.add call")
+    parser.add_argument("--metadata-workers", type=int, default=4)
+    parser.add_argument("--embedding-workers", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--metadata-rps", type=float, help="max metadata (converse) calls per second; a batched prompt is one call")
+    parser.add_argument("--embedding-rps", type=float, help="max embedding calls per second; with --embed-batch-size > 1, batches per second")
+    parser.add_argument("--metadata-batch-size", type=int, default=4,
+                        help="chunks per metadata prompt (1 = one prompt per chunk)")
+    parser.add_argument("--embed-batch-size", type=int, default=32,
+                        help="chunks per embedding call (1 = one call per chunk)")
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS,
+                        help="default: $EMBEDDING_BACKEND or bedrock; non-Bedrock backends write to "
+                             "<collection>_<backend>")
+    parser.add_argument("--reembed", action="store_true",
+                        help="only copy the Bedrock collection into --embedding-backend's collection "
+                             "with new embeddings, reusing its chunks and metadata")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="regenerate metadata and embeddings for every chunk, even unchanged ones")
+    args = parser.parse_args()
+    main(**vars(args))
\ No newline at end of file
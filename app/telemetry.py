@@ -0,0 +1,391 @@
+import bisect
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Optional
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow generations.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_PREFIX = "twain"
+
+_current_span = contextvars.ContextVar("twain_current_span", default=None)
+_trace_ids = itertools.count(1)
+_PROCESS_TAG = uuid.uuid4().hex[:8]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style (count, sum, bucket counts).
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th quantile (inf if past the last bucket).
+        """
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target and seen:
+                return bound
+        return 0.0
+
+
+class Span:
+    """
+    One timed stage. Use through Telemetry.span() as a context manager. Labels
+    (low cardinality, e.g. the query label) become metric labels and may be
+    changed until the span ends; attributes only go to the span log.
+    """
+
+    __slots__ = ("telemetry", "name", "labels", "attributes", "trace_id", "parent", "start", "_token")
+
+    def __init__(self, telemetry: "Telemetry", name: str, labels: dict):
+        self.telemetry = telemetry
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+
+    def set(self, **attributes) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def set_label(self, key: str, value) -> "Span":
+        self.labels[key] = value
+        return self
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        self.parent = parent.name if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else next(_trace_ids)
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Ended in another context (a generator closed from a different thread).
+            pass
+        self.telemetry._finish(self, duration, exc)
+        return False
+
+
+class _NoopSpan:
+    """Stand-in returned when telemetry is off, so instrumented code costs almost nothing."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        return self
+
+    def set_label(self, key, value):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Telemetry:
+    """
+    In-process registry of span latency histograms and counters.
+
+    Every finished span updates `<prefix>_span_duration_seconds{span=...}` (and
+    `<prefix>_span_errors_total` if it raised) and is handed to each exporter's
+    on_span(). Counters cover cache hits, token usage and other events. Thread-safe.
+    """
+
+    def __init__(self, exporters=None, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+        self.exporters = list(exporters or [])
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter) -> None:
+        self.exporters.append(exporter)
+
+    def span(self, name: str, **labels) -> Span:
+        return Span(self, name, labels)
+
+    def _finish(self, span: Span, duration: float, exc: Optional[BaseException]) -> None:
+        labels = (("span", span.name),)
+        if span.labels:
+            labels += _label_key(span.labels)
+        key = ("span_duration_seconds", labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(duration)
+        if exc is not None:
+            self.count("span_errors", _key=labels + (("error", type(exc).__name__),))
+        if not self.exporters:
+            return
+        record = {
+            "ts": time.time(),
+            "trace_id": f"{_PROCESS_TAG}-{span.trace_id}",
+            "span": span.name,
+            "parent": span.parent,
+            "duration_ms": round(duration * 1000, 3),
+            **dict(labels[1:]),
+            **span.attributes
+        }
+        if exc is not None:
+            record["error"] = f"{type(exc).__name__}: {exc}"
+        for exporter in self.exporters:
+            exporter.on_span(record)
+
+    def observe(self, name: str, value: float, _key: tuple = None, **labels) -> None:
+        """
+        Add a value to the histogram `<prefix>_<name>` (e.g. "time_to_first_token_seconds").
+        """
+        key = (name, _key if _key is not None else _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def count(self, name: str, amount: float = 1, _key: tuple = None, **labels) -> None:
+        """
+        Increment the counter `<prefix>_<name>_total`.
+        """
+        key = (name, _key if _key is not None else _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def record_usage(self, span_name: str, usage: Optional[dict]) -> None:
+        """
+        Count Bedrock token usage (`inputTokens` / `outputTokens`, and prompt
+        cache reads / writes) under `<prefix>_tokens_total`.
+        """
+        for field, kind in (("inputTokens", "input"), ("outputTokens", "output"),
+                            ("cacheReadInputTokens", "cache_read"), ("cacheWriteInputTokens", "cache_write")):
+            tokens = (usage or {}).get(field)
+            if tokens:
+                self.count("tokens", tokens, span=span_name, kind=kind)
+
+    def snapshot(self) -> dict:
+        """
+        Plain-dict view of every metric: histograms with count, sum, mean and
+        approximate p50/p95/p99, and counters.
+        """
+        with self._lock:
+            histograms = {key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                          for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        def name(key):
+            metric, labels = key
+            return metric + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        return {
+            "histograms": {
+                name(key): {"count": count, "sum": total, "mean": total / count if count else 0.0,
+                            "p50": p50, "p95": p95, "p99": p99}
+                for key, (count, total, p50, p95, p99) in sorted(histograms.items())
+            },
+            "counters": {name(key): value for key, value in sorted(counters.items())}
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        def labels_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            histograms = {key: (list(h.counts), h.count, h.sum) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        for metric in sorted({name for name, _ in histograms}):
+            full = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# TYPE {full} histogram")
+            for (name, labels), (counts, count, total) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{full}_bucket{labels_text(labels, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{full}_bucket{labels_text(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{full}_sum{labels_text(labels)} {total}")
+                lines.append(f"{full}_count{labels_text(labels)} {count}")
+        for metric in sorted({name for name, _ in counters}):
+            full = f"{METRIC_PREFIX}_{metric}_total"
+            lines.append(f"# TYPE {full} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{full}{labels_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+def _label_key(labels: dict) -> tuple:
+    if not labels:
+        return ()
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class JsonLogExporter:
+    """
+    Writes one JSON object per finished span to a stream (default stderr) or file.
+    """
+
+    def __init__(self, path: Optional[str] = None, stream=None):
+        self._stream = stream or (open(path, "a", encoding="utf-8") if path else sys.stderr)
+        self._lock = threading.Lock()
+
+    def on_span(self, record: dict) -> None:
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+
+class PrometheusExporter:
+    """
+    Serves Telemetry.render_prometheus() at http://<host>:<port>/metrics from a
+    background thread. Metrics are read at scrape time, so on_span() does nothing.
+    """
+
+    def __init__(self, telemetry: Telemetry, port: int, host: str = "0.0.0.0"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter_telemetry = telemetry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter_telemetry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="telemetry-prometheus", daemon=True)
+        self._thread.start()
+
+    def on_span(self, record: dict) -> None:
+        pass
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+_telemetry = None
+_configured = False
+_config_lock = threading.Lock()
+
+
+def configure_telemetry(exporters: str = None) -> Optional[Telemetry]:
+    """
+    (Re)configure process-wide telemetry. `exporters` is a comma-separated list
+    of "prometheus", "json" and/or "metrics" (in-process metrics only); empty
+    or None turns telemetry off.
+
+    JSON span logs go to TELEMETRY_JSON_PATH (default stderr); the Prometheus
+    endpoint listens on TELEMETRY_PROMETHEUS_PORT (default 9464).
+    """
+    global _telemetry, _configured
+    with _config_lock:
+        names = {name.strip().lower() for name in (exporters or "").split(",") if name.strip()}
+        names -= {"0", "false", "off", "none"}
+        if not names:
+            _telemetry = None
+        else:
+            telemetry = Telemetry()
+            if "json" in names:
+                telemetry.add_exporter(JsonLogExporter(os.getenv("TELEMETRY_JSON_PATH") or None))
+            if "prometheus" in names:
+                port = int(os.getenv("TELEMETRY_PROMETHEUS_PORT", "9464"))
+                telemetry.add_exporter(PrometheusExporter(telemetry, port))
+            _telemetry = telemetry
+        _configured = True
+        return _telemetry
+
+
+def get_telemetry() -> Optional[Telemetry]:
+    """
+    Returns the process-wide Telemetry, configured on first use from the
+    TELEMETRY environment variable (see configure_telemetry), or None when off.
+    """
+    if not _configured:
+        configure_telemetry(os.getenv("TELEMETRY", ""))
+    return _telemetry
+
+
+def span(name: str, **labels):
+    """
+    Time a stage: `with span("embed"): ...`. A no-op when telemetry is off.
+    """
+    telemetry = _telemetry if _configured else get_telemetry()
+    if telemetry is None:
+        return NOOP_SPAN
+    return telemetry.span(name, **labels)
+
+
+def count(name: str, amount: float = 1, **labels) -> None:
+    telemetry = _telemetry if _configured else get_telemetry()
+    if telemetry is not None:
+        telemetry.count(name, amount, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    telemetry = _telemetry if _configured else get_telemetry()
+    if telemetry is not None:
+        telemetry.observe(name, value, **labels)
+
+
+def record_usage(span_name: str, usage: Optional[dict]) -> None:
+    telemetry = _telemetry if _configured else get_telemetry()
+    if telemetry is not None:
+        telemetry.record_usage(span_name, usage)
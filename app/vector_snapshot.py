@@ -0,0 +1,247 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def snapshot_paths(chroma_dir: str, collection_name: str) -> dict:
+    """
+    The sidecar of a collection's snapshot, and the prefix its data files are named after.
+    """
+    base = os.path.join(chroma_dir, f"vectors_{collection_name}")
+    return {"base": base, "sidecar": f"{base}.json"}
+
+
+def _data_files(paths: dict, sidecar: dict) -> dict:
+    """
+    Paths of the data files a sidecar points to. Sidecars written before the
+    files were versioned have no "files" entry and use the unversioned names.
+    """
+    prefix = os.path.basename(paths["base"])
+    files = sidecar.get("files") or {"vectors": f"{prefix}.f32", "documents": f"{prefix}.docs"}
+    directory = os.path.dirname(paths["base"])
+    return {key: os.path.join(directory, name) for key, name in files.items()}
+
+
+def _read_sidecar(paths: dict) -> Optional[dict]:
+    try:
+        with open(paths["sidecar"], "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _normalize_rows(matrix: "np.ndarray") -> "np.ndarray":
+    import numpy as np
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorSnapshot:
+    """
+    Read-only copy of a collection's embeddings for exact in-process search.
+
+    On disk it is three files next to the ChromaDB data:
+      vectors_<collection>.<version>.f32   float32 matrix, one L2-normalized row per chunk
+      vectors_<collection>.<version>.docs  the chunk texts, concatenated as UTF-8
+      vectors_<collection>.json            ids, metadatas, document offsets, shape
+                                           and the names of the two data files
+
+    Both binary files are memory-mapped rather than read, so loading costs one
+    JSON parse, and processes serving the same snapshot share its pages through
+    the OS page cache. A search is one matrix product of the normalized query
+    batch against every row (cosine similarity) followed by a partial sort, so
+    results are exact.
+    """
+
+    def __init__(self, ids: List[str], vectors: "np.ndarray", documents, doc_offsets: "np.ndarray",
+                 metadatas: List[dict], book_ids: List[str] = None, doc_books: "np.ndarray" = None):
+        import numpy as np
+
+        self.ids = ids
+        self.vectors = vectors
+        self._documents = documents
+        self._doc_offsets = doc_offsets
+        self.metadatas = metadatas
+        self.book_ids = book_ids or []
+        self.doc_books = doc_books if doc_books is not None else np.full(len(ids), -1, dtype=np.int32)
+        self._position = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def export(paths: dict, collection_name: str, ids: List[str], embeddings, documents: List[str],
+               metadatas: List[dict]) -> None:
+        """
+        Write a snapshot to the files in `paths` (see snapshot_paths).
+
+        The data files get new versioned names on every export and the sidecar,
+        which names them, is replaced last, so a reader always loads a sidecar
+        together with the data written for it. Data files of the previous
+        export are kept for readers that have just read the old sidecar; older
+        ones are removed.
+        """
+        import numpy as np
+
+        vectors = _normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1))
+        encoded = [(doc or "").encode("utf-8") for doc in documents]
+        doc_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(doc) for doc in encoded], out=doc_offsets[1:])
+        book_index = {}
+        doc_books = [book_index.setdefault((meta or {})["book_id"], len(book_index))
+                     if (meta or {}).get("book_id") else -1 for meta in metadatas]
+
+        previous = _read_sidecar(paths)
+        directory = os.path.dirname(paths["base"]) or "."
+        prefix = os.path.basename(paths["base"])
+        version = f"{time.time_ns():x}"
+        files = {"vectors": f"{prefix}.{version}.f32", "documents": f"{prefix}.{version}.docs"}
+        for key, data in (("vectors", vectors.tobytes()), ("documents", b"".join(encoded))):
+            with open(os.path.join(directory, files[key]), "wb") as f:
+                f.write(data)
+        sidecar = {
+            "collection": collection_name,
+            "updated_at": time.time(),
+            "count": len(ids),
+            "dim": int(vectors.shape[1]) if len(ids) else 0,
+            "files": files,
+            "ids": list(ids),
+            "doc_offsets": doc_offsets.tolist(),
+            "book_ids": sorted(book_index, key=book_index.get),
+            "doc_books": doc_books,
+            "metadatas": [meta or {} for meta in metadatas]
+        }
+        with open(f"{paths['sidecar']}.tmp", "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(f"{paths['sidecar']}.tmp", paths["sidecar"])
+
+        keep = set(files.values())
+        if previous is not None:
+            keep.update(os.path.basename(path) for path in _data_files(paths, previous).values())
+        stale = re.compile(rf"{re.escape(prefix)}(\.[0-9a-f]{{12,}})?\.(f32|docs)")
+        for name in os.listdir(directory):
+            if name not in keep and stale.fullmatch(name):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass  # still mapped by a reader on Windows; removed by a later export
+
+    @classmethod
+    def load(cls, paths: dict) -> "VectorSnapshot":
+        import numpy as np
+
+        with open(paths["sidecar"], "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        count, dim = sidecar["count"], sidecar["dim"]
+        files = _data_files(paths, sidecar)
+        if count:
+            vectors = np.memmap(files["vectors"], dtype=np.float32, mode="r", shape=(count, dim))
+            documents = np.zeros(0, dtype=np.uint8)
+            if sidecar["doc_offsets"][-1]:
+                documents = np.memmap(files["documents"], dtype=np.uint8, mode="r")
+        else:
+            vectors, documents = np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.uint8)
+        return cls(sidecar["ids"], vectors, documents, np.asarray(sidecar["doc_offsets"], dtype=np.int64),
+                   sidecar["metadatas"], sidecar["book_ids"], np.asarray(sidecar["doc_books"], dtype=np.int32))
+
+    def document(self, row: int) -> str:
+        start, end = self._doc_offsets[row], self._doc_offsets[row + 1]
+        return bytes(self._documents[start:end]).decode("utf-8")
+
+    def search(self, query_embeddings, n_results: int = 5, book=None) -> List[List[Tuple[int, float]]]:
+        """
+        Exact top `n_results` rows for each query embedding (a vector or a
+        batch of them), as lists of (row, cosine similarity), best first.
+        `book` restricts results to one book id or a list of them.
+        """
+        import numpy as np
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if not len(self.ids):
+            return [[] for _ in queries]
+        scores = _normalize_rows(queries) @ self.vectors.T
+        allowed = None
+        if book:
+            wanted = [self.book_ids.index(b) for b in ([book] if isinstance(book, str) else book)
+                      if b in self.book_ids]
+            allowed = np.isin(self.doc_books, wanted)
+            scores[:, ~allowed] = -np.inf
+        k = min(n_results, len(self.ids) if allowed is None else int(allowed.sum()))
+        if k <= 0:
+            return [[] for _ in queries]
+        if k < len(self.ids):
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(len(self.ids)), (len(queries), 1))
+        results = []
+        for row_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-row_scores[candidates], kind="stable")]
+            results.append([(int(row), float(row_scores[row])) for row in ranked])
+        return results
+
+    def rows(self, rows: List[int]) -> dict:
+        """
+        Chroma-style {"ids", "documents", "metadatas"} for the given rows.
+        """
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.document(row) for row in rows],
+            "metadatas": [self.metadatas[row] for row in rows]
+        }
+
+    def get(self, ids: List[str]) -> dict:
+        """
+        Rows by chunk id, like collection.get(ids=...); unknown ids are skipped.
+        """
+        if self._position is None:
+            self._position = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        return self.rows([self._position[chunk_id] for chunk_id in ids if chunk_id in self._position])
+
+
+def export_collection_snapshot(collection, chroma_dir: str, collection_name: str, rows: dict = None) -> VectorSnapshot:
+    """
+    Export every chunk of a ChromaDB collection (or already-read `rows` with
+    embeddings, documents and metadatas) as a vector snapshot and load it back.
+    """
+    if rows is None:
+        from app.chroma_utils import read_collection
+        rows = read_collection(collection, include=("embeddings", "documents", "metadatas"))
+    paths = snapshot_paths(chroma_dir, collection_name)
+    VectorSnapshot.export(paths, collection_name, rows["ids"], rows["embeddings"], rows["documents"], rows["metadatas"])
+    return VectorSnapshot.load(paths)
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_vector_snapshot(chroma_dir: str, collection_name: str) -> Optional[VectorSnapshot]:
+    """
+    Returns the exported vector snapshot of a collection, or None if there is
+    none. Loaded once per process and reloaded when the sidecar changes.
+    """
+    path = snapshot_paths(chroma_dir, collection_name)["sidecar"]
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _snapshots_lock:
+        cached = _snapshots.get(path)
+        if cached is None or cached[0] != mtime:
+            try:
+                cached = (mtime, VectorSnapshot.load(snapshot_paths(chroma_dir, collection_name)))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: ignoring unreadable vector snapshot {path}: {e}")
+                return None
+            _snapshots[path] = cached
+        return cached[1]
@@ -1,25 +1,74 @@
+import contextvars
 import os
-import requests
-from typing import Optional, Dict, Any
-from dotenv import load_dotenv
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
 
+from app.env import load_env
+from app.resilience import CircuitBreaker, CircuitOpenError, backoff_delay
+from app.telemetry import count, span
 
-load_dotenv()
+
+# Batch lookups share one bounded pool instead of starting threads per call.
+_lookup_executor = ThreadPoolExecutor(max_workers=int(os.getenv("WEATHER_THREADS", "16")),
+                                      thread_name_prefix="weather")
 
 class WeatherAPI:
     """Client for OpenWeatherMap Current Weather API"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache_ttl: float = 600.0, pool_size: int = 16,
+                 max_retries: int = 2, retry_base_delay: float = 0.2):
         """
         Initialize the WeatherAPI client.
 
         Args:
             api_key: Your OpenWeatherMap API key. If None, will read from env 'Weather_api'.
+            cache_ttl: Seconds a city's current weather is reused before refetching (0 disables caching).
+            pool_size: Maximum number of pooled keep-alive connections to the API.
+            max_retries: Retries of a request that hit rate limiting (429), a server
+                error (5xx), a timeout or a dropped connection, with jittered backoff.
+            retry_base_delay: Backoff base in seconds.
+
+        After WEATHER_BREAKER_THRESHOLD (default 5) lookups in a row fail that
+        way, lookups return an "unavailable" error without calling the API for
+        WEATHER_BREAKER_RESET seconds (default 30).
         """
+        load_env()
         self.api_key = api_key or os.getenv("Weather_api")
-        self.base_url = "https://api.openweathermap.org/data/2.5/weather"
+        self.base_url = os.getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5/weather")
         if not self.api_key:
             raise ValueError("OpenWeatherMap API key not found. Set 'Weather_api' in your .env file.")
+        self.cache_ttl = cache_ttl
+        self.pool_size = pool_size
+        # requests is imported here rather than at module level so importing
+        # the app does not pay for it until the first weather lookup.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._cache = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.requests_made = 0
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.breaker = CircuitBreaker(
+            "OpenWeatherMap",
+            failure_threshold=int(os.getenv("WEATHER_BREAKER_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("WEATHER_BREAKER_RESET", "30"))
+        )
+
+    @property
+    def available(self) -> bool:
+        """
+        False while the circuit breaker is keeping calls away from the API.
+        """
+        return self.breaker.state != "open"
 
     def get_weather_by_city(
         self, city_name: str, country_code: Optional[str] = None, units: str = "metric"
@@ -27,6 +76,9 @@ class WeatherAPI:
         """
         Get current weather data for a city.
 
+        Successful results are cached per city for `cache_ttl` seconds, and
+        simultaneous lookups of the same city share a single API request.
+
         Args:
             city_name: Name of the city.
             country_code: Optional 2-letter country code (e.g., 'US', 'UK').
@@ -35,7 +87,90 @@ class WeatherAPI:
         Returns:
             Dictionary with structured weather data, or None if error.
         """
+        key = (city_name.strip().lower(), (country_code or "").lower(), units)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.cache_hits += 1
+                count("cache", cache="weather", result="hit")
+                return cached[1]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            with span("weather") as weather_span:
+                weather_info = self._fetch_guarded(city_name, country_code, units)
+                if "error" in weather_info:
+                    weather_span.set(error=weather_info["error"])
+                    count("weather_errors")
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if self.cache_ttl and "error" not in weather_info:
+                self._cache[key] = (time.monotonic() + self.cache_ttl, weather_info)
+            del self._in_flight[key]
+        future.set_result(weather_info)
+        return weather_info
+
+    def get_weather_for_cities(
+        self, city_names: List[str], country_code: Optional[str] = None, units: str = "metric"
+    ) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Get current weather for many cities at once, fetching them concurrently
+        on a thread pool shared by all lookups (WEATHER_THREADS, default 16).
+
+        Args:
+            city_names: Names of the cities.
+            country_code: Optional 2-letter country code applied to every city.
+            units: 'metric' (Celsius), 'imperial' (Fahrenheit), or 'standard' (Kelvin).
+
+        Returns:
+            Dictionary mapping each city name (in input order) to its weather data.
+        """
+        unique = list(dict.fromkeys(city_names))
+        if not unique:
+            return {}
+        if len(unique) == 1:
+            return {unique[0]: self.get_weather_by_city(unique[0], country_code, units)}
+        # Each lookup runs in a copy of the caller's context so its spans join the caller's trace.
+        futures = [
+            _lookup_executor.submit(contextvars.copy_context().run, self.get_weather_by_city, city, country_code, units)
+            for city in unique
+        ]
+        return {city: future.result() for city, future in zip(unique, futures)}
+
+    def _fetch_guarded(self, city_name: str, country_code: Optional[str], units: str) -> Dict[str, Any]:
+        """
+        _fetch_weather behind the circuit breaker. Errors marked `unavailable`
+        (the API is down or rate limiting us) count as failures; anything else,
+        including an unknown city, means the API is working.
+        """
+        try:
+            self.breaker.check()
+        except CircuitOpenError as e:
+            return {"error": "Weather service is unavailable right now.", "unavailable": True, "detail": str(e)}
+        weather_info = self._fetch_weather(city_name, country_code, units)
+        if weather_info.get("unavailable"):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return weather_info
+
+    def _fetch_weather(
+        self, city_name: str, country_code: Optional[str], units: str
+    ) -> Optional[Dict[str, Any]]:
         # Build query parameter
+        import requests
+
         query = f"{city_name},{country_code}" if country_code else city_name
 
         params = {
@@ -44,8 +179,21 @@ class WeatherAPI:
             "units": units
         }
 
+        response = None
         try:
-            response = requests.get(self.base_url, params=params, timeout=10)
+            for attempt in range(self.max_retries + 1):
+                with self._lock:
+                    self.requests_made += 1
+                try:
+                    response = self.session.get(self.base_url, params=params, timeout=10)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    if attempt == self.max_retries:
+                        return {"error": f"An error occurred: {e}", "unavailable": True}
+                else:
+                    if (response.status_code != 429 and response.status_code < 500) or attempt == self.max_retries:
+                        break
+                count("retries", operation="weather")
+                time.sleep(backoff_delay(attempt, self.retry_base_delay, 5.0))
             response.raise_for_status()
             data = response.json()
 
@@ -65,9 +213,10 @@ class WeatherAPI:
             return weather_info
 
         except requests.exceptions.HTTPError as http_err:
-            if response.status_code == 404:
+            if response is not None and response.status_code == 404:
                 return {"error": f"City '{city_name}' not found."}
-            return {"error": f"HTTP error: {http_err}"}
+            unavailable = response is not None and (response.status_code == 429 or response.status_code >= 500)
+            return {"error": f"HTTP error: {http_err}", "unavailable": unavailable}
         except Exception as e:
             return {"error": f"An error occurred: {e}"}
 
@@ -98,3 +247,37 @@ class WeatherAPI:
             f"Visibility: {weather_data.get('visibility', 'N/A')} meters"
         ]
         return "\n".join(lines)
+
+    @staticmethod
+    def format_weather_compact(weather_data: Dict[str, Any], location: str = "") -> str:
+        """
+        Format weather information as one dense line for prompts, e.g.
+        "Rome, IT: light rain, 18°C (feels 17°C), humidity 80%, wind 3.1 m/s".
+
+        Args:
+            weather_data: Structured weather data dictionary.
+            location: Name to show if the data has none (e.g. for errors).
+
+        Returns:
+            One line; fields the API did not return are left out.
+        """
+        if not weather_data or "error" in weather_data:
+            error = (weather_data or {}).get("error", "no weather data available")
+            return f"{location or 'Unknown'}: unavailable ({error})"
+
+        place = weather_data.get("city") or location or "Unknown"
+        if weather_data.get("country"):
+            place += f", {weather_data['country']}"
+        fields = []
+        if weather_data.get("description"):
+            fields.append(weather_data["description"].lower())
+        if weather_data.get("temperature") is not None:
+            temperature = f"{weather_data['temperature']:g}°C"
+            if weather_data.get("feels_like") is not None:
+                temperature += f" (feels {weather_data['feels_like']:g}°C)"
+            fields.append(temperature)
+        if weather_data.get("humidity") is not None:
+            fields.append(f"humidity {weather_data['humidity']}%")
+        if weather_data.get("wind_speed") is not None:
+            fields.append(f"wind {weather_data['wind_speed']:g} m/s")
+        return f"{place}: {', '.join(fields) or 'no details'}"
@@ -1,10 +1,44 @@
+import threading
+from app.prompt_builder import compact_weather_enabled
 from app.weather import WeatherAPI
 
-def get_weather_by_city(location: str) -> str:
+_weather_api = None
+_weather_api_lock = threading.Lock()
+
+def get_weather_api() -> WeatherAPI:
+    """
+    Returns the process-wide WeatherAPI client, so its connection pool and
+    per-city cache are shared by every request.
+    """
+    global _weather_api
+    if _weather_api is None:
+        with _weather_api_lock:
+            if _weather_api is None:
+                _weather_api = WeatherAPI()
+    return _weather_api
+
+def _format(location: str, weather_data: dict, compact: bool = None) -> str:
+    if compact is None:
+        compact = compact_weather_enabled()
+    if compact:
+        return WeatherAPI.format_weather_compact(weather_data, location)
+    return WeatherAPI.format_weather(weather_data)
+
+def get_weather_by_city(location: str, compact: bool = None) -> str:
     """
     Fetch and format the current weather for a given location using the WeatherAPI class.
     Returns a formatted string with weather information or an error message.
+    With `compact` (default: PROMPT_COMPACT_WEATHER, on) the weather is one
+    dense line for prompts instead of the multi-line display format.
     """
-    weather_api = WeatherAPI()
+    weather_api = get_weather_api()
     weather_data = weather_api.get_weather_by_city(location)
-    return WeatherAPI.format_weather(weather_data)
+    return _format(location, weather_data, compact)
+
+def get_weather_for_cities(locations: list, compact: bool = None) -> dict:
+    """
+    Fetch and format the current weather for several locations concurrently.
+    Returns a dict mapping each location to its formatted weather string.
+    """
+    weather_data = get_weather_api().get_weather_for_cities(locations)
+    return {location: _format(location, data, compact) for location, data in weather_data.items()}
@@ -1,32 +1,61 @@
-import os
-from app.query_classifier import classify_query_llm
-from app.query_book import search_book
-from app.weather_query import get_weather_by_city
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+from app.query_classifier import classify_query, warm_up_classifier
+from app.query_book import CHROMA_DIR, COLLECTION_NAME, RetrievalContext, search_book
+from app.chroma_utils import get_chroma_store
+from app.lexical_index import get_lexical_index
+from app.vector_snapshot import get_vector_snapshot
+from app.weather_query import get_weather_api, get_weather_by_city, get_weather_for_cities
 from app.bedrock_client import get_bedrock_client
-from app.chroma_utils import connect_to_chromadb
-from app.bedrock_embed import get_bedrock_embedding
-
-
-def extract_cities_from_book(query: str) -> list:
-    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    CHROMA_DIR = os.path.join(PROJECT_ROOT, "chroma_data")
-    COLLECTION_NAME = "innocents_abroad"
-    client = connect_to_chromadb(CHROMA_DIR)
-    collection = client.get_collection(COLLECTION_NAME)
-    query_embedding = get_bedrock_embedding(query)
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=5,
-        include=['metadatas']
-    )
-    cities = set()
-    for meta in results["metadatas"][0]:
-        locs = meta.get("locations", "")
-        
-        for loc in locs.split(","):
-            city = loc.strip()
-            if city and city.lower() not in {"italy", "europe"}:
-                cities.add(city)
+from app.embedding_backend import collection_for_backend, embedding_backend_name, get_embedding_backend
+from app.semantic_cache import CachedAnswer, get_semantic_cache
+from app.location_index import get_location_index, parse_locations, place_kind
+from app.prompt_builder import (
+    compact_weather_enabled,
+    converse_request,
+    fit_lines,
+    section_budget,
+    truncate_to_budget
+)
+from app.resilience import is_unavailable_error
+from app.telemetry import count, observe, record_usage, span
+
+OUT_OF_SCOPE_ANSWER = "Sorry, I can only answer questions about Mark Twain's travels or the weather."
+WEATHER_UNAVAILABLE = "Current weather is unavailable right now; answer from the book information only."
+# Chunks retrieved per book or "both" query (the cities come from all of them),
+# and how many of them make up the book answer. Shared by the sync and async paths
+# so a query builds the same prompt whichever way it is answered.
+RETRIEVAL_RESULTS = 5
+BOOK_PASSAGES = 3
+# Static instructions for the final answer, sent as the (cacheable) system prompt.
+ANSWER_SYSTEM_PROMPT = (
+    "You are an intelligent travel assistant for a community inspired by Mark Twain's 'The Innocents Abroad.'\n"
+    "Given the user's query and the following information retrieved from the book and/or weather API, generate a helpful, concise, and context-aware response for the user.\n"
+    "If both book and weather information are provided, combine them naturally in your answer."
+)
+
+
+def extract_cities_from_book(query: str, context: RetrievalContext = None, book=None) -> list:
+    """
+    Collect the cities mentioned in the top 5 chunks retrieved for the query, in
+    rank order. Countries and regions are left out, since they are not weather
+    locations. Uses the location index built at ingestion when it exists, and
+    otherwise parses the chunks' `locations` metadata.
+    Pass a RetrievalContext to reuse an existing retrieval pass for the same query,
+    and `book` to only look at chunks from that book (or list of books).
+    """
+    if context is None:
+        context = RetrievalContext(query, n_results=RETRIEVAL_RESULTS, book=book)
+    index = get_location_index(context.chroma_dir, context.collection_name)
+    if index is not None:
+        return index.cities_for_chunks(context.ids[:5])
+    cities = {}
+    for meta in context.metadatas[:5]:
+        for place in parse_locations(meta.get("locations", "")):
+            if place_kind(place) == "city":
+                cities[place] = None
     return list(cities)
 
 def extract_location(query: str) -> str:
@@ -39,49 +68,275 @@ def extract_location(query: str) -> str:
         return match.group(1).strip()
     return "Paris"  
 
+def _final_response_request(query: str, book_answer: str = "", weather_answer: str = "") -> dict:
+    """
+    Build the Bedrock converse arguments for the final answer: the static
+    instructions as the system prompt, and the query (cut to PROMPT_QUERY_TOKENS)
+    with whichever of the book and weather sections are non-empty as the message.
+    """
+    sections = [f"User Query: {truncate_to_budget(query, section_budget('query'))}"]
+    if book_answer:
+        sections.append(f"Book Information: {book_answer}")
+    if weather_answer:
+        sections.append(f"Weather Information: {weather_answer}")
+    return converse_request("us.amazon.nova-pro-v1:0", ANSWER_SYSTEM_PROMPT, "\n".join(sections) + "\n\nResponse:",
+                            max_tokens=256, temperature=0.3)
+
 def generate_final_response(query: str, book_answer: str = "", weather_answer: str = "") -> str:
     """
     Use Bedrock LLM to generate a final, user-friendly response based on the query and retrieved data.
     """
     client = get_bedrock_client()
-    
-    prompt = (
-        "You are an intelligent travel assistant for a community inspired by Mark Twain's 'The Innocents Abroad.'\n"
-        "Given the user's query and the following information retrieved from the book and/or weather API, generate a helpful, concise, and context-aware response for the user.\n"
-        "If both book and weather information are provided, combine them naturally in your answer.\n"
-        "\n"
-        f"User Query: {query}\n"
-        f"Book Information: {book_answer}\n"
-        f"Weather Information: {weather_answer}\n"
-        "\n"
-        "Response:"
-    )
-    response = client.converse(
-        modelId="us.amazon.nova-pro-v1:0",
-        messages=[{"role": "user", "content": [{"text": prompt}]}],
-        inferenceConfig={"maxTokens": 256, "temperature": 0.3}
-    )
+    with span("generate"):
+        response = client.converse(**_final_response_request(query, book_answer, weather_answer))
+    record_usage("generate", response.get("usage"))
     return response["output"]["message"]["content"][0]["text"].strip()
 
-def process_query(query: str) -> str:
-    label = classify_query_llm(query)
+@dataclass
+class StreamTimings:
+    """
+    Latency of one streamed generation, in seconds from the request being sent.
+    """
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    usage: dict = field(default_factory=dict)
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        return None if self.first_token_at is None else self.first_token_at - self.started_at
+
+    @property
+    def total_time(self) -> Optional[float]:
+        return None if self.finished_at is None else self.finished_at - self.started_at
+
+def generate_final_response_stream(query: str, book_answer: str = "", weather_answer: str = "",
+                                   timings: StreamTimings = None) -> Iterator[str]:
+    """
+    Streaming variant of generate_final_response built on Bedrock converse_stream.
+    Yields text fragments as the model produces them. If `timings` is given it
+    records time to first token, total time and token usage.
+
+    Telemetry gets the same numbers as histograms rather than a span, since a
+    span would stay open across the yields to the caller.
+    """
+    client = get_bedrock_client()
+    if timings is None:
+        timings = StreamTimings()
+    timings.started_at = time.perf_counter()
+    response = client.converse_stream(**_final_response_request(query, book_answer, weather_answer))
+    for event in response["stream"]:
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"]["delta"].get("text", "")
+            if text:
+                if timings.first_token_at is None:
+                    timings.first_token_at = time.perf_counter()
+                    observe("time_to_first_token_seconds", timings.time_to_first_token)
+                yield text
+        elif "metadata" in event:
+            timings.usage = event["metadata"].get("usage", {})
+    timings.finished_at = time.perf_counter()
+    observe("generate_stream_seconds", timings.total_time)
+    record_usage("generate", timings.usage)
+
+def get_weather_for_book_cities(cities: list) -> str:
+    """
+    Fetch the current weather for every city and format it as one prompt section.
+    While the weather API's circuit breaker is open the lookups are skipped and
+    the model is told to answer from the book alone.
+    """
+    if cities and not get_weather_api().available:
+        count("degraded", stage="weather")
+        return WEATHER_UNAVAILABLE
+    return format_city_weather(get_weather_for_cities(cities))
+
+def format_city_weather(weathers: dict) -> str:
+    """
+    Join formatted weather per city (in rank order) into the weather section of
+    the prompt. Compact weather lines are kept within PROMPT_WEATHER_TOKENS,
+    dropping the lowest-ranked cities first.
+    """
+    if not weathers:
+        return "No specific cities found for weather lookup."
+    if compact_weather_enabled():
+        return "\n".join(fit_lines(list(weathers.values()), section_budget("weather")))
+    return "\n\n".join(f"Weather in {city}:\n{weather}" for city, weather in weathers.items())
+
+@dataclass
+class PreparedQuery:
+    """
+    Everything gathered for a query before the final generation. `answer` is set
+    when no generation is needed (cached book answer, out-of-scope query).
+    """
+    label: str
+    answer: Optional[str] = None
+    book_answer: str = ""
+    weather_answer: str = ""
+    cities: List[str] = field(default_factory=list)
+    query_embedding: Optional[list] = None
+    from_cache: bool = False
+
+def prepare_query(query: str, book=None) -> PreparedQuery:
+    """
+    Classify the query and fetch the book and/or weather data it needs. `book`
+    restricts retrieval to one book id (or a list of them) of the collection.
+
+    With the semantic cache enabled, a cache hit skips classification and
+    retrieval: book answers come back as-is, while weather-dependent answers reuse
+    the cached book portion with fresh weather. The cache only serves unfiltered
+    queries, since its entries are not keyed by book.
+    """
+    cache = get_semantic_cache() if not book else None
+    query_embedding = None
+    if cache is not None:
+        try:
+            query_embedding = get_embedding_backend().embed(query)
+        except Exception as e:
+            if not is_unavailable_error(e):
+                raise
+            cache = None
+    if cache is not None:
+        entry = cache.lookup(query_embedding)
+        count("cache", cache="semantic", result="hit" if entry is not None else "miss")
+        if entry is not None:
+            return prepare_cached_query(query, entry)
+
+    label = classify_query(query)
     if label == "book":
-        book_answer = search_book(query)
-        return generate_final_response(query, book_answer=book_answer)
+        context = RetrievalContext(query, n_results=RETRIEVAL_RESULTS, query_embedding=query_embedding, book=book)
+        return PreparedQuery(label, book_answer=search_book(query, n_results=BOOK_PASSAGES, context=context),
+                             query_embedding=query_embedding)
     elif label == "weather":
         location = extract_location(query)
-        weather_answer = get_weather_by_city(location)
-        return generate_final_response(query, weather_answer=weather_answer)
+        return PreparedQuery(label, weather_answer=get_weather_by_city(location), query_embedding=query_embedding)
     elif label == "both":
         
-        cities = extract_cities_from_book(query)
-        book_answer = search_book(query)
-        weather_answers = []
-        for city in cities:
-            weather = get_weather_by_city(city)
-            weather_answers.append(f"Weather in {city}:\n{weather}")
-        weather_answer = "\n\n".join(weather_answers) if weather_answers else "No specific cities found for weather lookup."
-        return generate_final_response(query, book_answer=book_answer, weather_answer=weather_answer)
-    else:
-        return "Sorry, I can only answer questions about Mark Twain's travels or the weather."
+        context = RetrievalContext(query, n_results=RETRIEVAL_RESULTS, query_embedding=query_embedding, book=book)
+        cities = extract_cities_from_book(query, context=context)
+        return PreparedQuery(
+            label,
+            book_answer=search_book(query, n_results=BOOK_PASSAGES, context=context),
+            weather_answer=get_weather_for_book_cities(cities),
+            cities=cities,
+            query_embedding=query_embedding
+        )
+    return PreparedQuery(label, answer=OUT_OF_SCOPE_ANSWER, query_embedding=query_embedding)
+
+def prepare_cached_query(query: str, entry: CachedAnswer) -> PreparedQuery:
+    """
+    PreparedQuery for a semantic cache hit: book answers come back as-is, and
+    weather-dependent answers get fresh weather (for the cached cities of a
+    "both" answer) to be generated again.
+    """
+    if entry.label == "book":
+        return PreparedQuery("book", answer=entry.answer, from_cache=True)
+    if entry.label == "weather":
+        weather_answer = get_weather_by_city(extract_location(query))
+        return PreparedQuery("weather", weather_answer=weather_answer, from_cache=True)
+    if entry.label == "both":
+        return PreparedQuery("both", book_answer=entry.book_answer, cities=entry.cities,
+                             weather_answer=get_weather_for_book_cities(entry.cities), from_cache=True)
+    return PreparedQuery(entry.label, answer=OUT_OF_SCOPE_ANSWER, from_cache=True)
 
+def degraded_answer(book_answer: str = "", weather_answer: str = "") -> Optional[str]:
+    """
+    What to answer when the final generation is unavailable: the gathered book
+    passages and weather as they are, or None if there is nothing to show.
+    """
+    sections = [section for section in (book_answer, weather_answer)
+                if section and section != WEATHER_UNAVAILABLE]
+    if not sections:
+        return None
+    count("degraded", stage="generate")
+    return "I can't write a full answer right now, but here is what I found:\n\n" + "\n\n".join(sections)
+
+def _remember_answer(query: str, prepared: PreparedQuery, answer: str) -> None:
+    cache = get_semantic_cache()
+    if cache is not None and not prepared.from_cache and prepared.query_embedding is not None:
+        cache.store(prepared.query_embedding, CachedAnswer(
+            query, prepared.label, answer, book_answer=prepared.book_answer, cities=prepared.cities
+        ))
+
+def warm_up(embeddings: bool = False) -> dict:
+    """
+    Do the one-off startup work now instead of on the first query: import and
+    build the Bedrock and weather clients, open the ChromaDB collection and load
+    its vector index, and load the BM25, location and vector snapshot indexes
+    (of the EMBEDDING_BACKEND's collection), plus the local embedding model when
+    that backend is "local". With `embeddings`, also embed the classifier's seed examples (Bedrock calls,
+    unless they are in the embedding cache).
+
+    Meant for long-running servers; short-lived processes are better off paying
+    only for what their queries use. Steps that fail are reported and skipped.
+    Returns the seconds spent per step.
+    """
+    collection_name = collection_for_backend(COLLECTION_NAME)
+    steps = [
+        ("bedrock_client", get_bedrock_client),
+        ("weather_client", get_weather_api),
+        ("chroma", lambda: get_chroma_store(CHROMA_DIR).warm_up([collection_name])),
+        ("indexes", lambda: [load(CHROMA_DIR, collection_name)
+                             for load in (get_lexical_index, get_location_index, get_vector_snapshot)]),
+    ]
+    if embedding_backend_name() != "bedrock":
+        steps.append(("embedding_model", lambda: get_embedding_backend().warm_up()))
+    if embeddings:
+        steps.append(("classifier", warm_up_classifier))
+    timings = {}
+    with span("warm_up"):
+        for name, step in steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                print(f"Warning: warm-up step '{name}' failed: {e}")
+            timings[name] = time.perf_counter() - start
+    return timings
+
+def process_query(query: str, book=None) -> str:
+    with span("process_query") as query_span:
+        prepared = prepare_query(query, book=book)
+        query_span.set_label("label", prepared.label).set(from_cache=prepared.from_cache)
+        answer = prepared.answer
+        if answer is None:
+            try:
+                answer = generate_final_response(query, book_answer=prepared.book_answer,
+                                                 weather_answer=prepared.weather_answer)
+            except Exception as e:
+                if not is_unavailable_error(e):
+                    raise
+                answer = degraded_answer(prepared.book_answer, prepared.weather_answer)
+                if answer is None:
+                    raise
+                return answer
+        _remember_answer(query, prepared, answer)
+    return answer
+
+def process_query_stream(query: str, timings: StreamTimings = None, book=None) -> Iterator[str]:
+    """
+    Streaming entry point: same routing as process_query, but yields the final
+    answer in fragments as the model generates it, so callers can forward
+    partial output immediately. Answers that need no generation are yielded whole.
+    """
+    with span("prepare_query") as prepare_span:
+        prepared = prepare_query(query, book=book)
+        prepare_span.set_label("label", prepared.label).set(from_cache=prepared.from_cache)
+    if prepared.answer is not None:
+        yield prepared.answer
+        _remember_answer(query, prepared, prepared.answer)
+        return
+    parts = []
+    try:
+        for text in generate_final_response_stream(query, book_answer=prepared.book_answer,
+                                                   weather_answer=prepared.weather_answer, timings=timings):
+            parts.append(text)
+            yield text
+    except Exception as e:
+        if parts or not is_unavailable_error(e):
+            raise
+        fallback = degraded_answer(prepared.book_answer, prepared.weather_answer)
+        if fallback is None:
+            raise
+        yield fallback
+        return
+    _remember_answer(query, prepared, "".join(parts).strip())
@@ -0,0 +1,102 @@
+"""
+Throughput of the sync process_query (one query at a time) versus
+process_query_async with N queries in flight, against local stubs for
+Bedrock (fixed latency), ChromaDB (temporary collection) and OpenWeatherMap.
+
+Run from the project root:
+    python -m benchmarks.bench_async --queries 32 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import FakeBedrockClient, StubWeatherServer, build_stub_collection
+
+QUERIES = [
+    "What did Mark Twain think about the Sphinx?",
+    "I want to visit the places Twain went to in Italy - what's the weather like there now?",
+    "What's the current weather in Paris?",
+    "How did Twain describe the pilgrims on the Quaker City?",
+]
+
+
+def classify_stub(prompt: str) -> str:
+    if "Return only the label" not in prompt:
+        return "A stub answer."
+    query = prompt.rsplit('"', 2)[-2].lower()
+    if "weather" in query:
+        return "both" if "twain" in query else "weather"
+    return "book"
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def _run_async(queries, concurrency):
+    from app.async_workflow import process_query_async
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query):
+        async with semaphore:
+            start = time.perf_counter()
+            await process_query_async(query)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--converse-latency", type=float, default=0.3)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--weather-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    chroma_dir = tempfile.mkdtemp(prefix="bench_async_")
+    os.environ["CHROMA_DIR"] = chroma_dir
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    os.environ.setdefault("Weather_api", "stub")
+    build_stub_collection(chroma_dir, limit=500)
+
+    from app.bedrock_client import set_bedrock_client
+    from app.workflow import process_query
+
+    set_bedrock_client(FakeBedrockClient(args.converse_latency, args.embed_latency, classify_stub))
+    queries = [QUERIES[i % len(QUERIES)] + f" ({i})" for i in range(args.queries)]
+
+    with StubWeatherServer(latency=args.weather_latency) as weather:
+        os.environ["OPENWEATHER_BASE_URL"] = weather.url
+        print(f"{args.queries} queries; converse {args.converse_latency * 1000:.0f} ms, "
+              f"embed {args.embed_latency * 1000:.0f} ms, weather {args.weather_latency * 1000:.0f} ms")
+
+        latencies = []
+        start = time.perf_counter()
+        for query in queries:
+            t = time.perf_counter()
+            process_query(query)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        print(f"{'sync, sequential':<22} {args.queries / elapsed:7.2f} q/s   "
+              f"p50 {statistics.median(latencies) * 1000:7.0f} ms   p95 {_percentile(latencies, 0.95) * 1000:7.0f} ms")
+
+        for concurrency in args.concurrency:
+            elapsed, latencies = asyncio.run(_run_async(queries, concurrency))
+            print(f"{f'async, {concurrency} in flight':<22} {args.queries / elapsed:7.2f} q/s   "
+                  f"p50 {statistics.median(latencies) * 1000:7.0f} ms   p95 {_percentile(latencies, 0.95) * 1000:7.0f} ms")
+
+    set_bedrock_client(None)
+
+
+if __name__ == "__main__":
+    main()
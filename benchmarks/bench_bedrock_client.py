@@ -0,0 +1,64 @@
+"""
+Per-call overhead of a fresh boto3 Session/client per call versus the shared
+pooled client, measured against a local stub Bedrock endpoint.
+
+Run from the project root:
+    python -m benchmarks.bench_bedrock_client --calls 200
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from benchmarks.stubs import StubBedrockServer
+
+
+def _time_calls(get_client, calls: int) -> list:
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        client = get_client()
+        response = client.invoke_model(
+            modelId="amazon.titan-embed-text-v1",
+            body=json.dumps({"inputText": f"query {i}"}),
+            contentType="application/json"
+        )
+        json.loads(response["body"].read())
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(name: str, timings: list) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<22} mean {statistics.mean(timings):8.2f} ms   "
+          f"p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with StubBedrockServer() as server:
+        os.environ["BEDROCK_ENDPOINT_URL"] = server.url
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "stub")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "stub")
+
+        from app.bedrock_client import get_bedrock_client, new_bedrock_client, reset_bedrock_client
+
+        reset_bedrock_client()
+        get_bedrock_client()  # warm the shared client once, as a server process would
+
+        before = _time_calls(new_bedrock_client, args.calls)
+        after = _time_calls(get_bedrock_client, args.calls)
+
+    print(f"{args.calls} invoke_model calls against {server.url}")
+    _report("new client per call", before)
+    _report("shared pooled client", after)
+    print(f"speedup (mean): {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
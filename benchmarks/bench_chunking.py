@@ -0,0 +1,103 @@
+"""
+Chunking throughput in MB/s: reading the whole book into memory and running
+clean_gutenberg_text + chunk_text_by_paragraph, versus streaming it line by
+line through iter_book_chunks. The corpus is data/ebook.txt with its body
+repeated --copies times, to show behaviour on inputs much larger than one book.
+With --books N it also times chunk_books over a directory of N copies of the
+book, in one process versus a process pool of --workers processes.
+
+Run from the project root:
+    python -m benchmarks.bench_chunking --copies 20 --books 8
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stubs import EBOOK_PATH
+
+
+def _build_corpus(path: str, copies: int) -> None:
+    with open(EBOOK_PATH, encoding="utf-8") as f:
+        raw = f.read()
+    start = raw.index("\n", raw.index("*** START OF")) + 1
+    end = raw.index("*** END OF")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(raw[:start])
+        for _ in range(copies):
+            f.write(raw[start:end])
+        f.write(raw[end:])
+
+
+def _whole_text(path: str) -> int:
+    from app.book_preprocess import chunk_text_by_paragraph, clean_gutenberg_text
+
+    with open(path, encoding="utf-8") as f:
+        return len(chunk_text_by_paragraph(clean_gutenberg_text(f.read())))
+
+
+def _streaming(path: str) -> int:
+    from app.book_preprocess import iter_book_chunks
+
+    return sum(1 for _ in iter_book_chunks(path))
+
+
+def _measure(fn, path: str, repeat: int, size_mb: float):
+    best, chunks = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = fn(path)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(path)
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return chunks, size_mb / best, peak
+
+
+def _bench_corpus(tmp: str, books: int, workers: int) -> None:
+    from app.book_preprocess import chunk_books, find_books
+
+    corpus_dir = os.path.join(tmp, "books")
+    os.makedirs(corpus_dir)
+    for i in range(books):
+        _build_corpus(os.path.join(corpus_dir, f"book_{i:03d}.txt"), 1)
+    paths = find_books(corpus_dir)
+    size_mb = sum(os.path.getsize(path) for path in paths) / 1e6
+
+    print(f"\ncorpus directory: {books} books, {size_mb:.1f} MB")
+    for n in (1, workers):
+        start = time.perf_counter()
+        chunks = sum(len(book_chunks) for _, book_chunks in chunk_books(paths, workers=n))
+        elapsed = time.perf_counter() - start
+        print(f"chunk_books workers={n:<3d} {chunks:7d} chunks   {elapsed:6.2f} s   {size_mb / elapsed:6.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=20, help="times the book body is repeated")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--books", type=int, default=0, help="also benchmark a directory of this many books")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.txt")
+        _build_corpus(path, args.copies)
+        size_mb = os.path.getsize(path) / 1e6
+        print(f"corpus: {size_mb:.1f} MB ({args.copies} copies of the book body)")
+
+        results = {}
+        for name, fn in (("whole text", _whole_text), ("streaming", _streaming)):
+            chunks, mb_s, peak = _measure(fn, path, args.repeat, size_mb)
+            results[name] = mb_s
+            print(f"{name:<12} {chunks:7d} chunks   {mb_s:6.1f} MB/s   peak memory {peak:8.1f} MB")
+        print(f"speedup: {results['streaming'] / results['whole text']:.2f}x")
+
+        if args.books:
+            _bench_corpus(tmp, args.books, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Accuracy and latency of each query-classifier tier on data/classifier_eval.jsonl.
+
+Offline (default) the embedding and LLM tiers run against in-process stubs, so
+only the rules tier's accuracy is meaningful; their latencies reflect the stub
+settings. With --live the real Bedrock models are used for all tiers.
+
+Run from the project root:
+    python -m benchmarks.bench_classifier
+    python -m benchmarks.bench_classifier --live
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from benchmarks.stubs import PROJECT_ROOT, FakeBedrockClient
+
+EVAL_PATH = os.path.join(PROJECT_ROOT, "data", "classifier_eval.jsonl")
+
+
+def load_eval_set(path: str = EVAL_PATH) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _summarize(name: str, rows: list) -> None:
+    if not rows:
+        print(f"{name:<16} {0:4d} queries")
+        return
+    correct = sum(1 for r in rows if r["predicted"] == r["label"])
+    latencies = [r["latency"] * 1000 for r in rows]
+    print(f"{name:<16} {len(rows):4d} queries   accuracy {correct / len(rows):6.1%}   "
+          f"mean {statistics.mean(latencies):9.3f} ms   max {max(latencies):9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="use the real Bedrock models")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--converse-latency", type=float, default=0.4)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if not args.live:
+        os.environ["EMBEDDING_CACHE_PATH"] = ""
+        from app.bedrock_client import set_bedrock_client
+        set_bedrock_client(FakeBedrockClient(args.converse_latency, args.embed_latency,
+                                             converse_handler=lambda prompt: "out-of-scope"))
+
+    from app.query_classifier import classify_query_llm, classify_query_tiered
+
+    eval_set = load_eval_set()
+    by_tier = defaultdict(list)
+    llm_only = []
+    for row in eval_set:
+        start = time.perf_counter()
+        predicted, tier, _ = classify_query_tiered(row["query"], threshold=args.threshold)
+        by_tier[tier].append({**row, "predicted": predicted, "latency": time.perf_counter() - start})
+
+        start = time.perf_counter()
+        predicted = classify_query_llm(row["query"])
+        llm_only.append({**row, "predicted": predicted, "latency": time.perf_counter() - start})
+
+    print(f"{len(eval_set)} labeled queries, threshold {args.threshold}, {'live' if args.live else 'stubbed'} Bedrock")
+    print("tiered classifier:")
+    for tier in ("rules", "embedding", "llm"):
+        _summarize(f"  {tier}", by_tier[tier])
+    _summarize("  overall", [r for rows in by_tier.values() for r in rows])
+    print("LLM only:")
+    _summarize("  llm", llm_only)
+    skipped = len(eval_set) - len(by_tier["llm"])
+    print(f"LLM calls avoided: {skipped}/{len(eval_set)} ({skipped / len(eval_set):.0%})")
+
+
+if __name__ == "__main__":
+    main()
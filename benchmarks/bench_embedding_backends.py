@@ -0,0 +1,114 @@
+"""
+Bedrock versus local CPU embeddings: model load time, single-query embedding
+latency, bulk embedding throughput, and recall@k of vector retrieval on
+exact-name queries (see bench_retrieval) over book chunks.
+
+Each backend embeds the same --collection-chunks book chunks into its own
+collection (embedding_backend.collection_for_backend), then answers the same
+queries from it. Bedrock is a FakeBedrockClient that sleeps --embed-latency
+per call and returns random vectors, so its recall is a floor; pass
+--real-bedrock to call Titan with your AWS credentials instead. The local
+backend runs the real all-MiniLM-L6-v2 model (downloaded on first use, or
+LOCAL_EMBEDDING_MODEL_DIR) and is skipped if the model cannot be loaded.
+
+Run from the project root:
+    python -m benchmarks.bench_embedding_backends --queries 200 --collection-chunks 2000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_retrieval import _name_queries
+from benchmarks.stubs import FakeBedrockClient, book_chunks
+
+
+def _percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+
+def _run_backend(backend, chroma_dir: str, chunks: list, ids: list, queries: list, k: int, workers: int) -> dict:
+    import chromadb
+
+    from app.embedding_backend import collection_for_backend
+    from app.query_book import RetrievalContext
+
+    start = time.perf_counter()
+    backend.warm_up()
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix = backend.embed_many(chunks, max_workers=workers, use_cache=False)
+    embed_seconds = time.perf_counter() - start
+
+    collection = chromadb.PersistentClient(path=chroma_dir).get_or_create_collection(
+        collection_for_backend("bench", backend))
+    for offset in range(0, len(chunks), 1000):
+        collection.upsert(ids=ids[offset:offset + 1000], documents=chunks[offset:offset + 1000],
+                          embeddings=matrix[offset:offset + 1000])
+
+    latencies, recalls = [], []
+    for query, relevant in queries:
+        start = time.perf_counter()
+        embedding = backend.embed(query, use_cache=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        context = RetrievalContext(query, chroma_dir=chroma_dir, collection_name="bench", n_results=k,
+                                   query_embedding=embedding, mode="vector", backend="chroma",
+                                   embedding_backend=backend.name)
+        recalls.append(len(relevant.intersection(context.ids)) / min(k, len(relevant)))
+    return {
+        "model": backend.model_id,
+        "dim": matrix.shape[1],
+        "load_s": load_seconds,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": _percentile(latencies, 0.95),
+        "texts_per_s": len(chunks) / embed_seconds,
+        "recall": statistics.mean(recalls)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--collection-chunks", type=int, default=2000)
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="simulated Bedrock latency in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent Bedrock calls for bulk embedding")
+    parser.add_argument("--real-bedrock", action="store_true", help="call Titan instead of the fake client")
+    parser.add_argument("--seed", type=int, default=16)
+    args = parser.parse_args()
+
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    from app.bedrock_client import set_bedrock_client
+    from app.book_preprocess import chunk_content_id
+    from app.embedding_backend import EMBEDDING_BACKENDS, get_embedding_backend
+
+    if not args.real_bedrock:
+        set_bedrock_client(FakeBedrockClient(embed_latency=args.embed_latency))
+    chunks = list(dict.fromkeys(book_chunks(args.collection_chunks)))
+    ids = [chunk_content_id(chunk) for chunk in chunks]
+    queries = _name_queries(ids, chunks, args.queries, args.seed)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as chroma_dir:
+        for name in EMBEDDING_BACKENDS:
+            try:
+                results[name] = _run_backend(get_embedding_backend(name), chroma_dir, chunks, ids, queries,
+                                             args.k, args.workers)
+            except Exception as e:
+                print(f"Skipping the {name} backend: {e}")
+    set_bedrock_client(None)
+
+    bedrock = "Titan" if args.real_bedrock else f"fake Bedrock, {args.embed_latency * 1000:.0f} ms per call"
+    print(f"\n{len(chunks)} chunks, {len(queries)} exact-name queries, recall@{args.k} ({bedrock})\n")
+    print(f"{'backend':<8} {'model':<27} {'dim':>5} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'texts/s':>9} {'recall':>7}")
+    for name, stats in results.items():
+        print(f"{name:<8} {stats['model']:<27} {stats['dim']:5d} {stats['load_s']:7.2f} {stats['p50_ms']:8.1f} "
+              f"{stats['p95_ms']:8.1f} {stats['texts_per_s']:9.1f} {stats['recall']:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+One get_bedrock_embedding call per text versus the get_bedrock_embeddings
+batch API (dedup, bounded concurrency, per-item throttling retries, float32
+matrix), against a fake Bedrock client with optional throttling.
+
+Run from the project root:
+    python -m benchmarks.bench_embeddings --texts 400 --duplicates 0.25 --throttle-rate 0.05
+"""
+import argparse
+import os
+import random
+import time
+
+from benchmarks.stubs import FakeBedrockClient, book_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=400)
+    parser.add_argument("--duplicates", type=float, default=0.25, help="fraction of inputs repeating another input")
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--throttle-rate", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    from app.bedrock_client import set_bedrock_client
+    from app.bedrock_embed import get_bedrock_embedding, get_bedrock_embeddings
+
+    chunks = book_chunks(args.texts)
+    rng = random.Random(0)
+    texts = [rng.choice(chunks[:i]) if i and rng.random() < args.duplicates else chunk
+             for i, chunk in enumerate(chunks)]
+
+    client = FakeBedrockClient(embed_latency=args.embed_latency)
+    set_bedrock_client(client)
+    start = time.perf_counter()
+    single = [get_bedrock_embedding(text) for text in texts]
+    single_time = time.perf_counter() - start
+    single_calls = client.calls["invoke_model"]
+
+    client = FakeBedrockClient(embed_latency=args.embed_latency, throttle_rate=args.throttle_rate)
+    set_bedrock_client(client)
+    start = time.perf_counter()
+    matrix = get_bedrock_embeddings(texts, max_workers=args.workers, base_delay=0.01)
+    batch_time = time.perf_counter() - start
+    set_bedrock_client(None)
+
+    assert matrix.shape == (len(texts), len(single[0])) and matrix.dtype.name == "float32"
+    assert all(abs(matrix[i][0] - single[i][0]) < 1e-6 for i in range(len(texts)))
+    print(f"{len(texts)} texts ({len(set(texts))} unique), invoke_model {args.embed_latency * 1000:.0f} ms")
+    print(f"one call per text     {single_time:7.2f} s   {single_calls} invoke_model calls")
+    print(f"batch API             {batch_time:7.2f} s   {client.calls['invoke_model']} invoke_model calls "
+          f"({client.throttled} throttled and retried)")
+    print(f"speedup: {single_time / batch_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Ingestion wall-clock time: the old one-chunk-at-a-time loop versus the staged
+concurrent pipeline, against an in-process stub of the Bedrock API.
+
+Run from the project root:
+    python -m benchmarks.bench_ingest --chunks 300 --converse-latency 0.05 --embed-latency 0.02
+"""
+import argparse
+import os
+
+from benchmarks.stubs import FakeBedrockClient, FakeCollection
+
+
+def _run(chunks, client, **pipeline_args):
+    from app.book_preprocess import chunk_content_id
+    from app.ingest_pipeline import IngestPipeline
+    from app.store_to_chroma import _embed, _extract_metadata
+
+    collection = FakeCollection()
+
+    def write(batch):
+        collection.add(
+            ids=[item["id"] for item in batch],
+            documents=[item["text"] for item in batch],
+            embeddings=[item["embedding"] for item in batch],
+            metadatas=[item["metadata"] for item in batch]
+        )
+
+    client.calls = {"converse": 0, "converse_stream": 0, "invoke_model": 0}
+    pipeline = IngestPipeline(_extract_metadata, _embed, write, **pipeline_args)
+    summary = pipeline.run(
+        {"index": i, "id": chunk_content_id(chunk), "text": chunk} for i, chunk in enumerate(chunks)
+    )
+    summary["add_calls"] = collection.add_calls
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--converse-latency", type=float, default=0.05)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--metadata-workers", type=int, default=16)
+    parser.add_argument("--embedding-workers", type=int, default=8)
+    args = parser.parse_args()
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+
+    from app.bedrock_client import set_bedrock_client
+    from app.book_preprocess import chunk_text_by_paragraph, clean_gutenberg_text
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(project_root, "data", "ebook.txt"), encoding="utf-8") as f:
+        chunks = chunk_text_by_paragraph(clean_gutenberg_text(f.read()))[:args.chunks]
+
+    client = FakeBedrockClient(args.converse_latency, args.embed_latency)
+    set_bedrock_client(client)
+    try:
+        serial = _run(chunks, client, metadata_workers=1, embedding_workers=1, queue_size=1, write_batch_size=10)
+        staged = _run(chunks, client, metadata_workers=args.metadata_workers,
+                      embedding_workers=args.embedding_workers, write_batch_size=256)
+    finally:
+        set_bedrock_client(None)
+
+    print(f"{len(chunks)} chunks, converse {args.converse_latency * 1000:.0f} ms, "
+          f"invoke_model {args.embed_latency * 1000:.0f} ms")
+    for name, result in (("serial", serial), ("staged pipeline", staged)):
+        print(f"{name:<16} {result['elapsed']:7.2f} s   {result['written']} written   "
+              f"{result['add_calls']} collection.add calls   {len(result['errors'])} errors")
+    print(f"speedup: {serial['elapsed'] / staged['elapsed']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+City extraction for "both" queries: the old per-query parsing of the
+comma-joined `locations` metadata (with its {"italy", "europe"} filter) versus
+lookups in the location index built at ingestion. Reports time per query and
+how many regions each approach would send to the weather API.
+
+Run from the project root:
+    python -m benchmarks.bench_locations --queries 2000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import build_stub_collection
+
+LOCATIONS = (
+    "Rome", "Italy", "the Mediterranean", "Naples", "Egypt", "Holy Land", "Sea of Galilee", "Jerusalem",
+    "Europe", "Constantinople", "Turkey", "Mount Vesuvius", "Florence", "Palestine", "Venice", "Greece",
+)
+
+
+def _old_extract(metadatas: list) -> list:
+    cities = set()
+    for meta in metadatas[:5]:
+        locs = meta.get("locations", "")
+        for loc in locs.split(","):
+            city = loc.strip()
+            if city and city.lower() not in {"italy", "europe"}:
+                cities.add(city)
+    return list(cities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args()
+
+    from app.chroma_utils import read_collection
+    from app.location_index import LocationIndex, place_kind
+
+    with tempfile.TemporaryDirectory() as chroma_dir:
+        collection = build_stub_collection(chroma_dir, "bench", locations=LOCATIONS)
+        rows = read_collection(collection, include=("metadatas",))
+
+    start = time.perf_counter()
+    index = LocationIndex.build(rows["ids"], rows["metadatas"])
+    build_ms = (time.perf_counter() - start) * 1000
+    metadata_by_id = dict(zip(rows["ids"], rows["metadatas"]))
+
+    rng = random.Random(args.seed)
+    retrieved = [rng.sample(rows["ids"], 5) for _ in range(args.queries)]
+
+    results = {}
+    for name, extract in (
+        ("parse metadata", lambda ids: _old_extract([metadata_by_id[i] for i in ids])),
+        ("location index", index.cities_for_chunks),
+    ):
+        timings, regions = [], 0
+        for ids in retrieved:
+            start = time.perf_counter()
+            cities = extract(ids)
+            timings.append((time.perf_counter() - start) * 1e6)
+            regions += sum(place_kind(city) == "region" for city in cities)
+        results[name] = statistics.mean(timings)
+        print(f"{name:<15} {statistics.mean(timings):7.2f} us/query   "
+              f"{regions / args.queries:4.2f} regions sent to weather per query")
+
+    print(f"index build: {len(index.places)} places over {len(rows['ids'])} chunks in {build_ms:.1f} ms")
+    print(f"speedup: {results['parse metadata'] / results['location index']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Metadata extraction: one Nova Pro prompt per chunk versus batched prompts
+(get_nova_pro_metadata_batch), against a stub model that sometimes drops or
+mangles entries of a batched answer so the per-chunk retry path is exercised.
+
+Run from the project root:
+    python -m benchmarks.bench_metadata --chunks 200 --batch-size 8 --defect-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from benchmarks.stubs import FakeBedrockClient, book_chunks
+
+
+class DefectiveMetadataModel:
+    """
+    Converse handler plus latency model: each call costs `base_latency` plus
+    `per_chunk_latency` per chunk in the prompt. In batched answers each entry is
+    dropped or corrupted with probability `defect_rate`, and the array is
+    sometimes wrapped in prose.
+    """
+
+    def __init__(self, base_latency: float, per_chunk_latency: float, defect_rate: float, seed: int = 0):
+        self.base_latency = base_latency
+        self.per_chunk_latency = per_chunk_latency
+        self.defect_rate = defect_rate
+        self.rng = random.Random(seed)
+
+    def __call__(self, prompt: str) -> str:
+        indices = [int(i) for i in re.findall(r"^Text \[(\d+)\]:", prompt, re.MULTILINE)]
+        time.sleep(self.base_latency + self.per_chunk_latency * max(1, len(indices)))
+        if not indices:
+            return json.dumps({"summary": "A passage.", "locations": ["Rome"], "people": ["Twain"]})
+        entries = []
+        for i in indices:
+            roll = self.rng.random()
+            if roll < self.defect_rate / 2:
+                continue
+            if roll < self.defect_rate:
+                entries.append({"index": i, "summary": None, "locations": "Rome"})
+            else:
+                entries.append({"index": i, "summary": "A passage.", "locations": ["Rome"], "people": ["Twain"]})
+        text = json.dumps(entries)
+        return f"Here is the metadata:\n{text}" if self.rng.random() < 0.2 else text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--defect-rate", type=float, default=0.05)
+    parser.add_argument("--base-latency", type=float, default=0.03)
+    parser.add_argument("--per-chunk-latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    from app.bedrock_client import set_bedrock_client
+    from app.bedrock_converse import (
+        get_metadata_stats,
+        get_nova_pro_metadata,
+        get_nova_pro_metadata_batch,
+        reset_metadata_stats
+    )
+
+    chunks = book_chunks(args.chunks)
+    model = DefectiveMetadataModel(args.base_latency, args.per_chunk_latency, args.defect_rate)
+    set_bedrock_client(FakeBedrockClient(converse_handler=model))
+
+    reset_metadata_stats()
+    start = time.perf_counter()
+    single = [get_nova_pro_metadata(chunk) for chunk in chunks]
+    single_time = time.perf_counter() - start
+    single_stats = get_metadata_stats()
+
+    reset_metadata_stats()
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(chunks), args.batch_size):
+        batched.extend(get_nova_pro_metadata_batch(chunks[i:i + args.batch_size]))
+    batched_time = time.perf_counter() - start
+    batched_stats = get_metadata_stats()
+    set_bedrock_client(None)
+
+    assert len(batched) == len(single) == len(chunks)
+    assert all(isinstance(meta, dict) and isinstance(meta.get("summary"), str) for meta in batched)
+    print(f"{len(chunks)} chunks, batch size {args.batch_size}, defect rate {args.defect_rate:.0%}")
+    print(f"one prompt per chunk  {single_time:6.2f} s   {single_stats['llm_calls']:4d} LLM calls")
+    print(f"batched prompts       {batched_time:6.2f} s   {batched_stats['llm_calls']:4d} LLM calls   "
+          f"{batched_stats['retried']} chunks retried individually   {batched_stats['malformed']} malformed")
+    print(f"LLM calls reduced {single_stats['llm_calls'] / batched_stats['llm_calls']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Input tokens and model latency per Bedrock call, before and after
+token-budgeted prompt assembly. Every query in data/classifier_eval.jsonl goes
+through process_query with the LLM classifier forced on, against a
+TokenCountingBedrockClient that estimates each request's tokens, simulates
+prompt caching and charges latency per uncached input token.
+
+"before" turns the prompt builder off: 300-character previews plus summaries
+of the top chunks, multi-line weather blocks for every city, no token budgets
+and no cache point. "after" uses the defaults: book passages packed into
+PROMPT_BOOK_TOKENS, compact weather lines within PROMPT_WEATHER_TOKENS, and
+the static system prompts marked for caching.
+
+Run from the project root:
+    python -m benchmarks.bench_prompts --token-latency 0.0002
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+from collections import defaultdict
+
+from benchmarks.stubs import (
+    PROJECT_ROOT,
+    StubWeatherServer,
+    TokenCountingBedrockClient,
+    build_stub_collection,
+    label_converse_handler
+)
+
+EVAL_PATH = os.path.join(PROJECT_ROOT, "data", "classifier_eval.jsonl")
+MODES = {
+    "before": {"PROMPT_BOOK_TOKENS": "0", "PROMPT_WEATHER_TOKENS": "0", "PROMPT_QUERY_TOKENS": "0",
+               "PROMPT_COMPACT_WEATHER": "0", "PROMPT_CACHING": "0"},
+    "after": {},
+}
+PROMPT_SETTINGS = ("PROMPT_BOOK_TOKENS", "PROMPT_WEATHER_TOKENS", "PROMPT_QUERY_TOKENS",
+                   "PROMPT_COMPACT_WEATHER", "PROMPT_CACHING")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token-latency", type=float, default=0.0002, help="seconds per uncached input token")
+    parser.add_argument("--cached-token-latency", type=float, default=0.00002)
+    parser.add_argument("--converse-latency", type=float, default=0.05, help="fixed seconds per call")
+    parser.add_argument("--collection-chunks", type=int, default=500)
+    args = parser.parse_args()
+
+    chroma_dir = tempfile.mkdtemp(prefix="bench_prompts_")
+    os.environ["CHROMA_DIR"] = chroma_dir
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "0"
+    os.environ["QUERY_CLASSIFIER_LOCAL"] = "0"
+    os.environ.setdefault("Weather_api", "stub")
+    build_stub_collection(chroma_dir, limit=args.collection_chunks)
+
+    from app.bedrock_client import set_bedrock_client
+    from app.workflow import process_query
+
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        eval_set = [json.loads(line) for line in f if line.strip()]
+    handler = label_converse_handler({row["query"]: row["label"] for row in eval_set})
+
+    results = {}
+    with StubWeatherServer() as weather:
+        os.environ["OPENWEATHER_BASE_URL"] = weather.url
+        for mode, settings in MODES.items():
+            for name in PROMPT_SETTINGS:
+                os.environ.pop(name, None)
+            os.environ.update(settings)
+            client = TokenCountingBedrockClient(args.token_latency, args.cached_token_latency,
+                                                converse_latency=args.converse_latency, converse_handler=handler)
+            set_bedrock_client(client)
+            for row in eval_set:
+                process_query(row["query"])
+            results[mode] = client.records
+    set_bedrock_client(None)
+
+    print(f"{len(eval_set)} queries, {args.token_latency * 1000:g} ms per uncached input token\n")
+    print(f"{'mode':<7} {'call':<9} {'calls':>6} {'input tokens':>13} {'cache reads':>12} {'uncached':>9} "
+          f"{'mean ms':>8} {'p95 ms':>7}")
+    for mode, records in results.items():
+        by_kind = defaultdict(list)
+        for record in records:
+            by_kind[record["kind"]].append(record)
+        by_kind["all"] = records
+        for kind, rows in by_kind.items():
+            seconds = sorted(row["seconds"] for row in rows)
+            print(f"{mode:<7} {kind:<9} {len(rows):6d} "
+                  f"{statistics.mean(row['input_tokens'] for row in rows):13.0f} "
+                  f"{statistics.mean(row['cache_read_tokens'] for row in rows):12.0f} "
+                  f"{statistics.mean(row['input_tokens'] - row['cache_read_tokens'] for row in rows):9.0f} "
+                  f"{statistics.mean(seconds) * 1000:8.1f} {seconds[int(len(seconds) * 0.95) - 1] * 1000:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
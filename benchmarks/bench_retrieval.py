@@ -0,0 +1,94 @@
+"""
+Recall and latency of vector, hybrid and lexical-only retrieval on exact-name
+queries ("What did Twain write about <name>?"). The relevant chunks are the
+chunks that contain the name.
+
+Embeddings come from a fake Bedrock client that sleeps --embed-latency per call,
+and its vectors are random. The vector column is therefore a latency
+measurement and a recall floor, not an estimate of Titan quality. The lexical
+and hybrid columns use the real BM25 index over the book.
+
+Run from the project root:
+    python -m benchmarks.bench_retrieval --queries 200 --embed-latency 0.15
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.stubs import FakeBedrockClient, build_stub_collection
+
+
+def _name_queries(ids: list, documents: list, count: int, seed: int) -> list:
+    """
+    (query, relevant ids) pairs for capitalized names whose word (in any case)
+    occurs in 1-5 chunks; the relevant ids are those chunks.
+    """
+    chunks_by_word = defaultdict(set)
+    names = set()
+    for chunk_id, doc in zip(ids, documents):
+        for word in set(re.findall(r"\w+", doc.lower())):
+            chunks_by_word[word].add(chunk_id)
+        names.update(re.findall(r"(?<![.!?]\s)\b[A-Z][a-z]{3,}\b", doc))
+    names = sorted(name for name in names if 1 <= len(chunks_by_word[name.lower()]) <= 5)
+    rng = random.Random(seed)
+    return [(f"What did Twain write about {name}?", chunks_by_word[name.lower()])
+            for name in rng.sample(names, min(count, len(names)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.15, help="simulated embedding latency in seconds")
+    parser.add_argument("--seed", type=int, default=16)
+    args = parser.parse_args()
+
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    from app.bedrock_client import set_bedrock_client
+    from app.chroma_utils import read_collection
+    from app.lexical_index import BM25Index, index_path
+    from app.query_book import RetrievalContext
+
+    fake = FakeBedrockClient(embed_latency=args.embed_latency)
+    set_bedrock_client(fake)
+
+    with tempfile.TemporaryDirectory() as chroma_dir:
+        collection = build_stub_collection(chroma_dir, "bench")
+        start = time.perf_counter()
+        path = index_path(chroma_dir, "bench")
+        rows = read_collection(collection)
+        index = BM25Index.build(rows["ids"], rows["documents"], rows["metadatas"])
+        index.save(path)
+        build_time = time.perf_counter() - start
+        print(f"BM25 index: {len(index)} chunks, {len(index.terms)} terms, "
+              f"{os.path.getsize(path) / 1e6:.2f} MB, built in {build_time:.2f} s")
+
+        stored = collection.get(include=["documents"])
+        queries = _name_queries(stored["ids"], stored["documents"], args.queries, args.seed)
+        print(f"{len(queries)} exact-name queries, recall@{args.k}, "
+              f"embedding latency {args.embed_latency * 1000:.0f} ms\n")
+
+        for mode in ("vector", "hybrid", "lexical"):
+            RetrievalContext("warm up", chroma_dir=chroma_dir, collection_name="bench", mode=mode)
+            calls_before = fake.calls["invoke_model"]
+            recalls, latencies = [], []
+            for query, relevant in queries:
+                start = time.perf_counter()
+                context = RetrievalContext(query, chroma_dir=chroma_dir, collection_name="bench",
+                                           n_results=args.k, mode=mode)
+                latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(len(relevant.intersection(context.ids)) / min(args.k, len(relevant)))
+            latencies.sort()
+            calls = (fake.calls["invoke_model"] - calls_before) / len(queries)
+            print(f"{mode:<8} recall {statistics.mean(recalls):5.2f}   "
+                  f"p50 {statistics.median(latencies):7.1f} ms   p95 {latencies[int(len(latencies) * 0.95) - 1]:7.1f} ms   "
+                  f"{calls:.1f} Bedrock calls/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Load test of app.server.QueryServer against local stubs: --clients concurrent
+keep-alive connections each send --requests queries from
+data/classifier_eval.jsonl. The same load runs once per --batch-sizes value
+(1 = no batching). Reports throughput, latency percentiles, how many Chroma
+queries were made, and the batchers' mean batch size and queue depth.
+
+Bedrock is a FakeBedrockClient (--embed-latency, --converse-latency) that
+answers the classifier with each query's labeled route. Weather is a local
+HTTP stub.
+
+Run from the project root:
+    python -m benchmarks.bench_server --clients 32 --requests 10 --batch-sizes 1 8 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import (
+    PROJECT_ROOT,
+    FakeBedrockClient,
+    StubWeatherServer,
+    build_stub_collection,
+    label_converse_handler
+)
+
+EVAL_PATH = os.path.join(PROJECT_ROOT, "data", "classifier_eval.jsonl")
+
+
+async def _post_json(reader, writer, path: str, payload: dict) -> dict:
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    response = json.loads(await reader.readexactly(length))
+    if status != 200:
+        raise RuntimeError(f"HTTP {status}: {response}")
+    return response
+
+
+async def _load(port: int, queries: list, clients: int, requests: int) -> tuple:
+    latencies = []
+
+    async def client(offset: int):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for i in range(requests):
+                query = queries[(offset * requests + i) % len(queries)]
+                start = time.perf_counter()
+                await _post_json(reader, writer, "/query", {"query": query})
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(clients)))
+    return time.perf_counter() - start, latencies
+
+
+async def _run(batch_size: int, args, queries: list, bedrock: FakeBedrockClient) -> dict:
+    from app.chroma_utils import get_chroma_store
+    from app.server import QueryServer
+
+    server = QueryServer(port=0, max_batch_size=batch_size, max_wait=args.max_wait_ms / 1000)
+    await server.start()
+    store = get_chroma_store(args.chroma_dir)
+    chroma_queries, embed_calls = store.query_latency.count, bedrock.calls["invoke_model"]
+    try:
+        elapsed, latencies = await _load(server.port, queries, args.clients, args.requests)
+    finally:
+        await server.close()
+    latencies.sort()
+    stats = server.stats()["batchers"]
+    return {
+        "queries_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "chroma_queries": store.query_latency.count - chroma_queries,
+        "embed_calls": bedrock.calls["invoke_model"] - embed_calls,
+        "mean_embed_batch": stats["embed"]["mean_batch_size"],
+        "mean_search_batch": stats["search"]["mean_batch_size"],
+        "max_queue_depth": max(stats["embed"]["max_queue_depth"], stats["search"]["max_queue_depth"])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--converse-latency", type=float, default=0.05)
+    parser.add_argument("--collection-chunks", type=int, default=1000)
+    args = parser.parse_args()
+
+    args.chroma_dir = tempfile.mkdtemp(prefix="bench_server_")
+    os.environ["CHROMA_DIR"] = args.chroma_dir
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "0"
+    os.environ["QUERY_CLASSIFIER_EMBEDDINGS"] = "0"
+    os.environ.setdefault("Weather_api", "stub")
+    build_stub_collection(args.chroma_dir, limit=args.collection_chunks)
+
+    from app.bedrock_client import set_bedrock_client
+
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        eval_set = [json.loads(line) for line in f if line.strip()]
+    queries = [row["query"] for row in eval_set if row["label"] in {"book", "both"}]
+    bedrock = FakeBedrockClient(args.converse_latency, args.embed_latency,
+                                label_converse_handler({row["query"]: row["label"] for row in eval_set}))
+    set_bedrock_client(bedrock)
+    results = {}
+    with StubWeatherServer(latency=0.02) as weather:
+        os.environ["OPENWEATHER_BASE_URL"] = weather.url
+        asyncio.run(_run(1, args, queries[:2], bedrock))  # opens the collection and the HTTP pools
+        for batch_size in args.batch_sizes:
+            results[batch_size] = asyncio.run(_run(batch_size, args, queries, bedrock))
+    set_bedrock_client(None)
+
+    print(f"{args.clients} clients x {args.requests} book/both queries, {args.max_wait_ms:g} ms batching window\n")
+    print(f"{'batch':>5} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'chroma queries':>15} "
+          f"{'embed calls':>12} {'embed batch':>12} {'search batch':>13} {'max depth':>10}")
+    for batch_size, stats in results.items():
+        print(f"{batch_size:>5} {stats['queries_per_s']:10.1f} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+              f"{stats['chroma_queries']:15d} {stats['embed_calls']:12d} {stats['mean_embed_batch']:12.1f} "
+              f"{stats['mean_search_batch']:13.1f} {stats['max_queue_depth']:10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold start of the app: how long a fresh process takes to import app.workflow,
+which heavy dependencies that import pulls in, and the time from process start
+to the first answer of a book query. Also measures the optional warm_up() hook
+and how fast the first query is after it. Each number is the median over
+--runs fresh subprocesses; Bedrock is a FakeBedrockClient and weather a local
+HTTP stub, so only local startup work is measured.
+
+Run from the project root:
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stubs import PROJECT_ROOT, StubWeatherServer, build_stub_collection
+
+HEAVY_MODULES = ("chromadb", "boto3", "requests", "numpy", "dotenv")
+QUERY = "What did Mark Twain think about the Sphinx?"
+
+
+def _converse_stub(prompt: str) -> str:
+    return "book" if "Return only the label" in prompt else "A stub answer."
+
+
+def _child(warm_up: bool) -> None:
+    start = time.perf_counter()
+    import app.workflow as workflow
+
+    imported = time.perf_counter()
+    result = {"import_s": imported - start, "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules]}
+
+    from app.bedrock_client import set_bedrock_client
+    from benchmarks.stubs import FakeBedrockClient
+
+    set_bedrock_client(FakeBedrockClient(0.0, 0.0, _converse_stub))
+    if warm_up:
+        workflow.warm_up()
+        result["warm_up_s"] = time.perf_counter() - imported
+    query_start = time.perf_counter()
+    workflow.process_query(QUERY)
+    result["first_query_s"] = time.perf_counter() - query_start
+    result["first_answer_s"] = time.perf_counter() - start
+    print(json.dumps(result))
+
+
+def measure_startup(chroma_dir: str, weather_url: str, runs: int = 5) -> tuple:
+    """
+    Median startup timings (ms) over `runs` fresh processes against an existing
+    stub collection in `chroma_dir`, as flat "startup.*" metrics, and the names
+    of the HEAVY_MODULES that importing app.workflow loaded.
+    """
+    env = dict(os.environ, CHROMA_DIR=chroma_dir, OPENWEATHER_BASE_URL=weather_url, Weather_api="stub",
+               EMBEDDING_CACHE_DISABLED="1", SEMANTIC_CACHE_ENABLED="0", QUERY_CLASSIFIER_EMBEDDINGS="0",
+               TELEMETRY="", PYTHONPATH=PROJECT_ROOT)
+    samples = {False: [], True: []}
+    for _ in range(runs):
+        for warm_up in samples:
+            command = [sys.executable, "-m", "benchmarks.bench_startup", "--child"] + (["--warm-up"] if warm_up else [])
+            output = subprocess.run(command, cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True)
+            samples[warm_up].append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    def median_ms(rows, key):
+        return statistics.median(row[key] for row in rows) * 1000
+
+    heavy_modules = samples[False][0]["heavy_modules"]
+    return {
+        "startup.import_ms": median_ms(samples[False], "import_s"),
+        "startup.first_answer_ms": median_ms(samples[False], "first_answer_s"),
+        "startup.first_query_ms": median_ms(samples[False], "first_query_s"),
+        "startup.warm_up_ms": median_ms(samples[True], "warm_up_s"),
+        "startup.first_query_after_warm_up_ms": median_ms(samples[True], "first_query_s"),
+        "startup.heavy_modules_on_import": len(heavy_modules),
+    }, heavy_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--collection-chunks", type=int, default=500)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warm-up", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.warm_up)
+        return
+
+    with tempfile.TemporaryDirectory() as chroma_dir, StubWeatherServer() as weather:
+        build_stub_collection(chroma_dir, limit=args.collection_chunks)
+        metrics, heavy_modules = measure_startup(chroma_dir, weather.url, args.runs)
+    for metric, value in metrics.items():
+        print(f"{metric:<42} {value:10.1f}")
+    print(f"heavy modules imported by app.workflow: {', '.join(heavy_modules) or 'none'}")
+    assert not heavy_modules, f"importing app.workflow loaded {', '.join(heavy_modules)}; import them on first use"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Time to first byte of the final answer: blocking generate_final_response
+versus the streaming path (process_query_stream / process_query_stream_async),
+against a fake Bedrock client that streams one word at a time.
+
+Run from the project root:
+    python -m benchmarks.bench_streaming --first-token 0.4 --per-token 0.03 --words 120
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.stubs import FakeBedrockClient, build_stub_collection
+
+QUERY = "What did Twain think of Rome?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token", type=float, default=0.4, help="seconds until the first token")
+    parser.add_argument("--per-token", type=float, default=0.03, help="seconds between tokens")
+    parser.add_argument("--words", type=int, default=120, help="length of the generated answer")
+    args = parser.parse_args()
+
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    os.environ["CHROMA_DIR"] = tempfile.mkdtemp(prefix="bench_streaming_")
+    build_stub_collection(os.environ["CHROMA_DIR"], limit=200)
+    answer = " ".join(f"word{i}" for i in range(args.words))
+
+    def handler(prompt):
+        return "out-of-scope" if "Return only the label" in prompt else answer
+
+    from app.bedrock_client import set_bedrock_client
+    from app.workflow import StreamTimings, generate_final_response, process_query_stream
+    from app.async_workflow import process_query_stream_async
+
+    generation_time = args.first_token + args.per_token * (args.words - 1)
+    set_bedrock_client(FakeBedrockClient(
+        converse_latency=generation_time, converse_handler=handler,
+        stream_first_token_latency=args.first_token, stream_token_latency=args.per_token
+    ))
+
+    start = time.perf_counter()
+    generate_final_response(QUERY, book_answer="...")
+    blocking = time.perf_counter() - start
+
+    timings = StreamTimings()
+    streamed = "".join(process_query_stream(QUERY, timings=timings))
+
+    async def consume():
+        async_timings = StreamTimings()
+        parts = [part async for part in process_query_stream_async(QUERY, async_timings)]
+        return "".join(parts), async_timings
+
+    streamed_async, async_timings = asyncio.run(consume())
+    set_bedrock_client(None)
+
+    assert streamed == streamed_async == answer
+    print(f"{args.words}-word answer, first token after {args.first_token * 1000:.0f} ms, "
+          f"{args.per_token * 1000:.0f} ms per token")
+    print(f"blocking converse           first byte {blocking * 1000:8.1f} ms   total {blocking * 1000:8.1f} ms")
+    for name, t in (("process_query_stream", timings), ("process_query_stream_async", async_timings)):
+        print(f"{name:<27}first byte {t.time_to_first_token * 1000:8.1f} ms   total {t.total_time * 1000:8.1f} ms   "
+              f"usage {t.usage}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cost of the telemetry layer: time per span (and per counter increment) with
+telemetry off, in-memory metrics only, and metrics plus JSON span logs (written
+to /dev/null). Then runs a few queries through process_query against local
+stubs with telemetry on and prints the per-stage latency table it recorded.
+
+Run from the project root:
+    python -m benchmarks.bench_telemetry --spans 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.stubs import FakeBedrockClient, StubWeatherServer, build_stub_collection
+
+QUERIES = [
+    "What did Mark Twain think about the Sphinx?",
+    "I want to visit the places Twain went to in Italy - what's the weather like there now?",
+    "What's the current weather in Paris?",
+]
+
+
+def classify_stub(prompt: str) -> str:
+    if "Return only the label" not in prompt:
+        return "A stub answer."
+    query = prompt.rsplit('"', 2)[-2].lower()
+    if "weather" in query:
+        return "both" if "twain" in query else "weather"
+    return "book"
+
+
+def _per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    fn(calls)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def _spans(calls: int) -> None:
+    from app.telemetry import span
+
+    for _ in range(calls):
+        with span("bench", label="book"):
+            pass
+
+
+def _nested_spans(calls: int) -> None:
+    from app.telemetry import span
+
+    for _ in range(calls // 2):
+        with span("bench_outer"):
+            with span("bench_inner"):
+                pass
+
+
+def _counts(calls: int) -> None:
+    from app.telemetry import count
+
+    for _ in range(calls):
+        count("bench", cache="embedding", result="hit")
+
+
+def _empty_loop(calls: int) -> None:
+    for _ in range(calls):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=12)
+    args = parser.parse_args()
+
+    from app.telemetry import configure_telemetry, get_telemetry
+
+    baseline = _per_call_us(_empty_loop, args.spans)
+    print(f"{'mode':<16} {'span':>10} {'nested span':>12} {'counter':>10}   (us per call, loop overhead removed)")
+    for mode, exporters in (("off", ""), ("metrics", "metrics"), ("metrics + json", "json")):
+        os.environ["TELEMETRY_JSON_PATH"] = os.devnull
+        configure_telemetry(exporters)
+        results = [max(0.0, _per_call_us(fn, args.spans) - baseline) for fn in (_spans, _nested_spans, _counts)]
+        print(f"{mode:<16} {results[0]:10.2f} {results[1]:12.2f} {results[2]:10.2f}")
+
+    chroma_dir = tempfile.mkdtemp(prefix="bench_telemetry_")
+    os.environ["CHROMA_DIR"] = chroma_dir
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    os.environ.setdefault("Weather_api", "stub")
+    build_stub_collection(chroma_dir, limit=500)
+
+    from app.bedrock_client import set_bedrock_client
+    from app.workflow import process_query
+
+    set_bedrock_client(FakeBedrockClient(0.05, 0.01, classify_stub))
+    telemetry = configure_telemetry("metrics")
+    with StubWeatherServer(latency=0.02) as weather:
+        os.environ["OPENWEATHER_BASE_URL"] = weather.url
+        for i in range(args.queries):
+            process_query(QUERIES[i % len(QUERIES)] + f" ({i})")
+    set_bedrock_client(None)
+
+    snapshot = get_telemetry().snapshot() if telemetry else {"histograms": {}, "counters": {}}
+    print(f"\nStages recorded over {args.queries} stub queries:")
+    for name, stats in snapshot["histograms"].items():
+        print(f"  {name:<60} n={stats['count']:<4} mean {stats['mean'] * 1000:7.2f} ms   p95 <= {stats['p95'] * 1000:g} ms")
+    for name, value in snapshot["counters"].items():
+        print(f"  {name:<60} {value:g}")
+    configure_telemetry("")
+
+
+if __name__ == "__main__":
+    main()
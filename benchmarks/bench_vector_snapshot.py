@@ -0,0 +1,134 @@
+"""
+Dense search through ChromaDB (HNSW, L2) versus the memory-mapped vector
+snapshot (exact cosine top-k with one matrix product). Reports:
+
+- cold start: time for a fresh process to open the store and answer one
+  query (import time excluded), measured in subprocesses;
+- per-query latency (p50 / p95) and batched throughput;
+- recall@k of each backend against exact cosine ground truth.
+
+The collection holds real book chunks with fake embeddings. Queries are chunk
+embeddings plus noise, so each has a close cluster of true neighbours.
+
+Run from the project root:
+    python -m benchmarks.bench_vector_snapshot --queries 500 --k 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.stubs import build_stub_collection
+
+COLD_START = {
+    "chroma": """
+import sys, time, chromadb
+query = [0.01] * int(sys.argv[3])
+start = time.perf_counter()
+collection = chromadb.PersistentClient(path=sys.argv[1]).get_collection(sys.argv[2])
+collection.query(query_embeddings=[query], n_results=5, include=["documents", "metadatas"])
+print(time.perf_counter() - start)
+""",
+    "snapshot": """
+import sys, time
+from app.vector_snapshot import get_vector_snapshot
+query = [0.01] * int(sys.argv[3])
+start = time.perf_counter()
+snapshot = get_vector_snapshot(sys.argv[1], sys.argv[2])
+snapshot.rows([row for row, _ in snapshot.search(query, 5)[0]])
+print(time.perf_counter() - start)
+""",
+}
+
+
+def _cold_start(backend: str, chroma_dir: str, collection_name: str, dim: int, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", COLD_START[backend], chroma_dir, collection_name, str(dim)],
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def _recall(results: list, truth: np.ndarray) -> float:
+    return statistics.mean(len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.5, help="query noise, relative to the vector scale")
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from app.chroma_utils import read_collection
+    from app.vector_snapshot import export_collection_snapshot
+
+    collection_name = "bench"
+    with tempfile.TemporaryDirectory() as chroma_dir:
+        collection = build_stub_collection(chroma_dir, collection_name)
+        rows = read_collection(collection, include=("embeddings", "documents", "metadatas"))
+        start = time.perf_counter()
+        snapshot = export_collection_snapshot(collection, chroma_dir, collection_name, rows)
+        export_ms = (time.perf_counter() - start) * 1000
+        embeddings = np.asarray(rows["embeddings"], dtype=np.float64)
+        dim = embeddings.shape[1]
+        print(f"{len(snapshot)} chunks x {dim} dims, snapshot exported in {export_ms:.0f} ms")
+
+        rng = np.random.default_rng(args.seed)
+        picks = rng.integers(0, len(embeddings), args.queries)
+        queries = embeddings[picks] + rng.uniform(-args.noise, args.noise, (args.queries, dim))
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        truth_scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+        truth = np.argsort(-truth_scores, axis=1)[:, :args.k]
+        truth_ids = [[rows["ids"][row] for row in expected] for expected in truth]
+        queries = queries.tolist()
+
+        results = {}
+        for name, search in (
+            ("chroma", lambda q: collection.query(query_embeddings=[q], n_results=args.k,
+                                                  include=["documents", "metadatas"])["ids"][0]),
+            ("snapshot", lambda q: snapshot.rows([row for row, _ in snapshot.search(q, args.k)[0]])["ids"]),
+        ):
+            search(queries[0])
+            timings, found = [], []
+            for query in queries:
+                start = time.perf_counter()
+                found.append(search(query))
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = {
+                "p50_ms": statistics.median(timings),
+                "p95_ms": timings[int(len(timings) * 0.95) - 1],
+                "recall": _recall(found, truth_ids)
+            }
+
+        batches = [queries[i:i + args.batch] for i in range(0, len(queries), args.batch)]
+        for name, search in (
+            ("chroma", lambda batch: collection.query(query_embeddings=batch, n_results=args.k, include=[])),
+            ("snapshot", lambda batch: snapshot.search(batch, args.k)),
+        ):
+            start = time.perf_counter()
+            for batch in batches:
+                search(batch)
+            results[name]["batched_qps"] = len(queries) / (time.perf_counter() - start)
+            results[name]["cold_start_ms"] = _cold_start(name, chroma_dir, collection_name, dim, args.cold_runs) * 1000
+        del snapshot, collection
+
+    print(f"\n{'backend':<10} {'cold start':>11} {'p50':>9} {'p95':>9} {'batched':>13} {'recall@' + str(args.k):>10}")
+    for name, stats in results.items():
+        print(f"{name:<10} {stats['cold_start_ms']:8.1f} ms {stats['p50_ms']:6.2f} ms {stats['p95_ms']:6.2f} ms "
+              f"{stats['batched_qps']:8.0f} q/s {stats['recall']:10.3f}")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
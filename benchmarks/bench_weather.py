@@ -0,0 +1,57 @@
+"""
+Weather lookups for a "both" query: the old sequential loop (new WeatherAPI and
+plain requests.get per city) versus the shared client's concurrent batch with
+pooled connections, TTL cache and request coalescing, against a local stub.
+
+Run from the project root:
+    python -m benchmarks.bench_weather --latency 0.1
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import StubWeatherServer
+
+CITIES = ["Rome", "Naples", "Florence", "Venice", "Milan"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="stub response latency in seconds")
+    args = parser.parse_args()
+
+    with StubWeatherServer(latency=args.latency) as server:
+        os.environ["OPENWEATHER_BASE_URL"] = server.url
+        os.environ.setdefault("Weather_api", "stub")
+        from app.weather import WeatherAPI
+
+        start = time.perf_counter()
+        for city in CITIES:
+            WeatherAPI(cache_ttl=0).get_weather_by_city(city)
+        sequential = time.perf_counter() - start
+
+        api = WeatherAPI()
+        start = time.perf_counter()
+        api.get_weather_for_cities(CITIES)
+        batch_cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        api.get_weather_for_cities(CITIES)
+        batch_warm = time.perf_counter() - start
+
+        coalescing_api = WeatherAPI()
+        before = server.requests
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            list(executor.map(coalescing_api.get_weather_by_city, ["Rome"] * 20))
+        coalesced_requests = server.requests - before
+
+    print(f"{len(CITIES)} cities, stub latency {args.latency * 1000:.0f} ms")
+    print(f"sequential, new client per city  {sequential * 1000:8.1f} ms")
+    print(f"concurrent batch (cold cache)    {batch_cold * 1000:8.1f} ms")
+    print(f"concurrent batch (warm cache)    {batch_warm * 1000:8.1f} ms")
+    print(f"20 simultaneous lookups of one city -> {coalesced_requests} upstream request(s)")
+
+
+if __name__ == "__main__":
+    main()
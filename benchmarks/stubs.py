@@ -0,0 +1,529 @@
+"""
+Local stand-ins for the remote services used by the workflow, so benchmarks
+can run without AWS or OpenWeatherMap credentials.
+"""
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EMBEDDING_DIM = 1536
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> list:
+    """
+    Deterministic pseudo-embedding for a text (same text -> same vector).
+    """
+    rng = random.Random(text)
+    return [rng.uniform(-1.0, 1.0) for _ in range(dim)]
+
+
+# Bedrock error types by HTTP status, as the service reports them in x-amzn-ErrorType.
+BEDROCK_ERRORS = {400: "ValidationException", 429: "ThrottlingException", 500: "InternalServerException",
+                  503: "ServiceUnavailableException"}
+
+
+def _next_fault(server):
+    """
+    Pop the next scripted (status, delay) for a request: status None means
+    answer normally. Scripts run out into normal, undelayed answers.
+    """
+    with server.lock:
+        server.requests += 1
+        status = server.faults.pop(0) if server.faults else None
+        delay = server.delays.pop(0) if server.delays else 0.0
+    return status, delay
+
+
+def _send_json(handler, status: int, payload: dict, headers: dict = None) -> None:
+    data = json.dumps(payload).encode("utf-8")
+    handler.send_response(status)
+    handler.send_header("Content-Type", "application/json")
+    for name, value in (headers or {}).items():
+        handler.send_header(name, value)
+    handler.send_header("Content-Length", str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+
+class _BedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        status, delay = _next_fault(self.server)
+        if self.server.latency or delay:
+            time.sleep(self.server.latency + delay)
+        if status:
+            error = BEDROCK_ERRORS.get(status, "InternalServerException")
+            _send_json(self, status, {"message": f"Injected {error}"}, {"x-amzn-ErrorType": error})
+            return
+
+        if self.path.endswith("/invoke"):
+            payload = {"embedding": fake_embedding(body.get("inputText", "")), "inputTextTokenCount": 0}
+        elif self.path.endswith("/converse"):
+            payload = {
+                "output": {"message": {"role": "assistant", "content": [{"text": self.server.converse_text}]}},
+                "stopReason": "end_turn",
+                "usage": {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0},
+                "metrics": {"latencyMs": int(self.server.latency * 1000)}
+            }
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        _send_json(self, 200, payload)
+
+
+class StubBedrockServer:
+    """
+    Minimal HTTP server speaking the Bedrock Runtime `invoke_model` and
+    `converse` REST routes. Point BEDROCK_ENDPOINT_URL at `url` to use it.
+
+    Faults are injected by script: the next requests answer with the HTTP
+    statuses in `faults` (429 ThrottlingException, 503 ServiceUnavailable,
+    ...; None for a normal answer) and are delayed by the extra seconds in
+    `delays`. Both lists can be extended while the server runs; `requests`
+    counts every request received.
+    """
+
+    def __init__(self, latency: float = 0.0, converse_text: str = "book", faults=(), delays=()):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _BedrockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.converse_text = converse_text
+        self.httpd.faults = list(faults)
+        self.httpd.delays = list(delays)
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def faults(self) -> list:
+        return self.httpd.faults
+
+    @property
+    def delays(self) -> list:
+        return self.httpd.delays
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _WeatherHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        city = parse_qs(urlparse(self.path).query).get("q", [""])[0].split(",")[0]
+        status, delay = _next_fault(self.server)
+        if self.server.latency or delay:
+            time.sleep(self.server.latency + delay)
+        if status:
+            _send_json(self, status, {"cod": str(status), "message": "injected fault"})
+            return
+        if city.lower() in self.server.unknown_cities:
+            status, payload = 404, {"cod": "404", "message": "city not found"}
+        else:
+            status, payload = 200, {
+                "name": city,
+                "sys": {"country": "IT"},
+                "weather": [{"description": "clear sky"}],
+                "main": {"temp": 21.5, "feels_like": 21.0, "humidity": 40, "pressure": 1015},
+                "wind": {"speed": 3.1, "deg": 270},
+                "visibility": 10000
+            }
+        _send_json(self, status, payload)
+
+
+class StubWeatherServer:
+    """
+    Minimal HTTP server answering OpenWeatherMap current-weather requests.
+    Point OPENWEATHER_BASE_URL at `url` to use it; `requests` counts hits.
+    `faults` and `delays` script failures as for StubBedrockServer.
+    """
+
+    def __init__(self, latency: float = 0.0, unknown_cities=(), faults=(), delays=()):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _WeatherHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.unknown_cities = {c.lower() for c in unknown_cities}
+        self.httpd.faults = list(faults)
+        self.httpd.delays = list(delays)
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/data/2.5/weather"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def requests(self) -> int:
+        return self.httpd.requests
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _StreamingBody:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+def request_prompt(system=None, messages=()) -> str:
+    """
+    The text of a converse request as one prompt string: the system prompt's
+    text blocks, then the last message's text.
+    """
+    parts = [block["text"] for block in system or () if "text" in block]
+    parts.append(messages[-1]["content"][0]["text"])
+    return "\n\n".join(parts)
+
+
+class FakeThrottlingError(Exception):
+    """
+    Shaped like botocore's ClientError for a throttled request.
+    """
+
+    def __init__(self, operation: str = "InvokeModel"):
+        super().__init__(f"An error occurred (ThrottlingException) when calling the {operation} operation")
+        self.response = {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}}
+
+
+class FakeBedrockClient:
+    """
+    In-process stand-in for a boto3 Bedrock Runtime client (converse,
+    converse_stream, invoke_model), with a fixed per-call latency. Install it
+    with app.bedrock_client.set_bedrock_client(). A `throttle_rate` fraction of
+    calls fails with FakeThrottlingError.
+
+    `converse_handler(prompt)` returns the model text; by default metadata
+    prompts get a small JSON object (or array, for batched prompts) and anything
+    else gets "book".
+    """
+
+    def __init__(self, converse_latency: float = 0.0, embed_latency: float = 0.0, converse_handler=None,
+                 stream_first_token_latency: float = 0.0, stream_token_latency: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = 0):
+        self.converse_latency = converse_latency
+        self.embed_latency = embed_latency
+        self.converse_handler = converse_handler or self._default_converse
+        self.stream_first_token_latency = stream_first_token_latency
+        self.stream_token_latency = stream_token_latency
+        self.throttle_rate = throttle_rate
+        self.calls = {"converse": 0, "converse_stream": 0, "invoke_model": 0}
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _default_converse(prompt: str) -> str:
+        if "Respond in JSON" in prompt:
+            return json.dumps({"summary": "A passage.", "locations": ["Rome"], "people": ["Twain"]})
+        if "JSON array" in prompt:
+            return json.dumps([
+                {"index": int(i), "summary": "A passage.", "locations": ["Rome"], "people": ["Twain"]}
+                for i in re.findall(r"^Text \[(\d+)\]:", prompt, re.MULTILINE)
+            ])
+        return "book"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] += 1
+            throttle = self.throttle_rate and self._random.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if throttle:
+            raise FakeThrottlingError(name)
+
+    def converse(self, modelId, messages, inferenceConfig=None, system=None, **kwargs):
+        self._count("converse")
+        time.sleep(self.converse_latency)
+        prompt = request_prompt(system, messages)
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": self.converse_handler(prompt)}]}},
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0},
+            "metrics": {"latencyMs": int(self.converse_latency * 1000)}
+        }
+
+    def converse_stream(self, modelId, messages, inferenceConfig=None, system=None, **kwargs):
+        """
+        Stream the handler's text word by word: the first word after
+        `stream_first_token_latency`, then one word every `stream_token_latency`.
+        """
+        self._count("converse_stream")
+        prompt = request_prompt(system, messages)
+        words = self.converse_handler(prompt).split(" ")
+
+        def events():
+            yield {"messageStart": {"role": "assistant"}}
+            time.sleep(self.stream_first_token_latency)
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.stream_token_latency)
+                yield {"contentBlockDelta": {"delta": {"text": word if i == 0 else " " + word}, "contentBlockIndex": 0}}
+            yield {"contentBlockStop": {"contentBlockIndex": 0}}
+            yield {"messageStop": {"stopReason": "end_turn"}}
+            yield {"metadata": {"usage": {"inputTokens": len(prompt.split()), "outputTokens": len(words),
+                                          "totalTokens": len(prompt.split()) + len(words)}}}
+
+        return {"stream": events()}
+
+    def invoke_model(self, modelId, body, contentType=None, **kwargs):
+        self._count("invoke_model")
+        time.sleep(self.embed_latency)
+        text = json.loads(body).get("inputText", "")
+        payload = {"embedding": fake_embedding(text), "inputTextTokenCount": 0}
+        return {"body": _StreamingBody(json.dumps(payload).encode("utf-8"))}
+
+
+class ReplayBedrockClient(FakeBedrockClient):
+    """
+    FakeBedrockClient that answers from a recording made by
+    RecordingBedrockClient: converse and converse_stream return the recorded
+    text for the same prompt, invoke_model the recorded embedding for the same
+    input text. Requests that were not recorded get the fake responses. Latency
+    and throttling settings apply as usual.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        self.texts, self.embeddings = {}, {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["operation"] == "invoke_model":
+                    self.embeddings[entry["input"]] = entry["embedding"]
+                else:
+                    self.texts[entry["input"]] = entry["text"]
+        fallback = kwargs.pop("converse_handler", None) or self._default_converse
+        super().__init__(converse_handler=lambda prompt: self.texts.get(prompt) or fallback(prompt), **kwargs)
+
+    def invoke_model(self, modelId, body, contentType=None, **kwargs):
+        text = json.loads(body).get("inputText", "")
+        if text not in self.embeddings:
+            return super().invoke_model(modelId, body, contentType, **kwargs)
+        self._count("invoke_model")
+        time.sleep(self.embed_latency)
+        payload = {"embedding": self.embeddings[text], "inputTextTokenCount": 0}
+        return {"body": _StreamingBody(json.dumps(payload).encode("utf-8"))}
+
+
+class TokenCountingBedrockClient(FakeBedrockClient):
+    """
+    FakeBedrockClient whose converse calls report token usage and take longer
+    the more input the model has to read (`token_latency` seconds per input
+    token on top of `converse_latency`), so prompt changes show up as token and
+    latency differences. Tokens are estimated with
+    app.prompt_builder.estimate_tokens.
+
+    Prompt caching is simulated: the system blocks before a cachePoint are
+    cached on first use, and later requests starting with the same blocks
+    report them as cacheReadInputTokens, read at `cached_token_latency`.
+
+    Each call is appended to `records` as {"kind": "classify" or "generate",
+    "input_tokens", "cache_read_tokens", "cache_write_tokens", "seconds"}.
+    """
+
+    def __init__(self, token_latency: float = 0.0002, cached_token_latency: float = 0.00002, **kwargs):
+        super().__init__(**kwargs)
+        self.token_latency = token_latency
+        self.cached_token_latency = cached_token_latency
+        self.records = []
+        self._cached_prefixes = set()
+
+    def _usage(self, system, messages) -> dict:
+        from app.prompt_builder import estimate_tokens
+
+        prefix, cached_prefix = [], None
+        for block in system or ():
+            if "cachePoint" in block:
+                cached_prefix = tuple(prefix)
+            elif "text" in block:
+                prefix.append(block["text"])
+        total = sum(estimate_tokens(text) for text in prefix) + estimate_tokens(messages[-1]["content"][0]["text"])
+        usage = {"inputTokens": total, "cacheReadInputTokens": 0, "cacheWriteInputTokens": 0}
+        if cached_prefix:
+            cached = sum(estimate_tokens(text) for text in cached_prefix)
+            with self._lock:
+                hit = cached_prefix in self._cached_prefixes
+                self._cached_prefixes.add(cached_prefix)
+            usage["cacheReadInputTokens" if hit else "cacheWriteInputTokens"] = cached
+            if hit:
+                usage["inputTokens"] -= cached
+        return usage
+
+    def converse(self, modelId, messages, inferenceConfig=None, system=None, **kwargs):
+        from app.prompt_builder import estimate_tokens
+
+        start = time.perf_counter()
+        usage = self._usage(system, messages)
+        time.sleep(self.token_latency * usage["inputTokens"]
+                   + self.cached_token_latency * usage["cacheReadInputTokens"])
+        response = super().converse(modelId, messages, inferenceConfig, system=system, **kwargs)
+        output_tokens = estimate_tokens(response["output"]["message"]["content"][0]["text"])
+        response["usage"] = {**usage, "outputTokens": output_tokens, "totalTokens": usage["inputTokens"] + output_tokens}
+        kind = "classify" if "Return only the label" in request_prompt(system, messages) else "generate"
+        with self._lock:
+            self.records.append({
+                "kind": kind,
+                "input_tokens": usage["inputTokens"] + usage["cacheReadInputTokens"],
+                "cache_read_tokens": usage["cacheReadInputTokens"],
+                "cache_write_tokens": usage["cacheWriteInputTokens"],
+                "seconds": time.perf_counter() - start
+            })
+        return response
+
+
+class RecordingBedrockClient:
+    """
+    Wraps a real Bedrock Runtime client and appends every converse,
+    converse_stream and invoke_model exchange to a JSONL file for
+    ReplayBedrockClient. For example, to record one live run of the workflow:
+
+        set_bedrock_client(RecordingBedrockClient(new_bedrock_client(), "recording.jsonl"))
+    """
+
+    def __init__(self, client, path: str):
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, operation: str, input_text: str, **fields) -> None:
+        line = json.dumps({"operation": operation, "input": input_text, **fields})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def converse(self, **kwargs):
+        response = self.client.converse(**kwargs)
+        self._write("converse", request_prompt(kwargs.get("system"), kwargs["messages"]),
+                    text=response["output"]["message"]["content"][0]["text"])
+        return response
+
+    def converse_stream(self, **kwargs):
+        response = self.client.converse_stream(**kwargs)
+        prompt = request_prompt(kwargs.get("system"), kwargs["messages"])
+
+        def events():
+            parts = []
+            for event in response["stream"]:
+                if "contentBlockDelta" in event:
+                    parts.append(event["contentBlockDelta"]["delta"].get("text", ""))
+                yield event
+            self._write("converse", prompt, text="".join(parts))
+
+        return {**response, "stream": events()}
+
+    def invoke_model(self, **kwargs):
+        response = self.client.invoke_model(**kwargs)
+        data = response["body"].read()
+        self._write("invoke_model", json.loads(kwargs["body"]).get("inputText", ""),
+                    embedding=json.loads(data)["embedding"])
+        return {**response, "body": _StreamingBody(data)}
+
+
+def label_converse_handler(labels: dict, answer: str = "A stub answer."):
+    """
+    Converse handler that classifies each query in `labels` (query -> label)
+    as its given label and answers every other prompt with `answer`, so the
+    workflow routes labeled queries deterministically.
+    """
+    def handler(prompt: str) -> str:
+        if "Return only the label" not in prompt:
+            return answer
+        return labels.get(prompt.rsplit('"', 2)[-2], "out-of-scope")
+    return handler
+
+
+class FakeCollection:
+    """
+    Minimal in-memory stand-in for a Chroma collection.
+    """
+
+    def __init__(self, name: str = "fake"):
+        self.name = name
+        self.rows = {}
+        self.add_calls = 0
+
+    def add(self, ids, documents=None, embeddings=None, metadatas=None):
+        self.add_calls += 1
+        for i, row_id in enumerate(ids):
+            self.rows[row_id] = {
+                "document": documents[i] if documents else None,
+                "embedding": embeddings[i] if embeddings else None,
+                "metadata": metadatas[i] if metadatas else None
+            }
+
+    def count(self) -> int:
+        return len(self.rows)
+
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EBOOK_PATH = os.path.join(PROJECT_ROOT, "data", "ebook.txt")
+
+
+def book_chunks(limit: int = None) -> list:
+    """
+    Chunks of data/ebook.txt, exactly as ingestion produces them.
+    """
+    from app.book_preprocess import iter_book_chunks
+
+    return list(itertools.islice(iter_book_chunks(EBOOK_PATH), limit))
+
+
+def build_stub_collection(chroma_dir: str, collection_name: str = "innocents_abroad", limit: int = None,
+                          locations=("Rome", "Naples", "Florence", "Venice", "Milan", "Italy")):
+    """
+    Fill a ChromaDB collection with real book chunks, fake embeddings and fake
+    metadata (locations cycle through `locations`), without any Bedrock calls.
+    """
+    import chromadb
+    from app.book_preprocess import chunk_content_id
+
+    chunks = list(dict.fromkeys(book_chunks(limit)))
+    collection = chromadb.PersistentClient(path=chroma_dir).get_or_create_collection(collection_name)
+    for start in range(0, len(chunks), 1000):
+        batch = chunks[start:start + 1000]
+        collection.upsert(
+            ids=[chunk_content_id(chunk) for chunk in batch],
+            documents=batch,
+            embeddings=[fake_embedding(chunk) for chunk in batch],
+            metadatas=[
+                {"summary": chunk[:80], "locations": ", ".join(locations[(start + i) % len(locations):][:2]),
+                 "people": "Twain", "chunk_index": start + i}
+                for i, chunk in enumerate(batch)
+            ]
+        )
+    return collection
@@ -0,0 +1,334 @@
+"""
+Offline benchmark suite. Runs every scenario against the local stand-ins in
+benchmarks/stubs.py and writes the results as one JSON document, so runs can
+be compared across commits without AWS or OpenWeatherMap credentials.
+
+Scenarios:
+  chunking     streaming clean + chunk of data/ebook.txt (MB/s, chunks/s)
+  ingestion    metadata + embedding + write pipeline over book chunks (chunks/s)
+  queries      sync process_query over data/classifier_eval.jsonl, latency
+               percentiles per label
+  concurrency  process_query_async throughput at several in-flight levels
+  startup      import time of app.workflow and time to the first answer in a
+               fresh process, with and without warm_up() (benchmarks/bench_startup.py)
+
+Bedrock is a FakeBedrockClient with fixed latencies and an optional throttling
+rate, or a ReplayBedrockClient with --replay. Weather comes from a local HTTP
+stub. Queries are grouped by their labels in the eval set; the stub model
+answers the LLM classifier with that label, and the embedding tier is off
+because fake embeddings carry no meaning, so every run takes the same routes.
+
+Run from the project root:
+    python -m benchmarks.suite --output bench_results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.suite --quick --compare bench_results/main.json --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.stubs import (
+    EBOOK_PATH,
+    PROJECT_ROOT,
+    FakeBedrockClient,
+    FakeCollection,
+    ReplayBedrockClient,
+    StubWeatherServer,
+    book_chunks,
+    build_stub_collection,
+    label_converse_handler
+)
+
+SCENARIOS = ("chunking", "ingestion", "queries", "concurrency", "startup")
+EVAL_PATH = os.path.join(PROJECT_ROOT, "data", "classifier_eval.jsonl")
+SUITE_VERSION = 1
+
+
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _latency_metrics(prefix: str, seconds: list) -> dict:
+    return {
+        f"{prefix}.p50_ms": statistics.median(seconds) * 1000,
+        f"{prefix}.p95_ms": _percentile(seconds, 0.95) * 1000,
+        f"{prefix}.p99_ms": _percentile(seconds, 0.99) * 1000,
+        f"{prefix}.mean_ms": statistics.mean(seconds) * 1000
+    }
+
+
+def _bedrock_client(args, converse_handler=None):
+    settings = dict(converse_latency=args.converse_latency, embed_latency=args.embed_latency,
+                    converse_handler=converse_handler, throttle_rate=args.throttle_rate, seed=args.seed)
+    if args.replay:
+        return ReplayBedrockClient(args.replay, **settings)
+    return FakeBedrockClient(**settings)
+
+
+def run_chunking(args) -> dict:
+    from app.book_preprocess import iter_book_chunks
+
+    size = os.path.getsize(EBOOK_PATH)
+    best, chunks = None, 0
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        chunks = sum(1 for _ in iter_book_chunks(EBOOK_PATH))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "chunking.mb_per_s": size / 1e6 / best,
+        "chunking.chunks_per_s": chunks / best,
+        "chunking.chunks": chunks
+    }
+
+
+def run_ingestion(args) -> dict:
+    from app.bedrock_client import set_bedrock_client
+    from app.bedrock_converse import reset_metadata_stats
+    from app.book_preprocess import chunk_content_id
+    from app.ingest_pipeline import IngestPipeline
+    from app.store_to_chroma import _embed_batch, _extract_metadata_batch
+
+    chunks = list(dict.fromkeys(book_chunks(args.ingest_chunks)))
+    collection = FakeCollection()
+
+    def write(batch):
+        collection.add(
+            ids=[item["id"] for item in batch],
+            documents=[item["text"] for item in batch],
+            embeddings=[item["embedding"] for item in batch],
+            metadatas=[item["metadata"] for item in batch]
+        )
+
+    client = _bedrock_client(args)
+    set_bedrock_client(client)
+    reset_metadata_stats()
+    try:
+        # Same stage layout as store_to_chroma.main with its default settings.
+        pipeline = IngestPipeline(
+            _extract_metadata_batch,
+            lambda items: _embed_batch(items, max_workers=4),
+            write,
+            metadata_workers=4,
+            embedding_workers=2,
+            embed_batch_size=32,
+            metadata_batch_size=4,
+            write_batch_size=256
+        )
+        summary = pipeline.run(
+            {"index": i, "id": chunk_content_id(chunk), "text": chunk} for i, chunk in enumerate(chunks)
+        )
+    finally:
+        set_bedrock_client(None)
+    return {
+        "ingestion.chunks_per_s": summary["written"] / summary["elapsed"],
+        "ingestion.elapsed_s": summary["elapsed"],
+        "ingestion.errors": len(summary["errors"]),
+        "ingestion.bedrock_calls": client.calls["converse"] + client.calls["invoke_model"],
+        "ingestion.throttled": client.throttled
+    }
+
+
+def _query_setup(args):
+    """
+    Stub collection, Bedrock client and labeled queries shared by the query scenarios.
+    """
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        eval_set = [json.loads(line) for line in f if line.strip()]
+    if not os.listdir(args.chroma_dir):
+        build_stub_collection(args.chroma_dir, limit=args.collection_chunks)
+    return eval_set, _bedrock_client(args, label_converse_handler({row["query"]: row["label"] for row in eval_set}))
+
+
+def run_queries(args) -> dict:
+    from app.bedrock_client import set_bedrock_client
+    from app.workflow import process_query
+
+    eval_set, client = _query_setup(args)
+    set_bedrock_client(client)
+    by_label = defaultdict(list)
+    try:
+        process_query(eval_set[0]["query"])  # opens the collection and the HTTP pools
+        for _ in range(args.repeats):
+            for row in eval_set:
+                start = time.perf_counter()
+                process_query(row["query"])
+                by_label[row["label"]].append(time.perf_counter() - start)
+    finally:
+        set_bedrock_client(None)
+    metrics = _latency_metrics("queries.all", [t for times in by_label.values() for t in times])
+    for label, times in sorted(by_label.items()):
+        metrics.update(_latency_metrics(f"queries.{label}", times))
+    return metrics
+
+
+def run_concurrency(args) -> dict:
+    from app.async_workflow import process_query_async
+    from app.bedrock_client import set_bedrock_client
+
+    eval_set, client = _query_setup(args)
+    queries = [row["query"] for row in eval_set] * args.repeats
+
+    async def run(concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(query):
+            async with semaphore:
+                start = time.perf_counter()
+                await process_query_async(query)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(query) for query in queries))
+        return time.perf_counter() - start, latencies
+
+    metrics = {}
+    set_bedrock_client(client)
+    try:
+        for concurrency in args.concurrency:
+            elapsed, latencies = asyncio.run(run(concurrency))
+            metrics[f"concurrency.{concurrency}.queries_per_s"] = len(queries) / elapsed
+            metrics[f"concurrency.{concurrency}.p95_ms"] = _percentile(latencies, 0.95) * 1000
+    finally:
+        set_bedrock_client(None)
+    return metrics
+
+
+def run_startup(args) -> dict:
+    from benchmarks.bench_startup import measure_startup
+
+    _query_setup(args)
+    metrics, _ = measure_startup(args.chroma_dir, os.environ["OPENWEATHER_BASE_URL"], runs=args.startup_runs)
+    return metrics
+
+
+RUNNERS = {
+    "chunking": run_chunking,
+    "ingestion": run_ingestion,
+    "queries": run_queries,
+    "concurrency": run_concurrency,
+    "startup": run_startup
+}
+
+
+def _git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--", "app"))}
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """
+    Metrics present in both runs whose time or throughput got worse by more than
+    `tolerance` (a fraction), as (metric, baseline value, current value) tuples.
+    Counts (errors, calls) are shown but never flagged.
+    """
+    regressions = []
+    print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>9}")
+    for metric in sorted(set(baseline["metrics"]) & set(current["metrics"])):
+        old, new = baseline["metrics"][metric], current["metrics"][metric]
+        change = (new - old) / old if old else 0.0
+        timed = higher_is_better(metric) or metric.endswith(("_ms", "_s"))
+        worse = -change if higher_is_better(metric) else change
+        flag = ""
+        if timed and worse > tolerance:
+            regressions.append((metric, old, new))
+            flag = "  REGRESSION"
+        print(f"{metric:<40} {old:12.3f} {new:12.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="fractional slowdown reported as a regression (default 0.15)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads, for CI smoke runs")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--ingest-chunks", type=int, default=400)
+    parser.add_argument("--collection-chunks", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--startup-runs", type=int, default=5)
+    parser.add_argument("--converse-latency", type=float, default=0.05)
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--weather-latency", type=float, default=0.02)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of Bedrock calls throttled")
+    parser.add_argument("--replay", help="answer Bedrock calls from a RecordingBedrockClient JSONL file")
+    parser.add_argument("--seed", type=int, default=19)
+    args = parser.parse_args()
+    if args.quick:
+        args.repeats, args.ingest_chunks, args.collection_chunks = 1, 100, 200
+        args.concurrency = [1, 8]
+        args.startup_runs = 2
+
+    # Every run starts cold and only keeps caches the workflow fills itself. The
+    # Chroma directory must be set before app.query_book is first imported.
+    args.chroma_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ["CHROMA_DIR"] = args.chroma_dir
+    os.environ["EMBEDDING_CACHE_DISABLED"] = "1"
+    os.environ["SEMANTIC_CACHE_ENABLED"] = "0"
+    os.environ["QUERY_CLASSIFIER_EMBEDDINGS"] = "0"
+    os.environ.setdefault("Weather_api", "stub")
+
+    settings = {key: value for key, value in vars(args).items()
+                if key not in {"output", "compare", "tolerance", "fail_on_regression", "chroma_dir"}}
+    results = {
+        "suite_version": SUITE_VERSION,
+        **_git_revision(),
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": settings,
+        "metrics": {}
+    }
+    with StubWeatherServer(latency=args.weather_latency) as weather:
+        os.environ["OPENWEATHER_BASE_URL"] = weather.url
+        for scenario in args.scenarios:
+            start = time.perf_counter()
+            metrics = RUNNERS[scenario](args)
+            results["metrics"].update(metrics)
+            print(f"{scenario} ({time.perf_counter() - start:.1f} s)")
+            for metric, value in metrics.items():
+                print(f"  {metric:<38} {value:12.3f}")
+        results["metrics"]["weather.requests"] = weather.requests
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != settings:
+            print("Warning: baseline was run with different settings; comparing anyway.")
+        regressions = compare(baseline, results, args.tolerance)
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import json
+import re
+
+import pytest
+
+from app.bedrock_client import set_bedrock_client
+from app.bedrock_converse import (
+    MetadataError,
+    get_metadata_stats,
+    get_nova_pro_metadata,
+    get_nova_pro_metadata_batch,
+    reset_metadata_stats,
+)
+from app.ingest_pipeline import IngestPipeline
+from app.store_to_chroma import _extract_metadata_batch
+from benchmarks.stubs import FakeBedrockClient
+
+VALID = {"summary": "A passage.", "locations": ["Rome"], "people": ["Twain"]}
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    reset_metadata_stats()
+    yield
+    set_bedrock_client(None)
+
+
+def use_model(handler) -> FakeBedrockClient:
+    client = FakeBedrockClient(converse_handler=handler)
+    set_bedrock_client(client)
+    return client
+
+
+def batch_indices(prompt: str) -> list:
+    return [int(i) for i in re.findall(r"^Text \[(\d+)\]:", prompt, re.MULTILINE)]
+
+
+def test_single_metadata_is_parsed_from_prose_and_defaults_missing_lists():
+    use_model(lambda prompt: 'Sure:\n{"summary": "A passage.", "locations": ["Rome"]}\nDone.')
+    meta = get_nova_pro_metadata("In Rome we met nobody.")
+    assert meta == {"summary": "A passage.", "locations": ["Rome"], "people": []}
+
+
+@pytest.mark.parametrize("output, counter", [
+    ("", "empty"),
+    ("I cannot help with that.", "malformed"),
+    ('{"title": "A passage."}', "malformed"),
+    ('{"summary": "A passage.", "locations": "Rome", "people": []}', "malformed"),
+])
+def test_single_metadata_raises_instead_of_returning_a_placeholder(output, counter):
+    use_model(lambda prompt: output)
+    with pytest.raises(MetadataError):
+        get_nova_pro_metadata("Some text.")
+    assert get_metadata_stats()[counter] == 1
+
+
+def test_batch_maps_results_by_index_in_one_call():
+    def model(prompt):
+        entries = [dict(VALID, index=i, summary=f"Passage {i}.") for i in batch_indices(prompt)]
+        return "Here is the metadata:\n" + json.dumps(list(reversed(entries)))
+
+    client = use_model(model)
+    metas = get_nova_pro_metadata_batch(["one", "two", "three"])
+    assert [meta["summary"] for meta in metas] == ["Passage 0.", "Passage 1.", "Passage 2."]
+    assert all("index" not in meta for meta in metas)
+    assert client.calls["converse"] == 1
+    assert get_metadata_stats()["retried"] == get_metadata_stats()["malformed"] == 0
+
+
+def test_batch_re_requests_missing_and_invalid_entries():
+    def model(prompt):
+        if not batch_indices(prompt):
+            return json.dumps(VALID)
+        return json.dumps([dict(VALID, index=0), {"index": 1, "summary": None, "locations": "Rome"}])
+
+    client = use_model(model)
+    metas = get_nova_pro_metadata_batch(["one", "two", "three"])
+    assert all(meta["summary"] == "A passage." for meta in metas)
+    assert client.calls["converse"] == 3
+    assert get_metadata_stats()["retried"] == 2
+    assert get_metadata_stats()["malformed"] == 1
+
+
+def test_batch_returns_an_error_only_for_the_chunk_that_failed_again():
+    def model(prompt):
+        if batch_indices(prompt):
+            return json.dumps([dict(VALID, index=0)])
+        return "" if "bad chunk" in prompt else json.dumps(VALID)
+
+    use_model(model)
+    metas = get_nova_pro_metadata_batch(["good chunk", "bad chunk", "other chunk"])
+    assert isinstance(metas[1], MetadataError)
+    assert metas[0]["summary"] == metas[2]["summary"] == "A passage."
+
+
+def test_failed_chunks_are_not_written_by_the_pipeline():
+    def model(prompt):
+        if batch_indices(prompt):
+            return "not json"
+        return "" if "bad chunk" in prompt else json.dumps(VALID)
+
+    use_model(model)
+    items = [{"id": f"c{i}", "index": i, "text": text, "book_id": "b", "book_title": "B", "source": "b.txt"}
+             for i, text in enumerate(["good chunk", "bad chunk", "other chunk"])]
+    written = []
+    pipeline = IngestPipeline(_extract_metadata_batch, lambda item: item, written.extend,
+                              metadata_workers=1, embedding_workers=1, metadata_batch_size=3)
+    summary = pipeline.run(items)
+    assert sorted(item["index"] for item in written) == [0, 2]
+    assert [(error["index"], error["stage"]) for error in summary["errors"]] == [(1, "metadata")]
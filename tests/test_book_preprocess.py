@@ -0,0 +1,190 @@
+import hashlib
+import io
+import os
+import random
+import re
+
+import pytest
+
+from app.book_preprocess import (
+    chunk_book,
+    chunk_books,
+    chunk_text_by_paragraph,
+    clean_gutenberg_text,
+    find_books,
+    iter_book_chunks,
+    iter_chunks,
+    iter_gutenberg_paragraphs,
+)
+
+EBOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ebook.txt")
+
+# Output of the original clean_gutenberg_text + chunk_text_by_paragraph on data/ebook.txt.
+GOLDEN_CHUNK_COUNT = 1872
+GOLDEN_SHA256 = "b82ea569ce82b2e7b3ac3bd52f1907d3822ae8e5cdd3ee3c82578519d20d251b"
+
+
+def reference_chunks(text, min_words=30, max_words=200, overlap=50):
+    """The original, whole-string chunk_text_by_paragraph, kept verbatim as the oracle."""
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    chunks = []
+    current_chunk = []
+    current_word_count = 0
+    for para in paragraphs:
+        words = para.split()
+        if len(words) >= min_words and len(words) <= max_words:
+            if current_chunk:
+                prev_words = ' '.join(current_chunk).split()
+                if len(prev_words) > overlap:
+                    overlap_text = ' '.join(prev_words[-overlap:])
+                    chunks.append(overlap_text + ' ' + ' '.join(words))
+                else:
+                    chunks.append(' '.join(current_chunk) + ' ' + ' '.join(words))
+                current_chunk = []
+                current_word_count = 0
+            else:
+                chunks.append(para)
+        elif len(words) < min_words:
+            current_chunk.append(para)
+            current_word_count += len(words)
+            if current_word_count >= min_words:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = []
+                current_word_count = 0
+        else:
+            for i in range(0, len(words), max_words - overlap):
+                chunk = words[i:i+max_words]
+                if i != 0:
+                    chunk = words[max(i-overlap, 0):i] + chunk
+                if len(chunk) >= min_words:
+                    chunks.append(' '.join(chunk))
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return [c for c in chunks if len(c.split()) >= min_words]
+
+
+def streamed_chunks(raw_text, **kwargs):
+    return list(iter_chunks(iter_gutenberg_paragraphs(io.StringIO(raw_text)), **kwargs))
+
+
+def digest(chunks):
+    return hashlib.sha256("\x00".join(chunks).encode("utf-8")).hexdigest()
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def gutenberg(body):
+    return (
+        "The Project Gutenberg eBook\n\n"
+        "*** START OF THE PROJECT GUTENBERG EBOOK TEST ***\n"
+        f"{body}\n"
+        "*** END OF THE PROJECT GUTENBERG EBOOK TEST ***\n"
+        "License text.\n"
+    )
+
+
+def test_ebook_matches_golden_output():
+    chunks = list(iter_book_chunks(EBOOK_PATH))
+    assert len(chunks) == GOLDEN_CHUNK_COUNT
+    assert digest(chunks) == GOLDEN_SHA256
+
+
+def test_ebook_matches_reference_implementation():
+    with open(EBOOK_PATH, "r", encoding="utf-8") as f:
+        raw = f.read()
+    assert chunk_text_by_paragraph(clean_gutenberg_text(raw)) == reference_chunks(clean_gutenberg_text(raw))
+    assert digest(reference_chunks(clean_gutenberg_text(raw))) == GOLDEN_SHA256
+
+
+EDGE_CASES = {
+    "chapter headings": (
+        "\n\n  CHAPTER I.\n\n" + words(40) + "\n\n\nCHAPTER XIX\n\n" + words(35, "a") +
+        "\n\nCHAPTER II\nthe title line\n" + words(45, "b") + ".\n\n" + words(31, "c")
+    ),
+    "chapter heading last": words(40) + "\n\nCHAPTER XX",
+    "chapter words after heading": "Chapter One\nno punctuation here\n\n" + words(50) + ", and more.",
+    "illustrations and footnotes": (
+        "[Illustration: A view.]\n" + words(20) + " [12] " + words(15, "f") +
+        "\n[Illustration: two] " + words(40, "g") + "\n[Illustration:\nspans lines]\n\n" + words(33, "h")
+    ),
+    "whitespace": "\t" + words(10) + "   \t  \n  \n   " + words(25, "x") + "\n\n\n\n\n" + words(30, "y") + "  \n\t\n",
+    "small paragraphs": "\n\n".join(words(n, f"p{n}_") for n in (3, 5, 8, 20, 2, 40, 7, 9, 12, 1)),
+    "large paragraphs": words(1000) + "\n\n" + words(10, "s") + "\n\n" + words(201, "t") + "\n\n" + words(230, "u"),
+    "empty body": "",
+}
+
+
+@pytest.mark.parametrize("name", sorted(EDGE_CASES))
+@pytest.mark.parametrize("params", [{}, {"min_words": 5, "max_words": 20, "overlap": 3}])
+def test_streaming_matches_reference(name, params):
+    raw = gutenberg(EDGE_CASES[name])
+    expected = reference_chunks(clean_gutenberg_text(raw), **params)
+    assert streamed_chunks(raw, **params) == expected
+    assert chunk_text_by_paragraph(clean_gutenberg_text(raw), **params) == expected
+
+
+def test_streaming_matches_reference_on_random_text():
+    rng = random.Random(14)
+    pieces = ["", "", " ", "\t", "CHAPTER IV", "  chapter v.", "Chapter the-Last", "[Illustration: x]",
+              "[3]", "word", "end.", "a b c", "-- --"]
+    for _ in range(300):
+        lines = []
+        for _ in range(rng.randint(1, 40)):
+            if rng.random() < 0.3:
+                lines.append(words(rng.randint(1, 80), rng.choice("abc")))
+            else:
+                lines.append(" ".join(rng.choice(pieces) for _ in range(rng.randint(1, 3))))
+        raw = gutenberg("\n".join(lines))
+        params = {"min_words": 5, "max_words": 30, "overlap": 4}
+        assert streamed_chunks(raw, **params) == reference_chunks(clean_gutenberg_text(raw), **params)
+
+
+def test_paragraphs_match_clean_text():
+    raw = gutenberg(EDGE_CASES["chapter headings"] + "\n\n" + EDGE_CASES["illustrations and footnotes"])
+    expected = [p.strip() for p in clean_gutenberg_text(raw).split("\n\n") if p.strip()]
+    assert list(iter_gutenberg_paragraphs(io.StringIO(raw))) == expected
+
+
+def test_end_marker_before_start_gives_no_chunks():
+    raw = "*** END OF THE PROJECT GUTENBERG EBOOK X ***\n" + gutenberg(words(40))
+    assert clean_gutenberg_text(raw) == ""
+    assert streamed_chunks(raw) == []
+
+
+@pytest.mark.parametrize("raw", [words(40), "*** START OF THE PROJECT GUTENBERG EBOOK X ***\n" + words(40)])
+def test_missing_boundaries_raise(raw):
+    with pytest.raises(ValueError, match=re.escape("Could not find Project Gutenberg book boundaries.")):
+        clean_gutenberg_text(raw)
+    with pytest.raises(ValueError, match=re.escape("Could not find Project Gutenberg book boundaries.")):
+        streamed_chunks(raw)
+
+
+def test_chunk_book_adds_book_metadata(tmp_path):
+    path = tmp_path / "Roughing It.txt"
+    path.write_text(
+        "Title: Roughing It\n\n" + gutenberg("CHAPTER I.\n\n" + words(40) + ".\n\nCHAPTER II.\n\n" + words(40, "b") + "."),
+        encoding="utf-8"
+    )
+    chunks = chunk_book(str(path))
+    assert [c["text"] for c in chunks] == streamed_chunks(path.read_text(encoding="utf-8"))
+    assert {c["book_id"] for c in chunks} == {"roughing_it"}
+    assert {c["book_title"] for c in chunks} == {"Roughing It"}
+    assert [c["chapter"] for c in chunks] == ["I", "II"]
+    assert [c["index"] for c in chunks] == [0, 1]
+    text = path.read_text(encoding="utf-8")
+    assert all(text[c["offset"]:].startswith(c["text"][:10]) for c in chunks)
+
+
+def test_chunk_books_in_parallel_matches_serial(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"book{i}.txt"
+        path.write_text(gutenberg(f"CHAPTER {i + 1}\n\n" + words(300 + 50 * i, f"b{i}_") + "."), encoding="utf-8")
+        paths.append(str(path))
+    assert find_books(str(tmp_path)) == paths
+    serial = list(chunk_books(paths, workers=1))
+    assert list(chunk_books(paths, workers=2)) == serial
+    assert [path for path, _ in serial] == paths
+    assert all(chunks and chunks[0]["book_id"] == f"book{i}" for i, (_, chunks) in enumerate(serial))
@@ -0,0 +1,75 @@
+import os
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+from app.embedding_backend import LocalEmbeddingBackend, collection_for_backend
+
+WORDS = "the sphinx rome naples weather in what did twain think about".split()
+
+
+class _Session:
+    """Stands in for an onnxruntime session: one fixed vector per token id."""
+
+    def __init__(self, dim: int = 8):
+        self.table = np.random.default_rng(0).normal(size=(len(WORDS) + 2, dim)).astype(np.float32)
+
+    def get_inputs(self):
+        return [types.SimpleNamespace(name="input_ids"), types.SimpleNamespace(name="attention_mask")]
+
+    def run(self, outputs, feed):
+        return [self.table[feed["input_ids"]]]
+
+
+def _backend() -> LocalEmbeddingBackend:
+    tokenizer = Tokenizer(models.WordLevel({"[PAD]": 0, "[UNK]": 1, **{w: i + 2 for i, w in enumerate(WORDS)}},
+                                           unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+    backend = LocalEmbeddingBackend(model_dir="unused", batch_size=2, workers=2)
+    backend._tokenizer, backend._session = tokenizer, _Session()
+    backend._input_names = {"input_ids", "attention_mask"}
+    backend._executor = ThreadPoolExecutor(max_workers=2)
+    return backend
+
+
+def test_local_batches_match_single_texts_despite_padding():
+    backend = _backend()
+    texts = ["the sphinx", "what did twain think about rome", "the sphinx", "weather in naples", "rome"]
+    matrix = backend.embed_many(texts)
+    assert matrix.shape == (5, 8) and matrix.dtype == np.float32
+    assert np.allclose(np.linalg.norm(matrix, axis=1), 1.0)
+    assert np.allclose(matrix, np.stack([backend.embed(text) for text in texts]), atol=1e-6)
+
+
+def test_backends_get_separate_collections():
+    assert collection_for_backend("innocents_abroad", "bedrock") == "innocents_abroad"
+    assert collection_for_backend("innocents_abroad", "local") == "innocents_abroad_local_all_minilm_l6_v2"
+    other_model = LocalEmbeddingBackend(model_dir=os.path.join("models", "bge-small-en-v1.5"))
+    assert collection_for_backend("innocents_abroad", other_model) == "innocents_abroad_local_bge_small_en_v1_5"
+
+
+def test_retrieve_batch_searches_the_backend_collection(tmp_path):
+    from app.chroma_utils import read_collection
+    from app.query_book import RetrievalContext, retrieve_batch
+    from app.vector_snapshot import export_collection_snapshot
+    from benchmarks.stubs import build_stub_collection, fake_embedding
+
+    chroma_dir = str(tmp_path)
+    collection_name = collection_for_backend("batch", "local")
+    collection = build_stub_collection(chroma_dir, collection_name, limit=100)
+    export_collection_snapshot(collection, chroma_dir, collection_name,
+                               read_collection(collection, include=("embeddings", "documents", "metadatas")))
+    queries = ["Rome", "the Sphinx", "Venice"]
+    embeddings = [fake_embedding(query) for query in queries]
+
+    for backend in ("chroma", "snapshot"):
+        contexts = retrieve_batch(queries, embeddings, chroma_dir, "batch", mode="vector", backend=backend,
+                                  embedding_backend="local")
+        for query, embedding, context in zip(queries, embeddings, contexts):
+            single = RetrievalContext(query, chroma_dir, "batch", query_embedding=embedding, mode="vector",
+                                      backend=backend, embedding_backend="local")
+            assert context.collection_name == collection_name and context.backend == backend
+            assert context.ids and context.ids == single.ids
@@ -0,0 +1,60 @@
+import pytest
+
+from app.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "embeddings.sqlite3")
+
+
+def test_get_returns_a_copy_of_the_cached_vector():
+    cache = EmbeddingCache(path=None)
+    vector = [0.5, 0.25]
+    cache.put("titan", "Rome", vector)
+    vector[0] = 9.0
+    first = cache.get("titan", "Rome")
+    first[1] = 9.0
+    assert cache.get("titan", "Rome") == [0.5, 0.25]
+
+
+def test_memory_tier_evicts_the_least_recently_used_vector():
+    cache = EmbeddingCache(path=None, max_memory_items=2)
+    cache.put("titan", "a", [1.0])
+    cache.put("titan", "b", [2.0])
+    assert cache.get("titan", "a") == [1.0]
+    cache.put("titan", "c", [3.0])
+    assert cache.get("titan", "b") is None
+    assert cache.get("titan", "a") == [1.0] and cache.get("titan", "c") == [3.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_evicts_the_least_recently_used_rows(cache_path):
+    cache = EmbeddingCache(path=cache_path, max_memory_items=1, max_disk_items=2)
+    cache.put("titan", "a", [1.0])
+    cache.put("titan", "b", [2.0])
+    cache.put("titan", "a", [1.5])
+    cache.put("titan", "c", [3.0])
+    assert cache.stats()["disk_items"] == 2
+    assert cache.get("titan", "b") is None
+    assert cache.get("titan", "a") == [1.5]
+
+
+def test_vectors_persist_across_instances(cache_path):
+    EmbeddingCache(path=cache_path).put("titan", "Rome  is\tgrand", [0.5, 0.25])
+    reopened = EmbeddingCache(path=cache_path)
+    assert reopened.stats()["disk_items"] == 1
+    assert reopened.get("titan", "Rome is grand") == [0.5, 0.25]
+    assert reopened.disk_hits == 1
+    reopened.put("titan", "Venice", [1.0])
+    assert EmbeddingCache(path=cache_path).stats()["disk_items"] == 2
+
+
+def test_models_with_different_dimensions_do_not_share_entries(cache_path):
+    cache = EmbeddingCache(path=cache_path)
+    cache.put("amazon.titan-embed-text-v1", "Rome", [0.5] * 1536)
+    cache.put("all-MiniLM-L6-v2", "Rome", [0.25] * 384)
+    assert cache.get("amazon.titan-embed-text-v1", "Rome") == [0.5] * 1536
+    assert cache.get("all-MiniLM-L6-v2", "Rome") == [0.25] * 384
+    assert cache.get("amazon.titan-embed-text-v2:0", "Rome") is None
+    assert EmbeddingCache(path=cache_path).stats()["disk_items"] == 2
@@ -0,0 +1,34 @@
+import time
+
+from app.ingest_pipeline import IngestPipeline
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        self.acquired += 1
+
+
+def test_batched_stages_take_one_token_per_call():
+    calls = {"metadata": 0, "embedding": 0}
+
+    def stage(name):
+        def run(batch):
+            calls[name] += 1
+            time.sleep(0.02)  # let the next batch fill up
+            return batch
+        return run
+
+    written = []
+    pipeline = IngestPipeline(stage("metadata"), stage("embedding"), written.extend,
+                              metadata_workers=1, embedding_workers=1,
+                              metadata_batch_size=4, embed_batch_size=8)
+    pipeline.metadata_limiter = CountingLimiter()
+    pipeline.embedding_limiter = CountingLimiter()
+    summary = pipeline.run({"index": i} for i in range(20))
+
+    assert summary["written"] == 20 and not summary["errors"]
+    assert pipeline.metadata_limiter.acquired == calls["metadata"] < 20
+    assert pipeline.embedding_limiter.acquired == calls["embedding"] < 20
@@ -0,0 +1,66 @@
+from app.prompt_builder import converse_request, estimate_tokens, pack_passages, section_budget
+from app.weather import WeatherAPI
+
+
+def test_pack_passages_puts_matching_sentences_first_within_budget():
+    documents = [
+        "We sailed at dawn. The harbor was quiet. Nobody spoke of the Sphinx.",
+        "The Sphinx stood in the desert. It was vast and solemn. We rode camels there.",
+    ]
+    metadatas = [{"book_title": "Innocents Abroad", "summary": "Departure"}, {"summary": "Egypt"}]
+    packed = pack_passages("What did Twain think of the Sphinx?", documents, metadatas, budget=40)
+    assert estimate_tokens(packed) <= 40
+    assert "Nobody spoke of the Sphinx." in packed and "The Sphinx stood in the desert." in packed
+    assert packed.startswith("[1] (Innocents Abroad)\nSummary: Departure\n... Nobody spoke")
+    assert "harbor" not in packed
+
+
+def test_compact_weather_and_cache_point():
+    line = WeatherAPI.format_weather_compact(
+        {"city": "Rome", "country": "IT", "description": "Light Rain", "temperature": 18.0, "humidity": 80}
+    )
+    assert line == "Rome, IT: light rain, 18°C, humidity 80%"
+    assert WeatherAPI.format_weather_compact({"error": "timeout"}, "Paris") == "Paris: unavailable (timeout)"
+
+    request = converse_request("model", "instructions", "query", max_tokens=10, temperature=0.0)
+    assert request["system"] == [{"text": "instructions"}, {"cachePoint": {"type": "default"}}]
+    assert request["messages"][0]["content"] == [{"text": "query"}]
+
+
+def test_sync_and_async_paths_build_the_same_book_answer(tmp_path, monkeypatch):
+    import asyncio
+
+    import app.async_workflow as async_workflow
+    import app.workflow as workflow
+    from app.bedrock_client import set_bedrock_client
+    from app.query_book import RetrievalContext
+    from benchmarks.stubs import FakeBedrockClient, build_stub_collection
+
+    build_stub_collection(str(tmp_path), "prompt_test", limit=300)
+
+    class StubContext(RetrievalContext):
+        def __init__(self, query, *args, **kwargs):
+            super().__init__(query, str(tmp_path), "prompt_test", mode="vector", backend="chroma", **kwargs)
+
+    monkeypatch.delenv("SEMANTIC_CACHE_ENABLED", raising=False)
+    monkeypatch.setenv("EMBEDDING_CACHE_DISABLED", "1")
+    for module in (workflow, async_workflow):
+        monkeypatch.setattr(module, "RetrievalContext", StubContext)
+        monkeypatch.setattr(module, "classify_query", lambda query: "book")
+
+    async def book_answer_async(query, prepared):
+        return prepared.book_answer
+
+    monkeypatch.setattr(async_workflow, "_generate_or_degrade", book_answer_async)
+    query = "What did Twain think of the Sphinx and the pyramids?"
+    set_bedrock_client(FakeBedrockClient())
+    try:
+        sync_answer = workflow.prepare_query(query).book_answer
+        assert asyncio.run(async_workflow.process_query_async(query)) == sync_answer
+        context = StubContext(query, n_results=workflow.RETRIEVAL_RESULTS)
+    finally:
+        set_bedrock_client(None)
+    top = workflow.BOOK_PASSAGES
+    assert len(context.documents) > top
+    assert sync_answer == pack_passages(query, context.documents[:top], context.metadatas[:top],
+                                        section_budget("book"))
@@ -0,0 +1,40 @@
+import json
+import os
+
+import numpy as np
+
+from app.query_classifier import SEED_EXAMPLES, EmbeddingClassifier
+from benchmarks.stubs import PROJECT_ROOT
+
+
+def _key(query: str) -> str:
+    return query.lower().rstrip(".?! ")
+
+
+def test_seed_examples_are_not_in_the_eval_set():
+    with open(os.path.join(PROJECT_ROOT, "data", "classifier_eval.jsonl"), encoding="utf-8") as f:
+        eval_queries = {_key(json.loads(line)["query"]) for line in f if line.strip()}
+    seeds = {_key(text) for texts in SEED_EXAMPLES.values() for text in texts}
+    assert not seeds & eval_queries
+
+
+class _Backend:
+    """One axis per label: a seed points along its label's axis."""
+
+    name = "axes"
+
+    def __init__(self, examples: dict):
+        self.axis = {text: i for i, texts in enumerate(examples.values()) for text in texts}
+
+    def embed_many(self, texts):
+        return np.stack([np.eye(4, dtype=np.float32)[self.axis[text]] * 3 for text in texts])
+
+
+def test_predict_picks_the_nearest_centroid_with_softmax_confidence():
+    examples = {"book": ["b1", "b2"], "weather": ["w1"], "both": ["x1"], "out-of-scope": ["o1"]}
+    classifier = EmbeddingClassifier(examples, temperature=0.05)
+    backend = _Backend(examples)
+    label, confidence = classifier.predict([0.0, 5.0, 0.0, 0.0], backend)
+    assert label == "weather" and confidence > 0.99
+    label, confidence = classifier.predict([1.0, 1.0, 0.0, 0.0], backend)
+    assert label in {"book", "weather"} and abs(confidence - 0.5) < 1e-6
@@ -0,0 +1,296 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app import workflow
+from app.bedrock_client import new_bedrock_client, set_bedrock_client, get_bedrock_client
+from app.query_classifier import classify_query_tiered
+from app.resilience import (
+    AdaptiveRateLimit,
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientBedrockClient,
+    call_with_retry,
+    hedged_call,
+    is_throttling_error,
+    is_unavailable_error,
+    reset_resilience_state,
+)
+from app.weather import WeatherAPI
+from benchmarks.stubs import FakeBedrockClient, FakeThrottlingError, StubBedrockServer, StubWeatherServer
+
+EMBED_MODEL = "amazon.titan-embed-text-v1"
+
+
+class ValidationError(Exception):
+    response = {"Error": {"Code": "ValidationException"}}
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setenv("BEDROCK_RETRY_BASE_DELAY", "0.001")
+    monkeypatch.setenv("BEDROCK_BREAKER_THRESHOLD", "3")
+    monkeypatch.setenv("BEDROCK_BREAKER_RESET", "30")
+    monkeypatch.setenv("EMBEDDING_CACHE_DISABLED", "1")
+    reset_resilience_state()
+    yield
+    set_bedrock_client(None)
+    reset_resilience_state()
+
+
+@pytest.fixture
+def stub_bedrock(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "stub")
+    monkeypatch.delenv("AWS_SESSION_TOKEN", raising=False)
+    with StubBedrockServer() as server:
+        client = new_bedrock_client({
+            "aws_access_key_id": "stub", "aws_secret_access_key": "stub", "aws_session_token": None,
+            "region_name": "us-east-1", "endpoint_url": server.url, "max_pool_connections": 4,
+            "tcp_keepalive": False
+        })
+        yield server, ResilientBedrockClient(client)
+
+
+def _embed(client, text="hello"):
+    response = client.invoke_model(modelId=EMBED_MODEL, body=json.dumps({"inputText": text}),
+                                   contentType="application/json")
+    return json.loads(response["body"].read())["embedding"]
+
+
+def test_retry_recovers_from_throttling():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeThrottlingError()
+        return "ok"
+
+    assert call_with_retry(flaky, max_retries=4, base_delay=0.001) == "ok"
+    assert len(attempts) == 3
+
+
+def test_retry_does_not_repeat_bad_requests():
+    attempts = []
+
+    def invalid():
+        attempts.append(1)
+        raise ValidationError()
+
+    with pytest.raises(ValidationError):
+        call_with_retry(invalid, max_retries=4, base_delay=0.001)
+    assert len(attempts) == 1
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker("stub", failure_threshold=2, reset_timeout=0.05)
+
+    def failing():
+        raise FakeThrottlingError()
+
+    for _ in range(2):
+        with pytest.raises(FakeThrottlingError):
+            breaker.call(failing)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "not called")
+
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    with pytest.raises(FakeThrottlingError):
+        breaker.call(failing)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+
+def test_bad_requests_do_not_open_the_circuit():
+    breaker = CircuitBreaker("stub", failure_threshold=1)
+    with pytest.raises(ValidationError):
+        breaker.call(lambda: (_ for _ in ()).throw(ValidationError()))
+    assert breaker.state == "closed"
+
+
+def test_hedged_call_returns_the_faster_attempt():
+    calls = []
+    lock = threading.Lock()
+
+    def slow_then_fast():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        time.sleep(1.0 if first else 0.01)
+        return "primary" if first else "backup"
+
+    start = time.perf_counter()
+    assert hedged_call(slow_then_fast, hedge_after=0.05) == "backup"
+    assert time.perf_counter() - start < 0.5
+    assert hedged_call(lambda: "fast", hedge_after=0.05) == "fast"
+
+
+def test_hedged_call_skips_the_backup_without_a_rate_limit_token():
+    calls = []
+    limit = AdaptiveRateLimit(1.0)
+    limit.acquire()
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "primary"
+
+    assert hedged_call(slow, hedge_after=0.02, may_hedge=limit.try_acquire) == "primary"
+    assert len(calls) == 1
+
+
+def test_hedged_call_raises_when_both_attempts_fail():
+    def failing():
+        time.sleep(0.05)
+        raise FakeThrottlingError()
+
+    with pytest.raises(FakeThrottlingError):
+        hedged_call(failing, hedge_after=0.01)
+
+
+def test_adaptive_rate_limit_backs_off_and_recovers():
+    limit = AdaptiveRateLimit(10.0)
+    limit.on_throttled()
+    limit.on_throttled()
+    assert limit.bucket.rate == pytest.approx(2.5)
+    for _ in range(100):
+        limit.on_success()
+    assert limit.bucket.rate == pytest.approx(10.0)
+
+
+def test_boto3_client_retries_injected_throttling(stub_bedrock):
+    server, client = stub_bedrock
+    server.faults.extend([429, 503])
+    assert len(_embed(client)) > 0
+    assert server.requests == 3
+
+
+def test_boto3_errors_are_classified(stub_bedrock):
+    server, client = stub_bedrock
+    server.faults.extend([429] * 10)
+    with pytest.raises(Exception) as raised:
+        _embed(client.client)
+    assert is_throttling_error(raised.value)
+
+    server.faults[:] = [400]
+    with pytest.raises(Exception) as raised:
+        _embed(client)
+    assert not is_unavailable_error(raised.value)
+    assert server.requests == 2
+
+
+def test_circuit_opens_after_persistent_faults(stub_bedrock):
+    server, client = stub_bedrock
+    client.max_retries = 1
+    server.faults.extend([503] * 6)
+    for _ in range(3):
+        with pytest.raises(Exception) as raised:
+            _embed(client)
+        assert is_unavailable_error(raised.value)
+    requests = server.requests
+    with pytest.raises(CircuitOpenError):
+        _embed(client)
+    assert server.requests == requests
+
+
+def test_get_bedrock_client_wraps_overrides():
+    fake = FakeBedrockClient(throttle_rate=0.5, seed=3)
+    set_bedrock_client(fake)
+    client = get_bedrock_client()
+    assert isinstance(client, ResilientBedrockClient) and client.client is fake
+    for i in range(20):
+        assert len(_embed(client, f"text {i}")) > 0
+    assert fake.throttled > 0
+
+
+def test_weather_retries_then_opens_circuit(monkeypatch):
+    monkeypatch.setenv("WEATHER_BREAKER_THRESHOLD", "2")
+    with StubWeatherServer(faults=[503]) as server:
+        monkeypatch.setenv("OPENWEATHER_BASE_URL", server.url)
+        api = WeatherAPI(api_key="stub", cache_ttl=0, retry_base_delay=0.001)
+        assert api.get_weather_by_city("Rome")["city"] == "Rome"
+        assert server.requests == 2
+
+        server.httpd.faults.extend([503] * 6)
+        for city in ("Naples", "Venice"):
+            assert api.get_weather_by_city(city)["unavailable"]
+        assert not api.available
+        requests = server.requests
+        assert api.get_weather_by_city("Milan")["unavailable"]
+        assert server.requests == requests
+
+
+def test_both_query_skips_weather_while_its_circuit_is_open(monkeypatch):
+    api = WeatherAPI(api_key="stub")
+    api.breaker.opened_at = time.monotonic()
+    monkeypatch.setattr(workflow, "get_weather_api", lambda: api)
+    assert workflow.get_weather_for_book_cities(["Rome"]) == workflow.WEATHER_UNAVAILABLE
+
+
+def test_answer_degrades_to_book_passages_when_generation_is_unavailable(monkeypatch):
+    set_bedrock_client(FakeBedrockClient(throttle_rate=1.0))
+    prepared = workflow.PreparedQuery("both", book_answer="Result 1: Rome.", weather_answer=workflow.WEATHER_UNAVAILABLE)
+    monkeypatch.setattr(workflow, "prepare_query", lambda query, book=None: prepared)
+
+    answer = workflow.process_query("What did Twain think of Rome?")
+    assert "Result 1: Rome." in answer
+    assert workflow.WEATHER_UNAVAILABLE not in answer
+    assert "".join(workflow.process_query_stream("What did Twain think of Rome?")) == answer
+
+
+def test_classifier_falls_back_to_local_guess_when_bedrock_is_unavailable():
+    set_bedrock_client(FakeBedrockClient(throttle_rate=1.0))
+    label, tier, _ = classify_query_tiered("Tell me something interesting", threshold=0.99)
+    assert tier == "fallback"
+    assert label in {"book", "weather", "both", "out-of-scope"}
+
+
+def test_batch_embedding_does_not_retry_around_the_resilient_client(monkeypatch):
+    from app import bedrock_embed
+
+    attempts = []
+
+    def throttled(text, model_id):
+        attempts.append(text)
+        raise FakeThrottlingError()
+
+    monkeypatch.setattr(bedrock_embed, "_invoke_embedding", throttled)
+    with pytest.raises(FakeThrottlingError):
+        bedrock_embed.get_bedrock_embeddings(["a"], use_cache=False, base_delay=0.001)
+    assert len(attempts) == 1
+    monkeypatch.setenv("BEDROCK_RESILIENCE", "0")
+    with pytest.raises(FakeThrottlingError):
+        bedrock_embed.get_bedrock_embeddings(["b"], use_cache=False, max_retries=2, base_delay=0.001)
+    assert len(attempts) == 4
+
+
+def test_hybrid_retrieval_falls_back_to_lexical_only_when_vector_search_is_unavailable(tmp_path, monkeypatch):
+    from app.chroma_utils import read_collection
+    from app.lexical_index import BM25Index, index_path
+    from app.query_book import RetrievalContext
+    from benchmarks.stubs import build_stub_collection
+
+    rows = read_collection(build_stub_collection(str(tmp_path), "fallback", limit=100))
+    BM25Index.build(rows["ids"], rows["documents"], rows["metadatas"]).save(index_path(str(tmp_path), "fallback"))
+
+    def unavailable(self, n_results):
+        raise CircuitOpenError("amazon.titan-embed-text-v1", 30)
+
+    monkeypatch.setattr(RetrievalContext, "_vector_search", unavailable)
+    context = RetrievalContext("Rome", str(tmp_path), "fallback", mode="hybrid", backend="chroma")
+    assert context.mode == "lexical" and context.ids
+
+    def bad_request(self, n_results):
+        raise ValidationError("bad embedding input")
+
+    monkeypatch.setattr(RetrievalContext, "_vector_search", bad_request)
+    with pytest.raises(ValidationError):
+        RetrievalContext("Rome", str(tmp_path), "fallback", mode="hybrid", backend="chroma")
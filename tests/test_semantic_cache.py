@@ -0,0 +1,93 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import app.async_workflow as async_workflow
+import app.semantic_cache as semantic_cache
+import app.workflow as workflow
+from app.semantic_cache import CachedAnswer, SemanticCache
+
+
+def _vector(*values, dim: int = 8) -> list:
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector.tolist()
+
+
+def test_lookup_hits_only_above_threshold():
+    cache = SemanticCache(threshold=0.9, capacity=4)
+    assert cache.lookup(_vector(1)) is None
+    cache.store(_vector(1), CachedAnswer("q", "book", "answer"))
+    assert cache.lookup(_vector(2)).answer == "answer"  # same direction, any length
+    assert cache.lookup(_vector(1, 0.3)) is not None  # cosine 0.96
+    assert cache.lookup(_vector(1, 1)) is None  # cosine 0.71
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_entry_is_evicted_and_its_row_reused():
+    cache = SemanticCache(threshold=0.99, capacity=2)
+    cache.store(_vector(1), CachedAnswer("a", "book", "A"))
+    cache.store(_vector(0, 1), CachedAnswer("b", "book", "B"))
+    assert cache.lookup(_vector(1)).answer == "A"  # "b" is now least recently used
+    cache.store(_vector(0, 0, 1), CachedAnswer("c", "book", "C"))
+    assert cache.lookup(_vector(0, 1)) is None
+    assert cache.lookup(_vector(1)).answer == "A" and cache.lookup(_vector(0, 0, 1)).answer == "C"
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+    assert cache._matrix.shape == (2, 8)
+
+
+def test_expired_entries_miss_and_free_their_slot(monkeypatch):
+    cache = SemanticCache(threshold=0.9, capacity=1, ttl=60)
+    cache.store(_vector(1), CachedAnswer("q", "book", "old", created_at=1000.0))
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: 1030.0)
+    assert cache.lookup(_vector(1)) is not None
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: 1061.0)
+    assert cache.lookup(_vector(1)) is None
+    assert cache.stats()["size"] == 0
+    cache.store(_vector(0, 1), CachedAnswer("r", "book", "new"))
+    assert cache.stats()["evictions"] == 0
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = SemanticCache(threshold=0.9, capacity=8)
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLED", "1")
+    monkeypatch.setattr(semantic_cache, "_cache", cache)
+    embedder = type("Embedder", (), {"embed": staticmethod(lambda text: _vector(1, len(text) % 2 * 0.1))})
+    monkeypatch.setattr(workflow, "get_embedding_backend", lambda: embedder)
+    return cache
+
+
+def test_weather_answers_are_served_with_fresh_weather(cache, monkeypatch):
+    cache.store(_vector(1), CachedAnswer("Rome and weather?", "both", "stale answer", book_answer="passages",
+                                         cities=["Rome", "Naples"]))
+    monkeypatch.setattr(workflow, "get_weather_for_book_cities", lambda cities: f"fresh weather for {cities}")
+    monkeypatch.setattr(workflow, "classify_query", lambda query: pytest.fail("classified a cache hit"))
+    prepared = workflow.prepare_query("Rome and weather now?")
+    assert prepared.from_cache and prepared.answer is None
+    assert prepared.book_answer == "passages"
+    assert prepared.weather_answer == "fresh weather for ['Rome', 'Naples']"
+
+
+def test_async_path_looks_up_and_stores_answers(cache, monkeypatch):
+    async def embed(query):
+        return _vector(1) if "Sphinx" in query else _vector(0, 1)
+
+    async def retrieve(query, query_embedding, book):
+        return type("Context", (), {"format_passages": lambda self, **kwargs: "passages"})()
+
+    async def generate(query, book_answer="", weather_answer=""):
+        return f"generated for {query}"
+
+    monkeypatch.setattr(async_workflow, "classify_query", lambda query: "book")
+    monkeypatch.setattr(async_workflow, "generate_final_response_async", generate)
+
+    def ask(query):
+        return async_workflow.process_query_async(query, embed=embed, retrieve=retrieve)
+
+    assert asyncio.run(ask("the Sphinx?")) == "generated for the Sphinx?"
+    assert cache.stats()["size"] == 1
+    monkeypatch.setattr(async_workflow, "classify_query", lambda query: pytest.fail("classified a cache hit"))
+    assert asyncio.run(ask("what about the Sphinx")) == "generated for the Sphinx?"
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from app.async_workflow import _run_blocking
+from app.micro_batch import MicroBatcher
+from app.query_book import RetrievalContext, retrieve_batch
+from app.server import QueryServer
+from benchmarks.stubs import build_stub_collection, fake_embedding
+
+
+def test_batcher_groups_concurrent_items_and_isolates_failures():
+    batches = []
+
+    def process(items):
+        batches.append(items)
+        return [ValueError(item) if item == "bad" else item.upper() for item in items]
+
+    async def run():
+        batcher = MicroBatcher("test", process, _run_blocking, max_batch_size=3, max_wait=0.01)
+        results = await asyncio.gather(*(batcher.submit(item) for item in ("a", "bad", "c", "d")),
+                                       return_exceptions=True)
+        return results, batcher.stats()
+
+    results, stats = asyncio.run(run())
+    assert results[0] == "A" and results[2:] == ["C", "D"]
+    assert isinstance(results[1], ValueError)
+    assert batches == [["a", "bad", "c"], ["d"]]
+    assert stats["batches"] == 2 and stats["max_queue_depth"] == 3
+
+
+def test_retrieve_batch_matches_single_queries(tmp_path):
+    build_stub_collection(str(tmp_path), "batch_test", limit=200)
+    queries = ["Rome", "the Sphinx", "Venice"]
+    embeddings = [fake_embedding(query) for query in queries]
+    batched = retrieve_batch(queries, embeddings, str(tmp_path), "batch_test", mode="vector", backend="chroma")
+    for query, embedding, context in zip(queries, embeddings, batched):
+        single = RetrievalContext(query, str(tmp_path), "batch_test", query_embedding=embedding,
+                                  mode="vector", backend="chroma")
+        assert context.ids == single.ids and context.documents == single.documents
+
+
+def test_server_answers_over_http(monkeypatch):
+    async def run():
+        server = QueryServer(port=0, max_batch_size=4, max_wait=0.005)
+        monkeypatch.setattr(server, "answer", lambda query, book=None: asyncio.sleep(0, f"answer to {query}"))
+        await server.start()
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        responses = []
+        for body in (json.dumps({"query": "hi"}), "not json"):
+            writer.write(f"POST /query HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n{body}".encode())
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while (line := await reader.readline()) != b"\r\n":
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+            responses.append((status, json.loads(await reader.readexactly(int(headers["content-length"])))))
+        writer.close()
+        await server.close()
+        return responses
+
+    responses = asyncio.run(run())
+    assert responses[0][0] == 200 and responses[0][1]["answer"] == "answer to hi"
+    assert responses[1][0] == 400
@@ -0,0 +1,13 @@
+import json
+import subprocess
+import sys
+
+from benchmarks.bench_startup import HEAVY_MODULES
+from benchmarks.stubs import PROJECT_ROOT
+
+
+def test_importing_the_workflow_loads_no_heavy_modules():
+    code = ("import json, sys; import app.workflow, app.async_workflow; "
+            f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(output.stdout) == []
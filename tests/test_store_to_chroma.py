@@ -0,0 +1,82 @@
+import chromadb
+import pytest
+
+from app import store_to_chroma
+from app.bedrock_client import set_bedrock_client
+from app.book_preprocess import chunk_content_id
+from benchmarks.stubs import FakeBedrockClient
+
+SHARED = " ".join(["The pilgrims rode out of Rome at dawn, complaining of the fleas and the heat."] * 4)
+BOOKS = {
+    "roughing_it": " ".join(["Silver fever ran through every camp in Nevada that winter."] * 4),
+    "innocents_abroad": " ".join(["The ship lay at anchor in the bay of Naples for a week."] * 4),
+}
+
+
+def write_books(directory):
+    for book_id, own in BOOKS.items():
+        text = (f"Title: {book_id}\n*** START OF THE PROJECT GUTENBERG EBOOK {book_id.upper()} ***\n\n"
+                f"{SHARED}\n\n{own}\n\n*** END OF THE PROJECT GUTENBERG EBOOK {book_id.upper()} ***\n")
+        (directory / f"{book_id}.txt").write_text(text, encoding="utf-8")
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_DISABLED", "1")
+    books = tmp_path / "books"
+    books.mkdir()
+    write_books(books)
+    chroma_dir = str(tmp_path / "chroma")
+    client = FakeBedrockClient()
+    set_bedrock_client(client)
+
+    def run():
+        store_to_chroma.main(ebook_dir=str(books), chroma_dir=chroma_dir, collection_name="shared",
+                             metadata_workers=1, embedding_workers=1, preprocess_workers=1)
+        return chromadb.PersistentClient(path=chroma_dir).get_collection("shared")
+
+    run.chroma_dir = chroma_dir
+    run.client = client
+    yield run
+    set_bedrock_client(None)
+
+
+def test_a_passage_shared_by_two_books_is_stored_once_per_book(ingest):
+    collection = ingest()
+    rows = collection.get(include=["documents", "metadatas"])
+    shared = sorted((meta["book_id"], chunk_id) for chunk_id, doc, meta
+                    in zip(rows["ids"], rows["documents"], rows["metadatas"]) if doc == SHARED)
+    assert [book_id for book_id, _ in shared] == ["innocents_abroad", "roughing_it"]
+    assert [chunk_id for _, chunk_id in shared] == [chunk_content_id(SHARED, "innocents_abroad"),
+                                                   chunk_content_id(SHARED, "roughing_it")]
+    assert collection.count() == 4
+
+
+def test_chunks_stored_under_text_only_ids_are_moved_without_reembedding(ingest):
+    collection = chromadb.PersistentClient(path=ingest.chroma_dir).get_or_create_collection("shared")
+    own = BOOKS["roughing_it"]
+    collection.upsert(ids=[chunk_content_id(own)], documents=[own], embeddings=[[0.5] * 1536],
+                      metadatas=[{"book_id": "roughing_it", "summary": "Stored earlier."}])
+
+    collection = ingest()
+    assert ingest.client.calls["invoke_model"] == 3
+    rows = collection.get(ids=[chunk_content_id(own), chunk_content_id(own, "roughing_it")],
+                          include=["embeddings", "metadatas"])
+    assert rows["ids"] == [chunk_content_id(own, "roughing_it")]
+    assert list(rows["embeddings"][0]) == [0.5] * 1536
+    assert rows["metadatas"][0]["summary"] == "Stored earlier."
+    assert rows["metadatas"][0]["chunk_id"] == chunk_content_id(own, "roughing_it")
+
+
+def test_unchanged_chunks_get_their_new_index_without_new_model_calls(ingest, tmp_path):
+    ingest()
+    calls = dict(ingest.client.calls)
+    book = tmp_path / "books" / "roughing_it.txt"
+    intro = " ".join(["A new preface about the overland stage was added to this edition."] * 4)
+    book.write_text(book.read_text(encoding="utf-8").replace(SHARED, f"{intro}\n\n{SHARED}"), encoding="utf-8")
+
+    collection = ingest()
+    own = BOOKS["roughing_it"]
+    meta = collection.get(ids=[chunk_content_id(own, "roughing_it")])["metadatas"][0]
+    assert meta["chunk_index"] == "2" and meta["summary"] == "A passage."
+    assert ingest.client.calls["converse"] == calls["converse"] + 1
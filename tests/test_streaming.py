@@ -0,0 +1,94 @@
+import asyncio
+import gc
+
+import pytest
+
+from app import async_workflow, workflow
+from app.bedrock_client import set_bedrock_client
+from app.resilience import CircuitOpenError, reset_resilience_state
+from benchmarks.stubs import FakeBedrockClient, FakeThrottlingError
+
+ANSWER = "Twain found Rome grand but tiring."
+
+
+class UnavailableStreamClient(FakeBedrockClient):
+    def converse_stream(self, modelId, messages, inferenceConfig=None, system=None, **kwargs):
+        self._count("converse_stream")
+        raise CircuitOpenError(modelId, 30)
+
+
+@pytest.fixture(autouse=True)
+def clean_client(monkeypatch):
+    monkeypatch.delenv("SEMANTIC_CACHE_ENABLED", raising=False)
+    reset_resilience_state()
+    yield
+    set_bedrock_client(None)
+    reset_resilience_state()
+
+
+@pytest.fixture
+def book_query(monkeypatch):
+    prepared = workflow.PreparedQuery("book", book_answer="Result 1: Rome.")
+    monkeypatch.setattr(workflow, "prepare_query", lambda query, book=None: prepared)
+    return prepared
+
+
+def test_stream_yields_deltas_in_order_and_records_timings():
+    set_bedrock_client(FakeBedrockClient(converse_handler=lambda prompt: ANSWER,
+                                         stream_first_token_latency=0.05, stream_token_latency=0.01))
+    timings = workflow.StreamTimings()
+    parts = list(workflow.generate_final_response_stream("Rome?", book_answer="Result 1: Rome.", timings=timings))
+
+    assert parts == ["Twain", " found", " Rome", " grand", " but", " tiring."]
+    assert "".join(parts) == ANSWER
+    assert timings.time_to_first_token >= 0.05
+    assert timings.total_time >= timings.time_to_first_token + 0.05
+    assert timings.usage["outputTokens"] == len(parts)
+
+
+def test_process_query_stream_forwards_the_generated_answer(book_query):
+    client = FakeBedrockClient(converse_handler=lambda prompt: ANSWER)
+    set_bedrock_client(client)
+    timings = workflow.StreamTimings()
+
+    parts = list(workflow.process_query_stream("What did Twain think of Rome?", timings=timings))
+    assert "".join(parts) == ANSWER and len(parts) > 1
+    assert client.calls["converse_stream"] == 1
+    assert timings.first_token_at is not None and timings.finished_at >= timings.first_token_at
+
+
+def test_process_query_stream_degrades_when_generation_is_unavailable(book_query):
+    set_bedrock_client(UnavailableStreamClient())
+    parts = list(workflow.process_query_stream("What did Twain think of Rome?"))
+    assert parts == [workflow.degraded_answer("Result 1: Rome.")]
+    assert "Result 1: Rome." in parts[0]
+
+
+def test_process_query_stream_raises_other_errors(book_query):
+    class BrokenStreamClient(FakeBedrockClient):
+        def converse_stream(self, modelId, messages, inferenceConfig=None, system=None, **kwargs):
+            raise ValueError("bad request")
+
+    set_bedrock_client(BrokenStreamClient())
+    with pytest.raises(ValueError):
+        list(workflow.process_query_stream("What did Twain think of Rome?"))
+
+
+def test_async_path_retrieves_the_error_of_an_unused_speculative_embedding(monkeypatch):
+    async def embed(query):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            raise FakeThrottlingError()
+
+    async def ask():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context["message"]))
+        answer = await async_workflow.process_query_async("Explain quantum physics", embed=embed)
+        await asyncio.sleep(0.01)
+        gc.collect()
+        return answer
+
+    errors = []
+    monkeypatch.setattr(async_workflow, "classify_query", lambda query: "out_of_scope")
+    assert asyncio.run(ask()) == workflow.OUT_OF_SCOPE_ANSWER
+    assert errors == []
@@ -0,0 +1,51 @@
+import json
+import os
+
+import numpy as np
+
+from app.vector_snapshot import VectorSnapshot, snapshot_paths
+
+
+def export(paths, texts):
+    embeddings = np.eye(len(texts), 4, dtype=np.float32) + 0.1
+    VectorSnapshot.export(paths, "test", [f"id-{text}" for text in texts], embeddings, texts,
+                          [{"book_id": "b"} for _ in texts])
+
+
+def data_files(chroma_dir):
+    return sorted(name for name in os.listdir(chroma_dir) if not name.endswith(".json"))
+
+
+def test_sidecar_points_to_versioned_data_files(tmp_path):
+    paths = snapshot_paths(str(tmp_path), "test")
+    export(paths, ["Rome", "Venice"])
+    with open(paths["sidecar"], encoding="utf-8") as f:
+        files = json.load(f)["files"]
+    assert sorted(files.values()) == data_files(tmp_path)
+
+    snapshot = VectorSnapshot.load(paths)
+    assert snapshot.get(["id-Venice", "id-Atlantis"])["documents"] == ["Venice"]
+    assert snapshot.search(np.eye(1, 4)[0] + 0.1, 1)[0][0][0] == 0
+
+
+def test_reexport_keeps_the_previous_data_files_for_open_readers(tmp_path):
+    paths = snapshot_paths(str(tmp_path), "test")
+    export(paths, ["Rome", "Venice"])
+    first = VectorSnapshot.load(paths)
+    export(paths, ["Naples", "Florence", "Milan"])
+    assert len(data_files(tmp_path)) == 4
+    assert first.document(1) == "Venice"
+
+    second = VectorSnapshot.load(paths)
+    assert len(second) == 3 and second.document(2) == "Milan"
+    export(paths, ["Genoa"])
+    assert len(data_files(tmp_path)) == 4
+    assert VectorSnapshot.load(paths).document(0) == "Genoa"
+
+
+def test_snapshots_of_other_collections_are_left_alone(tmp_path):
+    export(snapshot_paths(str(tmp_path), "test_local"), ["Rome"])
+    paths = snapshot_paths(str(tmp_path), "test")
+    for texts in (["Venice"], ["Naples"], ["Milan"]):
+        export(paths, texts)
+    assert VectorSnapshot.load(snapshot_paths(str(tmp_path), "test_local")).document(0) == "Rome"
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from app.weather import WeatherAPI
+from benchmarks.stubs import StubWeatherServer
+
+
+@pytest.fixture
+def weather_server(monkeypatch):
+    def start(**kwargs):
+        server = StubWeatherServer(**kwargs).__enter__()
+        servers.append(server)
+        monkeypatch.setenv("OPENWEATHER_BASE_URL", server.url)
+        return server
+
+    servers = []
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+
+def test_results_are_cached_until_the_ttl_expires(weather_server):
+    server = weather_server()
+    api = WeatherAPI(api_key="stub", cache_ttl=0.2)
+    first = api.get_weather_by_city("Rome")
+    assert api.get_weather_by_city(" rome ") is first
+    assert server.requests == 1 and api.cache_hits == 1
+
+    time.sleep(0.25)
+    assert api.get_weather_by_city("Rome")["city"] == "Rome"
+    assert server.requests == 2
+
+
+def test_simultaneous_lookups_of_a_city_share_one_request(weather_server):
+    server = weather_server(latency=0.1)
+    api = WeatherAPI(api_key="stub")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(api.get_weather_by_city("Venice"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert server.requests == 1
+    assert len(results) == 8 and all(result["city"] == "Venice" for result in results)
+
+
+def test_unknown_city_is_an_error_that_is_not_cached(weather_server):
+    server = weather_server(unknown_cities=["Atlantis"])
+    api = WeatherAPI(api_key="stub")
+    assert api.get_weather_by_city("Atlantis") == {"error": "City 'Atlantis' not found."}
+    api.get_weather_by_city("Atlantis")
+    assert server.requests == 2
+    assert api.available
+
+
+def test_batch_lookup_is_concurrent_deduplicated_and_ordered(weather_server):
+    server = weather_server(latency=0.1, unknown_cities=["Atlantis"])
+    api = WeatherAPI(api_key="stub")
+    cities = ["Rome", "Naples", "Atlantis", "Rome", "Florence", "Milan"]
+    start = time.perf_counter()
+    results = api.get_weather_for_cities(cities)
+    elapsed = time.perf_counter() - start
+
+    assert list(results) == ["Rome", "Naples", "Atlantis", "Florence", "Milan"]
+    assert results["Naples"]["city"] == "Naples" and "error" in results["Atlantis"]
+    assert server.requests == 5
+    assert elapsed < 0.3
+    assert api.get_weather_for_cities([]) == {}